@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+API Record/Replay
+requests transport that records API traffic to a cassette and replays it
+
+A CassetteTransport is mounted on a client's requests session (the
+FortiGate clients and MerakiNetworkMapper take it as their transport
+argument) and runs in one of three modes:
+
+    record  forward every request and store the response's status, headers,
+            body and latency
+    replay  answer from the cassette only; unrecorded requests fail with
+            ConnectionError, nothing reaches the network
+    new     replay what was recorded, record what was not
+
+Secrets are scrubbed before anything is stored: credential headers, token
+query parameters and any extra body patterns. Requests are matched on method
+and scrubbed URL, so replays need no credentials. A URL recorded several
+times is replayed in recorded order, wrapping around. Replays run at full
+speed unless latency_scale is set (1 reproduces the recorded latencies).
+
+Cassettes are JSON Lines, gzip-compressed when the path ends in .gz.
+
+Usage:
+    python api_replay.py stats topology.jsonl.gz
+"""
+
+import argparse
+import base64
+import gzip
+import io
+import json
+import math
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+MODES = ('record', 'replay', 'new')
+REDACTED = 'REDACTED'
+
+SECRET_HEADERS = frozenset({
+    'authorization', 'proxy-authorization', 'cookie', 'set-cookie',
+    'x-cisco-meraki-api-key', 'x-csrftoken', 'x-auth-token'
+})
+SECRET_PARAMS = frozenset({'access_token', 'api_key', 'apikey', 'token', 'password', 'secretkey'})
+
+# Describe the original transfer, not the stored (decoded, whole) body
+TRANSFER_HEADERS = frozenset({'transfer-encoding', 'content-encoding', 'content-length'})
+
+
+def scrub_url(url: str) -> str:
+    """URL with secret query values redacted and parameters in a canonical order"""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    params = [(key, REDACTED if key.lower() in SECRET_PARAMS else value)
+              for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(sorted(params))))
+
+
+def scrub_headers(headers) -> Dict[str, str]:
+    return {key: REDACTED if key.lower() in SECRET_HEADERS else value for key, value in headers.items()}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class Cassette:
+    """Recorded interactions, indexed by (method, scrubbed URL)"""
+
+    def __init__(self, interactions: Iterable[Dict] = ()):
+        self.interactions: List[Dict] = []
+        self._index: Dict[Tuple[str, str], List[Dict]] = {}
+        self._cursor: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        for interaction in interactions:
+            self.append(interaction)
+
+    @staticmethod
+    def _open(path: Path, mode: str):
+        if str(path).endswith('.gz'):
+            return gzip.open(path, mode + 't', encoding='utf-8')
+        return open(path, mode, encoding='utf-8')
+
+    @classmethod
+    def load(cls, path) -> 'Cassette':
+        with cls._open(Path(path), 'r') as f:
+            return cls(json.loads(line) for line in f if line.strip())
+
+    def save(self, path):
+        with self._lock:
+            interactions = list(self.interactions)
+        with self._open(Path(path), 'w') as f:
+            for interaction in interactions:
+                f.write(json.dumps(interaction, separators=(',', ':')) + '\n')
+
+    def append(self, interaction: Dict):
+        with self._lock:
+            self.interactions.append(interaction)
+            self._index.setdefault((interaction['method'], interaction['url']), []).append(interaction)
+
+    def match(self, method: str, url: str) -> Optional[Dict]:
+        """Next recorded interaction for this request, or None"""
+        key = (method, url)
+        with self._lock:
+            recorded = self._index.get(key)
+            if not recorded:
+                return None
+            position = self._cursor.get(key, 0)
+            self._cursor[key] = (position + 1) % len(recorded)
+            return recorded[position]
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def latency_stats(self) -> Dict[str, Dict]:
+        """Per URL path: request count, status codes and latency distribution in seconds"""
+        by_path: Dict[str, List[Dict]] = {}
+        for interaction in self.interactions:
+            by_path.setdefault(urlsplit(interaction['url']).path, []).append(interaction)
+
+        stats = {}
+        for path, interactions in sorted(by_path.items()):
+            latencies = sorted(interaction['elapsed'] for interaction in interactions)
+            statuses: Dict[int, int] = {}
+            for interaction in interactions:
+                statuses[interaction['status']] = statuses.get(interaction['status'], 0) + 1
+            stats[path] = {
+                'count': len(latencies),
+                'statuses': statuses,
+                'min': latencies[0],
+                'p50': _percentile(latencies, 0.5),
+                'p90': _percentile(latencies, 0.9),
+                'p99': _percentile(latencies, 0.99),
+                'max': latencies[-1],
+                'mean': sum(latencies) / len(latencies)
+            }
+        return stats
+
+
+class CassetteTransport(HTTPAdapter):
+    """
+    requests transport adapter recording to and replaying from a Cassette
+
+    path, if given, is loaded when it exists (record mode starts empty) and
+    written by save(), and by close() after recording. upstream is the adapter recorded requests are
+    sent through. scrub_body is a list of (regex, replacement) pairs applied
+    to text bodies before they are stored.
+    """
+
+    def __init__(self, path=None, mode: str = 'replay', latency_scale: float = 0.0,
+                 scrub_body: Sequence[Tuple[str, str]] = (), cassette: Optional[Cassette] = None,
+                 upstream: Optional[HTTPAdapter] = None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        super().__init__()
+        self.path = Path(path) if path else None
+        if cassette is None:
+            existing = self.path is not None and self.path.exists() and mode != 'record'
+            cassette = Cassette.load(self.path) if existing else Cassette()
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.scrub_body = [(re.compile(pattern), replacement) for pattern, replacement in scrub_body]
+        self.upstream = upstream or HTTPAdapter()
+        self.recorded = 0
+        self.replayed = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = scrub_url(request.url)
+        if self.mode != 'record':
+            interaction = self.cassette.match(request.method, url)
+            if interaction is not None:
+                self.replayed += 1
+                if self.latency_scale:
+                    time.sleep(interaction['elapsed'] * self.latency_scale)
+                return self._replay(request, interaction)
+            if self.mode == 'replay':
+                raise requests.exceptions.ConnectionError(
+                    f"No recorded response for {request.method} {url}", request=request)
+
+        started = time.perf_counter()
+        response = self.upstream.send(request, stream=False, timeout=timeout, verify=verify,
+                                      cert=cert, proxies=proxies)
+        self.cassette.append(self._interaction(request, url, response, time.perf_counter() - started))
+        self.recorded += 1
+        # The caller gets the live response, unscrubbed
+        return self._response(request, response.status_code, response.reason, response.headers, response.content)
+
+    def _interaction(self, request, url: str, response: requests.Response, elapsed: float) -> Dict:
+        body = response.content
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            text = None
+        if text is not None:
+            for pattern, replacement in self.scrub_body:
+                text = pattern.sub(replacement, text)
+        return {
+            'method': request.method,
+            'url': url,
+            'request_headers': scrub_headers(request.headers),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': scrub_headers(response.headers),
+            'body': text if text is not None else base64.b64encode(body).decode('ascii'),
+            'body_encoding': 'utf-8' if text is not None else 'base64',
+            'elapsed': elapsed
+        }
+
+    def _replay(self, request, interaction: Dict) -> requests.Response:
+        body = interaction['body']
+        body = base64.b64decode(body) if interaction['body_encoding'] == 'base64' else body.encode('utf-8')
+        return self._response(request, interaction['status'], interaction.get('reason'), interaction['headers'], body)
+
+    def _response(self, request, status: int, reason: Optional[str], headers, body: bytes) -> requests.Response:
+        """A fresh response around a whole, decoded body, readable whole or streamed"""
+        headers = {key: value for key, value in headers.items() if key.lower() not in TRANSFER_HEADERS}
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, reason=reason,
+                           preload_content=False, decode_content=False)
+        return self.build_response(request, raw)
+
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            raise ValueError("No cassette path to save to")
+        self.cassette.save(path)
+
+    def close(self):
+        if self.recorded and self.path is not None:
+            self.save()
+        self.upstream.close()
+        super().close()
+
+
+def mount_transport(session: requests.Session, transport: Optional[HTTPAdapter]):
+    """Route every request of a session through transport (no-op for None)"""
+    if transport is not None:
+        session.mount('https://', transport)
+        session.mount('http://', transport)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description='Inspect recorded API cassettes')
+    parser.add_argument('command', choices=['stats'])
+    parser.add_argument('cassette', help='Cassette file (.jsonl or .jsonl.gz)')
+    args = parser.parse_args(argv)
+
+    cassette = Cassette.load(args.cassette)
+    print(f"{len(cassette)} interactions in {args.cassette}\n")
+    print(f"{'path':<60} {'count':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    for path, stats in cassette.latency_stats().items():
+        statuses = ', '.join(f'{status}x{count}' for status, count in sorted(stats['statuses'].items()))
+        print(f"{path:<60} {stats['count']:>6} {stats['p50'] * 1000:>8.1f} {stats['p90'] * 1000:>8.1f} "
+              f"{stats['p99'] * 1000:>8.1f} {stats['max'] * 1000:>8.1f}  {statuses}")
+
+
+if __name__ == '__main__':
+    main()
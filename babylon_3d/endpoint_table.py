@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Endpoint Table
+Columnar store of FortiGate user devices for fast dashboard aggregations
+
+Records from FortiGateAPIClient.get_user_devices / iter_user_devices are
+appended one at a time into compact typed buffers; build() turns them into
+NumPy arrays. Text fields that repeat across endpoints (vendor, OS,
+interface, device type, status, attachment) are stored as categorical
+integer codes, so counts and group-bys become np.bincount calls instead of
+Python loops over dicts. A MAC index maps each endpoint back to its row.
+"""
+
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Categorical columns and the FortiOS fields they are read from, in order of preference
+CATEGORICAL_FIELDS = {
+    'vendor': ('hardware_vendor', 'vendor'),
+    'os': ('os_name', 'os_type', 'os'),
+    'interface': ('detected_interface', 'src_intf', 'interface'),
+    'device_type': ('hardware_type', 'devtype', 'device_type'),
+    # Where the endpoint attaches, for level-of-detail grouping (topology_lod.py)
+    'access_point': ('fortiap_name', 'fortiap_id'),
+    'switch': ('fortiswitch_id',),
+    'switch_port': ('fortiswitch_port_name', 'fortiswitch_port_id'),
+}
+# Columns broken down in summary(); the attachment columns have one category per AP or port
+SUMMARY_COLUMNS = ('vendor', 'os', 'interface', 'device_type')
+ONLINE_FIELDS = ('is_online', 'online')
+UNKNOWN = 'Unknown'
+STATUS_CATEGORIES = ('offline', 'online')
+
+
+def _first_value(record: Dict, fields: Iterable[str]) -> Any:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+class EndpointTableBuilder:
+    """Accumulate endpoint records into typed buffers, one record at a time"""
+
+    def __init__(self):
+        self._macs: List[str] = []
+        self._hostnames: List[str] = []
+        self._ips: List[str] = []
+        self._users: List[str] = []
+        self._last_seen = array('d')
+        self._online = array('b')
+        self._codes = {column: array('i') for column in CATEGORICAL_FIELDS}
+        self._categories: Dict[str, Dict[str, int]] = {column: {} for column in CATEGORICAL_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._macs)
+
+    def append(self, record: Dict) -> None:
+        self._macs.append(str(record.get('mac', '')).lower())
+        self._hostnames.append(record.get('hostname') or record.get('name') or '')
+        self._ips.append(record.get('ip') or record.get('ipv4_address') or '')
+        self._users.append(record.get('user') or '')
+
+        last_seen = record.get('last_seen')
+        self._last_seen.append(float(last_seen) if isinstance(last_seen, (int, float)) else np.nan)
+
+        online = _first_value(record, ONLINE_FIELDS)
+        self._online.append(1 if online in (True, 1, 'true', 'online', 'up') else 0)
+
+        for column, fields in CATEGORICAL_FIELDS.items():
+            value = _first_value(record, fields)
+            self._codes[column].append(self._code(column, str(value) if value is not None else UNKNOWN))
+
+    def _code(self, column: str, label: str) -> int:
+        categories = self._categories[column]
+        code = categories.get(label)
+        if code is None:
+            code = categories[label] = len(categories)
+        return code
+
+    def locate_ports(self, locate: Callable[[str, str], Any]) -> int:
+        """
+        Set each row's switch and switch port from locate(mac, ip)
+
+        locate returns a (switch, port, ...) location, or None to keep what
+        the record reported (see PhysicalIndex.locate). Returns the number of
+        rows located.
+        """
+        switches, ports = self._codes['switch'], self._codes['switch_port']
+        located = 0
+        for row, (mac, ip) in enumerate(zip(self._macs, self._ips)):
+            location = locate(mac, ip)
+            if location is not None:
+                switches[row] = self._code('switch', str(location[0]))
+                ports[row] = self._code('switch_port', str(location[1]))
+                located += 1
+        return located
+
+    def attribute_interfaces(self, attribute: Callable[[List[str]], Sequence[Optional[str]]]) -> int:
+        """
+        Fill in the interface of rows that did not report one from attribute(ips)
+
+        attribute maps a batch of IPs to interface names, None where it has
+        no answer (see SubnetIndex.interfaces_for). Returns the number of rows
+        filled in.
+        """
+        codes = self._codes['interface']
+        unknown = self._categories['interface'].get(UNKNOWN)
+        if unknown is None:
+            return 0
+        rows = [row for row in np.flatnonzero(np.frombuffer(codes, dtype=np.int32) == unknown) if self._ips[row]]
+        filled = 0
+        for row, name in zip(rows, attribute([self._ips[row] for row in rows])):
+            if name:
+                codes[row] = self._code('interface', str(name))
+                filled += 1
+        return filled
+
+    def extend(self, records: Iterable[Dict]) -> 'EndpointTableBuilder':
+        for record in records:
+            self.append(record)
+        return self
+
+    def build(self) -> 'EndpointTable':
+        return EndpointTable(
+            macs=np.array(self._macs, dtype=object),
+            hostnames=np.array(self._hostnames, dtype=object),
+            ips=np.array(self._ips, dtype=object),
+            users=np.array(self._users, dtype=object),
+            last_seen=np.frombuffer(self._last_seen, dtype=np.float64).copy(),
+            online=np.frombuffer(self._online, dtype=np.int8).astype(bool),
+            codes={column: np.frombuffer(codes, dtype=np.int32).copy() for column, codes in self._codes.items()},
+            categories={column: list(categories) for column, categories in self._categories.items()}
+        )
+
+
+class EndpointTable:
+    """
+    Columnar endpoint inventory
+
+    Every aggregation accepts an optional boolean mask (from where() or
+    seen_since()) so filters and group-bys compose without copying rows.
+    """
+
+    def __init__(self, macs: np.ndarray, hostnames: np.ndarray, last_seen: np.ndarray, online: np.ndarray,
+                 codes: Dict[str, np.ndarray], categories: Dict[str, List[str]],
+                 ips: Optional[np.ndarray] = None, users: Optional[np.ndarray] = None):
+        self.macs = macs
+        self.hostnames = hostnames
+        self.ips = ips if ips is not None else np.full(len(macs), '', dtype=object)
+        self.users = users if users is not None else np.full(len(macs), '', dtype=object)
+        self.last_seen = last_seen
+        self.online = online
+        self.codes = codes
+        self.categories = categories
+        self._mac_index = {mac: row for row, mac in enumerate(macs) if mac}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'EndpointTable':
+        """Build a table from get_user_devices output (a list or a lazy page iterator)"""
+        return EndpointTableBuilder().extend(records).build()
+
+    def __len__(self) -> int:
+        return len(self.macs)
+
+    def status_codes(self) -> np.ndarray:
+        return self.online.astype(np.int32)
+
+    def _column(self, column: str):
+        if column == 'status':
+            return self.status_codes(), list(STATUS_CATEGORIES)
+        if column not in self.codes:
+            raise KeyError(f"Unknown endpoint column: {column}")
+        return self.codes[column], self.categories[column]
+
+    def where(self, **conditions: str) -> np.ndarray:
+        """Boolean mask of rows whose categorical columns equal the given labels"""
+        mask = np.ones(len(self), dtype=bool)
+        for column, label in conditions.items():
+            codes, categories = self._column(column)
+            if label not in categories:
+                return np.zeros(len(self), dtype=bool)
+            mask &= codes == categories.index(label)
+        return mask
+
+    def seen_since(self, timestamp: float) -> np.ndarray:
+        """Boolean mask of rows last seen at or after timestamp (epoch seconds)"""
+        with np.errstate(invalid='ignore'):
+            return self.last_seen >= timestamp
+
+    def count_by(self, column: str, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Row count per category of column, largest first, empty categories omitted"""
+        codes, categories = self._column(column)
+        if mask is not None:
+            codes = codes[mask]
+        counts = np.bincount(codes, minlength=len(categories))
+        order = np.argsort(-counts, kind='stable')
+        return {categories[i]: int(counts[i]) for i in order if counts[i]}
+
+    def crosstab(self, rows: str, columns: str, mask: Optional[np.ndarray] = None) -> Dict[str, Dict[str, int]]:
+        """Counts for every (rows, columns) category pair, e.g. crosstab('interface', 'status')"""
+        row_codes, row_categories = self._column(rows)
+        col_codes, col_categories = self._column(columns)
+        if mask is not None:
+            row_codes, col_codes = row_codes[mask], col_codes[mask]
+        width = len(col_categories)
+        counts = np.bincount(row_codes * width + col_codes, minlength=len(row_categories) * width)
+        counts = counts.reshape(len(row_categories), width)
+        return {
+            row_categories[r]: {col_categories[c]: int(counts[r, c]) for c in range(width) if counts[r, c]}
+            for r in range(len(row_categories)) if counts[r].any()
+        }
+
+    def online_ratio(self, mask: Optional[np.ndarray] = None) -> float:
+        online = self.online if mask is None else self.online[mask]
+        return float(online.mean()) if online.size else 0.0
+
+    def lookup(self, mac: str) -> Optional[int]:
+        """Row number of the endpoint with this MAC address"""
+        return self._mac_index.get(mac.lower())
+
+    def row(self, index: int) -> Dict:
+        """One endpoint as a dict of decoded column values"""
+        record = {
+            'mac': self.macs[index],
+            'hostname': self.hostnames[index],
+            'ip': self.ips[index],
+            'user': self.users[index],
+            'last_seen': None if np.isnan(self.last_seen[index]) else float(self.last_seen[index]),
+            'online': bool(self.online[index]),
+        }
+        for column, codes in self.codes.items():
+            record[column] = self.categories[column][codes[index]]
+        return record
+
+    def summary(self, mask: Optional[np.ndarray] = None) -> Dict:
+        """Dashboard summary: totals, online ratio and per-column breakdowns"""
+        total = len(self) if mask is None else int(np.count_nonzero(mask))
+        online = int(np.count_nonzero(self.online if mask is None else self.online[mask]))
+        return {
+            'total': total,
+            'online': online,
+            'offline': total - online,
+            'online_ratio': round(online / total, 4) if total else 0.0,
+            **{f'by_{column}': self.count_by(column, mask) for column in SUMMARY_COLUMNS}
+        }
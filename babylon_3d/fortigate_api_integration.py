@@ -9,13 +9,28 @@ import json
 import ssl
 import urllib3
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence, Iterable, Iterator, AsyncIterator, Callable, Awaitable
 import logging
+import time
 from datetime import datetime
 import asyncio
 import aiohttp
 import certifi
 
+from endpoint_table import EndpointTable, EndpointTableBuilder
+from fortigate_common.correlation import PhysicalIndex, normalize_mac
+from fortigate_common.fields import project_results, projection_params
+from fortigate_common.paging import DEFAULT_PAGE_SIZE, aiter_paged, iter_paged
+from fortigate_common.records import (
+    FORTIGATE_ID, Endpoint, Firewall, FortiAP, Interface, Link, ManagedSwitch, records_to_dicts
+)
+from fortigate_common.streaming import IncompleteResults, aiter_json_results, iter_json_results, require_complete
+from service_metrics import InstrumentedAdapter, endpoint_label
+from single_flight import SingleFlight, flight_key
+from subnet_index import SubnetIndex
+from topology_layout import PositionCache, apply_layout
+from topology_lod import group_endpoints
+
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -23,10 +38,25 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 
+def merge_system_status(data: Dict) -> Dict:
+    """Flatten a monitor/system/status response into a single status dict"""
+    # Extract the actual status from results
+    results = data.get('results', {})
+    # Merge top-level fields with results for easier access
+    return {
+        **results,
+        'serial': data.get('serial', results.get('serial', 'Unknown')),
+        'version': data.get('version', results.get('version', 'Unknown')),
+        'hostname': results.get('hostname', data.get('hostname', 'FortiGate')),
+        'status': data.get('status', 'unknown')
+    }
+
+
 class FortiGateAPIClient:
     """Client for interacting with FortiGate REST API"""
     
-    def __init__(self, host: str, username: str, password: str, port: int = 443, verify_ssl: bool = False, api_token: str = None):
+    def __init__(self, host: str, username: str, password: str, port: int = 443, verify_ssl: bool = False,
+                 api_token: str = None, metrics=None, transport=None):
         self.host = host
         self.port = port
         self.username = username
@@ -46,9 +76,48 @@ class FortiGateAPIClient:
         if api_token:
             self.session.headers.update({'Authorization': f'Bearer {api_token}'})
         
+        # Every session request goes through one adapter: the optional transport
+        # (e.g. api_replay.CassetteTransport), timed when metrics are given
+        self.metrics = metrics
+        self.transport = transport
+        adapter = InstrumentedAdapter(metrics, transport) if metrics is not None else transport
+        if adapter is not None:
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        
         self.csrf_token = None
         self.session_id = None
     
+    def _metric(self, hook: str, *args):
+        """Report to the optional metrics hooks; a no-op without metrics"""
+        if self.metrics is not None:
+            getattr(self.metrics, hook)(*args)
+    
+    def _json(self, response: requests.Response) -> Any:
+        """Decode a response's JSON body, reporting the time it took to the parse hook"""
+        if self.metrics is None:
+            return response.json()
+        started = time.perf_counter()
+        data = response.json()
+        self._metric('parse', endpoint_label(response.url), time.perf_counter() - started)
+        return data
+    
+    def _timed_records(self, endpoint: str, records: Iterator[Dict]) -> Iterator[Dict]:
+        """Pass streamed records through, reporting the time spent reading and parsing them"""
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    record = next(records)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield record
+        finally:
+            self._metric('parse', endpoint, elapsed)
+    
     def login(self) -> bool:
         """Authenticate using API token - no login needed for REST API"""
         try:
@@ -107,18 +176,7 @@ class FortiGateAPIClient:
             response = self.session.get(url)
             
             if response.status_code == 200:
-                data = response.json()
-                # Extract the actual status from results
-                results = data.get('results', {})
-                # Merge top-level fields with results for easier access
-                status_data = {
-                    **results,
-                    'serial': data.get('serial', results.get('serial', 'Unknown')),
-                    'version': data.get('version', results.get('version', 'Unknown')),
-                    'hostname': results.get('hostname', data.get('hostname', 'FortiGate')),
-                    'status': data.get('status', 'unknown')
-                }
-                return status_data
+                return merge_system_status(self._json(response))
             else:
                 logger.error(f"Failed to get system status: {response.status_code}")
                 return {}
@@ -133,7 +191,7 @@ class FortiGateAPIClient:
             response = self.session.get(url)
             
             if response.status_code == 200:
-                data = response.json()
+                data = self._json(response)
                 return data
             else:
                 logger.error(f"Failed to get system info: {response.status_code}")
@@ -142,13 +200,14 @@ class FortiGateAPIClient:
             logger.error(f"Failed to get system info: {e}")
             return {}
     
-    def get_interfaces(self) -> List[Dict]:
+    def get_interfaces(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get network interface information"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v2/cmdb/system/interface")
+            response = self.session.get(f"{self.base_url}/api/v2/cmdb/system/interface",
+                                        params=projection_params("cmdb/system/interface", fields))
             response.raise_for_status()
-            data = response.json()
-            return data.get('results', [])
+            data = self._json(response)
+            return project_results(data.get('results', []), fields)
         except Exception as e:
             logger.error(f"Failed to get interfaces: {e}")
             return []
@@ -158,51 +217,55 @@ class FortiGateAPIClient:
         try:
             response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/policy")
             response.raise_for_status()
-            data = response.json()
+            data = self._json(response)
             return data.get('results', [])
         except Exception as e:
             logger.error(f"Failed to get firewall policies: {e}")
     
-    def get_addresses(self) -> List[Dict]:
+    def get_addresses(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get firewall address objects"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/address")
+            response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/address",
+                                        params=projection_params("cmdb/firewall/address", fields))
             response.raise_for_status()
-            data = response.json()
-            return data.get('results', [])
+            data = self._json(response)
+            return project_results(data.get('results', []), fields)
         except Exception as e:
             logger.error(f"Failed to get addresses: {e}")
             return []
     
-    def get_firewall_policies(self) -> List[Dict]:
+    def get_firewall_policies(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get firewall policies"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/policy")
+            response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/policy",
+                                        params=projection_params("cmdb/firewall/policy", fields))
             response.raise_for_status()
-            data = response.json()
-            return data.get('results', [])
+            data = self._json(response)
+            return project_results(data.get('results', []), fields)
         except Exception as e:
             logger.error(f"Failed to get firewall policies: {e}")
             return []
     
-    def get_vips(self) -> List[Dict]:
+    def get_vips(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get VIP (Virtual IP) objects"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/vip")
+            response = self.session.get(f"{self.base_url}/api/v2/cmdb/firewall/vip",
+                                        params=projection_params("cmdb/firewall/vip", fields))
             response.raise_for_status()
-            data = response.json()
-            return data.get('results', [])
+            data = self._json(response)
+            return project_results(data.get('results', []), fields)
         except Exception as e:
             logger.error(f"Failed to get VIPs: {e}")
             return []
     
-    def get_dhcp_servers(self) -> List[Dict]:
+    def get_dhcp_servers(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get DHCP server information"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v2/cmdb/system/dhcp/server")
+            response = self.session.get(f"{self.base_url}/api/v2/cmdb/system/dhcp/server",
+                                        params=projection_params("cmdb/system/dhcp/server", fields))
             response.raise_for_status()
-            data = response.json()
-            return data.get('results', [])
+            data = self._json(response)
+            return project_results(data.get('results', []), fields)
         except Exception as e:
             logger.error(f"Failed to get DHCP servers: {e}")
             return []
@@ -212,20 +275,20 @@ class FortiGateAPIClient:
         try:
             response = self.session.get(f"{self.base_url}/api/v2/cmdb/wifi")
             response.raise_for_status()
-            return response.json()
+            return self._json(response)
         except Exception as e:
             logger.error(f"Failed to get WiFi settings: {e}")
             return {}
     
-    def get_wifi_ap_list(self) -> List[Dict]:
+    def get_wifi_ap_list(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get managed access points"""
         try:
             url = f"{self.base_url}/api/v2/monitor/wifi/managed_ap/select?vdom=root"
             response = self.session.get(url)
             
             if response.status_code == 200:
-                data = response.json()
-                return data.get('results', [])
+                data = self._json(response)
+                return project_results(data.get('results', []), fields)
             else:
                 logger.error(f"Failed to get AP list: {response.status_code}")
                 return []
@@ -238,20 +301,21 @@ class FortiGateAPIClient:
         try:
             response = self.session.get(f"{self.base_url}/api/v2/cmdb/switch-controller")
             response.raise_for_status()
-            return response.json()
+            return self._json(response)
         except Exception as e:
             logger.error(f"Failed to get switch controller: {e}")
             return {}
     
-    def get_managed_switches(self) -> List[Dict]:
+    def get_managed_switches(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get managed switches"""
         try:
-            url = f"{self.base_url}/api/v2/cmdb/switch-controller/managed-switch?vdom=root"
-            response = self.session.get(url)
+            path = "cmdb/switch-controller/managed-switch"
+            url = f"{self.base_url}/api/v2/{path}"
+            response = self.session.get(url, params=projection_params(path, fields, {'vdom': 'root'}))
             
             if response.status_code == 200:
-                data = response.json()
-                return data.get('results', [])
+                data = self._json(response)
+                return project_results(data.get('results', []), fields)
             else:
                 logger.error(f"Failed to get managed switches: {response.status_code}")
                 return []
@@ -259,15 +323,15 @@ class FortiGateAPIClient:
             logger.error(f"Failed to get managed switches: {e}")
             return []
     
-    def get_user_devices(self) -> List[Dict]:
+    def get_user_devices(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get connected user devices (endpoints)"""
         try:
             url = f"{self.base_url}/api/v2/monitor/user/device/query?vdom=root"
             response = self.session.get(url)
             
             if response.status_code == 200:
-                data = response.json()
-                return data.get('results', [])
+                data = self._json(response)
+                return project_results(data.get('results', []), fields)
             else:
                 logger.error(f"Failed to get user devices: {response.status_code}")
                 return []
@@ -275,24 +339,366 @@ class FortiGateAPIClient:
             logger.error(f"Failed to get user devices: {e}")
             return []
     
-    def get_dhcp_leases(self) -> List[Dict]:
+    def get_dhcp_leases(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
         """Get DHCP lease information"""
         try:
             response = self.session.get(f"{self.base_url}/api/v2/monitor/system/dhcp/lease")
             response.raise_for_status()
-            data = response.json()
-            return data.get('results', [])
+            data = self._json(response)
+            return project_results(data.get('results', []), fields)
         except Exception as e:
             logger.error(f"Failed to get DHCP leases: {e}")
             return []
+    
+    def _iter_results(self, path: str, params: Dict = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """
+        Walk a collection with FortiOS start/count paging, one page in memory at a time
+
+        A page that fails or whose body breaks off raises IncompleteResults
+        after the records read so far, instead of passing for the last page.
+        """
+        def fetch_page(start: int, count: int) -> Iterator[Dict]:
+            page_params = projection_params(path, fields, {**(params or {}), 'start': start, 'count': count})
+            try:
+                response = self.session.get(f"{self.base_url}/api/v2/{path}", params=page_params, stream=True)
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Failed to page {path} at offset {start}: {e}")
+                raise IncompleteResults(f"Failed to page {path} at offset {start}") from e
+            records = iter_json_results(response, fields)
+            if self.metrics is not None:
+                records = self._timed_records(endpoint_label(path), records)
+            return require_complete(records, path)
+        
+        return iter_paged(fetch_page, page_size)
+    
+    def iter_user_devices(self, page_size: int = DEFAULT_PAGE_SIZE,
+                          fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Stream connected user devices page by page"""
+        return self._iter_results("monitor/user/device/query", {'vdom': 'root'}, page_size, fields)
+    
+    def iter_dhcp_leases(self, page_size: int = DEFAULT_PAGE_SIZE,
+                         fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Stream DHCP leases page by page"""
+        return self._iter_results("monitor/system/dhcp/lease", None, page_size, fields)
+    
+    def iter_switch_mac_table(self, page_size: int = DEFAULT_PAGE_SIZE,
+                              fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Stream the MACs learned on each managed FortiSwitch port page by page"""
+        return self._iter_results("monitor/switch-controller/detected-device", {'vdom': 'root'}, page_size, fields)
+    
+    def iter_arp_table(self, page_size: int = DEFAULT_PAGE_SIZE,
+                       fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Stream the FortiGate ARP table page by page"""
+        return self._iter_results("monitor/network/arp", {'vdom': 'root'}, page_size, fields)
+
+
+class AsyncFortiGateAPIClient:
+    """
+    Non-blocking client for the FortiGate REST API
+
+    Mirrors the get_* surface of FortiGateAPIClient as coroutines. Each client
+    owns one keep-alive connection pool for its FortiGate, so TLS connections
+    are reused across requests, and limit_per_host caps how many requests are
+    in flight against the appliance at any time. Identical concurrent GETs
+    (same path, vdom and params) are coalesced into one request whose parsed
+    result every caller shares, so results must not be mutated. metrics, if
+    given, receives request/parse/error hook calls (see service_metrics).
+    """
+
+    def __init__(self, host: str, username: str = None, password: str = None, port: int = 443,
+                 verify_ssl: bool = False, api_token: str = None, max_in_flight: int = 8,
+                 timeout: float = 30, keepalive_timeout: float = 60, metrics=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.api_token = api_token
+        self.verify_ssl = verify_ssl
+        self.base_url = f"https://{host}:{port}"
+        self.max_in_flight = max_in_flight
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.keepalive_timeout = keepalive_timeout
+        self.metrics = metrics
+        self.headers = {'Content-Type': 'application/json'}
+
+        # If API token is provided, use it for authentication
+        if api_token:
+            self.headers['Authorization'] = f'Bearer {api_token}'
+
+        # One context for the lifetime of the client so handshakes on new
+        # connections do not reload the trust store
+        if verify_ssl:
+            self.ssl_context = ssl.create_default_context(cafile=certifi.where())
+        else:
+            self.ssl_context = ssl.create_default_context()
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.single_flight = SingleFlight()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Create the pooled session on first use (must run inside the event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.max_in_flight,
+                keepalive_timeout=self.keepalive_timeout,
+                ssl=self.ssl_context,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        """Close the connection pool"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_json(self, path: str, params: Dict = None) -> Optional[Any]:
+        """GET an API path and return the decoded JSON body, or None on failure"""
+        return await self.single_flight.do(flight_key(path, params), lambda: self._fetch_json(path, params))
+
+    def _metric(self, hook: str, *args):
+        """Report to the optional metrics hooks; a no-op without metrics"""
+        if self.metrics is not None:
+            getattr(self.metrics, hook)(*args)
+
+    async def _timed_records(self, endpoint: str, records: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        """Pass streamed records through, reporting the time spent reading and parsing them"""
+        elapsed = 0.0
+        iterator = records.__aiter__()
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    record = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield record
+        finally:
+            self._metric('parse', endpoint, elapsed)
+
+    async def _fetch_json(self, path: str, params: Dict = None) -> Optional[Any]:
+        endpoint = endpoint_label(path)
+        started = time.perf_counter()
+        try:
+            async with self._get_session().get(f"{self.base_url}{path}", params=params) as response:
+                self._metric('request', endpoint, time.perf_counter() - started, response.status)
+                if response.status == 200:
+                    started = time.perf_counter()
+                    data = await response.json(content_type=None)
+                    self._metric('parse', endpoint, time.perf_counter() - started)
+                    return data
+                text = await response.text()
+                logger.error(f"GET {path} failed: {response.status} - {text[:200]}")
+                return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self._metric('error', endpoint, type(e).__name__)
+            logger.error(f"GET {path} failed: {e}")
+            return None
+
+    async def _get_results(self, path: str, params: Dict = None,
+                           fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """GET an API path and return its 'results' list, projected to fields when given"""
+        data = await self._get_json(path, projection_params(path, fields, params))
+        if not isinstance(data, dict):
+            return []
+        return project_results(data.get('results', []), fields)
+
+    async def login(self) -> bool:
+        """Verify the API token with a lightweight status call"""
+        if not self.api_token:
+            logger.error("No API token provided")
+            return False
+
+        data = await self._get_json("/api/v2/monitor/system/status", {'vdom': 'root'})
+        if data is None:
+            logger.error(f"API token authentication failed for FortiGate at {self.host}")
+            return False
+
+        logger.info(f"Successfully authenticated with API token to FortiGate at {self.host}")
+        return True
+
+    async def test_connection(self) -> bool:
+        """Test connection to FortiGate"""
+        return await self.login()
+
+    async def get_system_status(self) -> Dict:
+        """Get FortiGate system status"""
+        data = await self._get_json("/api/v2/monitor/system/status", {'vdom': 'root'})
+        return merge_system_status(data) if isinstance(data, dict) else {}
+
+    async def get_system_info(self) -> Dict:
+        """Get system information"""
+        data = await self._get_json("/api/v2/cmdb/system/global", {'vdom': 'root'})
+        return data if isinstance(data, dict) else {}
+
+    async def get_interfaces(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get network interface information"""
+        return await self._get_results("/api/v2/cmdb/system/interface", fields=fields)
+
+    async def get_addresses(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get firewall address objects"""
+        return await self._get_results("/api/v2/cmdb/firewall/address", fields=fields)
+
+    async def get_firewall_policies(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get firewall policies"""
+        return await self._get_results("/api/v2/cmdb/firewall/policy", fields=fields)
+
+    async def get_vips(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get VIP (Virtual IP) objects"""
+        return await self._get_results("/api/v2/cmdb/firewall/vip", fields=fields)
+
+    async def get_dhcp_servers(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get DHCP server information"""
+        return await self._get_results("/api/v2/cmdb/system/dhcp/server", fields=fields)
+
+    async def get_wifi_settings(self) -> Dict:
+        """Get WiFi controller settings"""
+        data = await self._get_json("/api/v2/cmdb/wifi")
+        return data if isinstance(data, dict) else {}
+
+    async def get_wifi_ap_list(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get managed access points"""
+        return await self._get_results("/api/v2/monitor/wifi/managed_ap/select", {'vdom': 'root'}, fields)
+
+    async def get_switch_controller(self) -> Dict:
+        """Get switch controller information"""
+        data = await self._get_json("/api/v2/cmdb/switch-controller")
+        return data if isinstance(data, dict) else {}
+
+    async def get_managed_switches(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get managed switches"""
+        return await self._get_results("/api/v2/cmdb/switch-controller/managed-switch", {'vdom': 'root'}, fields)
+
+    async def get_user_devices(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get connected user devices (endpoints)"""
+        return await self._get_results("/api/v2/monitor/user/device/query", {'vdom': 'root'}, fields)
+
+    async def get_dhcp_leases(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get DHCP lease information"""
+        return await self._get_results("/api/v2/monitor/system/dhcp/lease", fields=fields)
+
+    def _iter_results(self, path: str, params: Dict = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      fields: Optional[Sequence[str]] = None) -> AsyncIterator[Dict]:
+        """
+        Walk a collection with FortiOS start/count paging, one page in memory at a time
+
+        A page that fails or whose body breaks off raises IncompleteResults
+        after the records read so far, instead of passing for the last page.
+        """
+        endpoint = endpoint_label(path)
+
+        async def fetch_page(start: int, count: int) -> AsyncIterator[Dict]:
+            page_params = projection_params(path, fields, {**(params or {}), 'start': start, 'count': count})
+            started = time.perf_counter()
+            try:
+                async with self._get_session().get(f"{self.base_url}{path}", params=page_params) as response:
+                    self._metric('request', endpoint, time.perf_counter() - started, response.status)
+                    if response.status != 200:
+                        logger.error(f"Failed to page {path} at offset {start}: HTTP {response.status}")
+                        raise IncompleteResults(f"Failed to page {path} at offset {start}: HTTP {response.status}")
+                    records = aiter_json_results(response, fields)
+                    if self.metrics is not None:
+                        records = self._timed_records(endpoint, records)
+                    async for record in records:
+                        yield record
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._metric('error', endpoint, type(e).__name__)
+                logger.error(f"Failed to page {path} at offset {start}: {e}")
+                raise IncompleteResults(f"Failed to page {path} at offset {start}") from e
+
+        return aiter_paged(fetch_page, page_size)
+
+    def iter_user_devices(self, page_size: int = DEFAULT_PAGE_SIZE,
+                          fields: Optional[Sequence[str]] = None) -> AsyncIterator[Dict]:
+        """Stream connected user devices page by page (use with async for)"""
+        return self._iter_results("/api/v2/monitor/user/device/query", {'vdom': 'root'}, page_size, fields)
+
+    def iter_dhcp_leases(self, page_size: int = DEFAULT_PAGE_SIZE,
+                         fields: Optional[Sequence[str]] = None) -> AsyncIterator[Dict]:
+        """Stream DHCP leases page by page (use with async for)"""
+        return self._iter_results("/api/v2/monitor/system/dhcp/lease", None, page_size, fields)
+
+    def iter_switch_mac_table(self, page_size: int = DEFAULT_PAGE_SIZE,
+                              fields: Optional[Sequence[str]] = None) -> AsyncIterator[Dict]:
+        """Stream the MACs learned on each managed FortiSwitch port (use with async for)"""
+        return self._iter_results("/api/v2/monitor/switch-controller/detected-device", {'vdom': 'root'},
+                                  page_size, fields)
+
+    def iter_arp_table(self, page_size: int = DEFAULT_PAGE_SIZE,
+                       fields: Optional[Sequence[str]] = None) -> AsyncIterator[Dict]:
+        """Stream the FortiGate ARP table (use with async for)"""
+        return self._iter_results("/api/v2/monitor/network/arp", {'vdom': 'root'}, page_size, fields)
 
 
 class NetworkTopologyBuilder:
-    """Build network topology from FortiGate data"""
+    """
+    Build network topology from FortiGate data
+    
+    self.topology holds the last build with its devices and connections as
+    fortigate_common.records objects (Endpoint, EndpointGroup, Link, ...),
+    not dicts. Callers that need the JSON shape use to_dict(), to_json() or
+    the return value of build_topology(); indexing builder.topology["devices"]
+    yields records whose fields are attributes.
+    """
+    
+    # Fields the builder reads from each collection; getters project responses to these
+    INTERFACE_FIELDS = ('name', 'status', 'ip', 'subnet', 'macaddr', 'mtu', 'speed', 'type', 'vlanid',
+                        'secondaryip', 'ipv6')
+    SWITCH_FIELDS = ('name', 'model', 'serial', 'ip', 'status', 'num_ports', 'sw_version')
+    ACCESS_POINT_FIELDS = ('name', 'model', 'serial', 'ip', 'status', 'wifi_clients', 'radio_1', 'radio_2',
+                           'ethernet_mac')
+    USER_DEVICE_FIELDS = ('mac', 'hostname', 'ip', 'os_type', 'user', 'last_seen', 'devtype',
+                          'hardware_vendor', 'os_name', 'detected_interface', 'is_online',
+                          'fortiap_name', 'fortiap_id', 'fortiswitch_id', 'fortiswitch_port_name')
+    MAC_TABLE_FIELDS = ('mac', 'switch_id', 'port_name', 'vlan_id')
+    ARP_FIELDS = ('ip', 'mac', 'interface')
+    DHCP_LEASE_FIELDS = ('ip', 'mac', 'hostname', 'interface')
+    DHCP_SERVER_FIELDS = ('id', 'interface', 'default-gateway', 'netmask', 'ip-range')
+    ADDRESS_FIELDS = ('name', 'type', 'subnet', 'start-ip', 'end-ip', 'associated-interface')
+    # Sites with more endpoints than this show them as groups per attachment point (topology_lod.py)
+    MAX_ENDPOINTS = 50
+    # Force-directed layout iterations for device positions (topology_layout.py); 0 keeps fixed offsets
+    LAYOUT_ITERATIONS = 100
+    # Iterations for relaxing just the changed devices when warm-starting from a position cache
+    LAYOUT_RELAX_ITERATIONS = 30
     
-    def __init__(self, api_client: FortiGateAPIClient):
+    def __init__(self, api_client, position_cache: Optional[PositionCache] = None):
         self.api_client = api_client
-        self.topology = {
+        # Positions of the previous layout, shared across builds to keep unchanged devices in place
+        self.position_cache = position_cache
+        # The last build; devices and connections are records, to_dict() gives plain dicts
+        self.topology = self._empty_topology()
+        # Every streamed endpoint, not just the placed ones (see endpoint_table.py)
+        self.endpoint_table = EndpointTableBuilder().build()
+        # Endpoints grouped by attachment point; expand() lists a group's members
+        self.endpoint_groups = group_endpoints(self.endpoint_table)
+        # Switch MAC tables joined with ARP and DHCP (fortigate_common/correlation.py)
+        self.physical = PhysicalIndex()
+        # Interface, DHCP scope and address object prefixes, for longest-prefix IP attribution
+        self.subnets = SubnetIndex()
+        # Streamed sections of the last build that broke off part way (kept with the rows read)
+        self.incomplete_sections: List[str] = []
+    
+    @staticmethod
+    def _empty_topology() -> Dict:
+        return {
             "devices": [],
             "connections": [],
             "metadata": {
@@ -301,159 +707,278 @@ class NetworkTopologyBuilder:
             }
         }
     
-    def build_topology(self) -> Dict:
-        """Build complete network topology"""
+    def build_topology(self, as_records: bool = False) -> Dict:
+        """
+        Build complete network topology
+        
+        Returns plain dicts by default; with as_records=True the devices and
+        connections stay as the compact records from fortigate_common.records.
+        """
         logger.info("Building network topology from FortiGate...")
+        self.incomplete_sections = []
         
-        # Get FortiGate system info
         system_status = self.api_client.get_system_status()
         system_info = self.api_client.get_system_info()
+        interfaces = self.api_client.get_interfaces(fields=self.INTERFACE_FIELDS)
+        switches = self.api_client.get_managed_switches(fields=self.SWITCH_FIELDS)
+        
+        # Get access points
+        try:
+            access_points = self.api_client.get_wifi_ap_list(fields=self.ACCESS_POINT_FIELDS)
+        except Exception as e:
+            logger.warning(f"Failed to get access points: {e}")
+            access_points = []
+        
+        # Switch MAC tables joined with ARP and DHCP, to place devices on their switch ports
+        try:
+            physical = PhysicalIndex(
+                self.api_client.iter_switch_mac_table(fields=self.MAC_TABLE_FIELDS),
+                self.api_client.iter_arp_table(fields=self.ARP_FIELDS),
+                self.api_client.iter_dhcp_leases(fields=self.DHCP_LEASE_FIELDS),
+                gateway_macs=self._gateway_macs(interfaces)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to correlate physical links: {e}")
+            physical = PhysicalIndex()
+        
+        # Subnets to attribute endpoints that do not report their interface
+        try:
+            subnets = SubnetIndex.from_fortigate(
+                interfaces,
+                self.api_client.get_dhcp_servers(fields=self.DHCP_SERVER_FIELDS),
+                self.api_client.get_addresses(fields=self.ADDRESS_FIELDS)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to index subnets: {e}")
+            subnets = SubnetIndex.from_fortigate(interfaces)
+        
+        # User devices are streamed page by page while the topology is assembled
+        user_devices = self.api_client.iter_user_devices(fields=self.USER_DEVICE_FIELDS)
+        
+        return self._assemble_topology(system_status, system_info, interfaces, switches, access_points,
+                                       user_devices, physical=physical, subnets=subnets, as_records=as_records)
+    
+    async def build_topology_async(self, as_records: bool = False) -> Dict:
+        """Build complete network topology from an AsyncFortiGateAPIClient, fetching all sections concurrently"""
+        logger.info("Building network topology from FortiGate...")
+        self.incomplete_sections = []
+        
+        results = await asyncio.gather(
+            self.api_client.get_system_status(),
+            self.api_client.get_system_info(),
+            self.api_client.get_interfaces(fields=self.INTERFACE_FIELDS),
+            self.api_client.get_managed_switches(fields=self.SWITCH_FIELDS),
+            self.api_client.get_wifi_ap_list(fields=self.ACCESS_POINT_FIELDS),
+            self._take_user_devices(self.MAX_ENDPOINTS),
+            self._collect('iter_switch_mac_table', self.MAC_TABLE_FIELDS),
+            self._collect('iter_arp_table', self.ARP_FIELDS),
+            self._collect('iter_dhcp_leases', self.DHCP_LEASE_FIELDS),
+            self.api_client.get_dhcp_servers(fields=self.DHCP_SERVER_FIELDS),
+            self.api_client.get_addresses(fields=self.ADDRESS_FIELDS),
+            return_exceptions=True
+        )
+        defaults = ({}, {}, [], [], [], ([], None), [], [], [], [], [])
+        sections = []
+        for result, default in zip(results, defaults):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to get topology section: {result}")
+                result = default
+            sections.append(result)
+        
+        (system_status, system_info, interfaces, switches, access_points, devices,
+         mac_table, arp, leases, dhcp_servers, addresses) = sections
+        user_devices, endpoint_table = devices
+        physical = PhysicalIndex(mac_table, arp, leases, gateway_macs=self._gateway_macs(interfaces))
+        subnets = SubnetIndex.from_fortigate(interfaces, dhcp_servers, addresses)
+        topology = self._assemble_topology(system_status, system_info, interfaces, switches, access_points,
+                                           user_devices, endpoint_table=endpoint_table, physical=physical,
+                                           subnets=subnets, layout=False, as_records=True)
+        # The layout is CPU-bound; keep it off the event loop
+        if self.LAYOUT_ITERATIONS:
+            await asyncio.get_running_loop().run_in_executor(None, self.layout_topology)
+        return topology if as_records else self.to_dict()
+    
+    async def _collect(self, iterator: str, fields: Sequence[str]) -> List[Dict]:
+        """Read a whole paged collection from the async client"""
+        return [record async for record in getattr(self.api_client, iterator)(fields=fields)]
+    
+    async def _take_user_devices(self, limit: int):
+        """Stream all user device pages, keeping the first limit records and a columnar table of all of them"""
+        kept, table = [], EndpointTableBuilder()
+        try:
+            async for device in self.api_client.iter_user_devices(fields=self.USER_DEVICE_FIELDS):
+                if len(table) < limit:
+                    kept.append(device)
+                table.append(device)
+        except IncompleteResults as e:
+            logger.warning(f"User devices are incomplete: {e}")
+            self.incomplete_sections.append('user_devices')
+        return kept, table
+    
+    def _assemble_topology(self, system_status: Dict, system_info: Dict, interfaces: List[Dict],
+                           switches: List[Dict], access_points: List[Dict], user_devices: Iterable[Dict],
+                           endpoint_table: Optional[EndpointTableBuilder] = None,
+                           physical: Optional[PhysicalIndex] = None, subnets: Optional[SubnetIndex] = None,
+                           layout: bool = True, as_records: bool = False) -> Dict:
+        """
+        Turn fetched FortiGate data into the topology device/connection graph
+        
+        user_devices may be a lazy page iterator; it is consumed once, the
+        placed endpoints are kept as records and every endpoint is appended to
+        self.endpoint_table. Pass endpoint_table when the rows were already
+        collected while streaming. physical places switches, APs and
+        endpoints on the switch ports their MACs are learned on; anything it
+        cannot place links straight to the FortiGate. subnets attributes
+        endpoints that did not report an interface to the one whose subnet
+        holds their IP. With layout, device positions come from
+        layout_topology().
+        """
+        self.topology = self._empty_topology()
+        self.physical = physical = physical if physical is not None else PhysicalIndex()
+        self.subnets = subnets = subnets if subnets is not None else SubnetIndex()
+        devices, connections = self.topology["devices"], self.topology["connections"]
+        # Node ids by the names and serials endpoints report their attachment with
+        attachments = {'access_points': {}, 'switches': {}, 'interfaces': {}}
+        vlans = set()
         
         # Add FortiGate as central device
         results = system_info.get('results', {})
         first_result = results if isinstance(results, dict) else (results[0] if results and isinstance(results, list) else {})
         
-        fortigate_device = {
-            "id": "fortigate_main",
-            "name": system_status.get('hostname', 'FortiGate'),
-            "type": "firewall",
-            "model": system_status.get('model', first_result.get('platform_str', 'Unknown')),
-            "serial": system_status.get('serial', 'Unknown'),
-            "version": system_status.get('version', 'Unknown'),
-            "ip": self.api_client.host,
-            "position": {"x": 0, "y": 0, "z": 0},
-            "metadata": {
-                "status": system_status.get('status', 'unknown'),
-                "cpu_usage": system_status.get('cpu_usage', 0),
-                "memory_usage": system_status.get('mem_usage', 0),
-                "uptime": system_status.get('uptime', 0)
-            }
-        }
-        self.topology["devices"].append(fortigate_device)
-        self.topology["metadata"]["fortigate_info"] = fortigate_device
+        fortigate_device = Firewall(
+            name=system_status.get('hostname', 'FortiGate'),
+            model=system_status.get('model', first_result.get('platform_str', 'Unknown')),
+            serial=system_status.get('serial', 'Unknown'),
+            version=system_status.get('version', 'Unknown'),
+            ip=self.api_client.host,
+            status=system_status.get('status', 'unknown'),
+            cpu_usage=system_status.get('cpu_usage', 0),
+            memory_usage=system_status.get('mem_usage', 0),
+            uptime=system_status.get('uptime', 0)
+        )
+        devices.append(fortigate_device)
+        self.topology["metadata"]["fortigate_info"] = fortigate_device.to_dict()
         
-        # Get network interfaces
-        interfaces = self.api_client.get_interfaces()
+        # Network interfaces
         for iface in interfaces:
             if iface.get('status') == 'up':
-                interface_device = {
-                    "id": f"interface_{iface.get('name', 'unknown')}",
-                    "name": iface.get('name', 'Unknown Interface'),
-                    "type": "interface",
-                    "ip": iface.get('ip', ''),
-                    "subnet": iface.get('subnet', ''),
-                    "connected_to": "fortigate_main",
-                    "position": {"x": 2, "y": 0, "z": 0},
-                    "metadata": {
-                        "mac": iface.get('macaddr', ''),
-                        "mtu": iface.get('mtu', 1500),
-                        "speed": iface.get('speed', 0)
-                    }
-                }
-                self.topology["devices"].append(interface_device)
+                interface_device = Interface(
+                    id=f"interface_{iface.get('name', 'unknown')}",
+                    name=iface.get('name', 'Unknown Interface'),
+                    ip=iface.get('ip', ''),
+                    subnet=iface.get('subnet', ''),
+                    mac=iface.get('macaddr', ''),
+                    mtu=iface.get('mtu', 1500),
+                    speed=iface.get('speed', 0)
+                )
+                devices.append(interface_device)
+                attachments['interfaces'][interface_device.name] = interface_device.id
+                if iface.get('type') == 'vlan' or iface.get('vlanid'):
+                    vlans.add(interface_device.name)
                 
                 # Create connection
-                self.topology["connections"].append({
-                    "source": "fortigate_main",
-                    "target": interface_device["id"],
-                    "type": "network",
-                    "bandwidth": iface.get('speed', 0)
-                })
+                connections.append(Link(FORTIGATE_ID, interface_device.id, "network", iface.get('speed', 0)))
         
-        # Get managed switches
-        switches = self.api_client.get_managed_switches()
-        for i, switch in enumerate(switches[:10]):  # Limit to first 10 switches
-            switch_device = {
-                "id": f"switch_{switch.get('name', f'switch_{i}')}",
-                "name": switch.get('name', f'Switch {i}'),
-                "type": "switch",
-                "model": switch.get('model', 'Unknown'),
-                "serial": switch.get('serial', 'Unknown'),
-                "ip": switch.get('ip', ''),
-                "position": {"x": -3, "y": 0, "z": i * 2},
-                "connected_to": "fortigate_main",
-                "metadata": {
-                    "status": switch.get('status', 'unknown'),
-                    "ports": switch.get('num_ports', 0),
-                    "firmware": switch.get('sw_version', 'Unknown')
-                }
-            }
-            self.topology["devices"].append(switch_device)
-            
-            # Create connection to FortiGate
-            self.topology["connections"].append({
-                "source": "fortigate_main",
-                "target": switch_device["id"],
-                "type": "network",
-                "bandwidth": 1000
-            })
+        # Managed switches
+        switch_devices = []
+        for i, switch in enumerate(switches):
+            switch_device = ManagedSwitch(
+                id=f"switch_{switch.get('name', f'switch_{i}')}",
+                name=switch.get('name', f'Switch {i}'),
+                model=switch.get('model', 'Unknown'),
+                serial=switch.get('serial', 'Unknown'),
+                ip=switch.get('ip', ''),
+                z=i * 2,
+                status=switch.get('status', 'unknown'),
+                ports=switch.get('num_ports', 0),
+                firmware=switch.get('sw_version', 'Unknown')
+            )
+            devices.append(switch_device)
+            switch_devices.append(switch_device)
+            attachments['switches'].update({switch_device.name: switch_device.id, switch_device.serial: switch_device.id})
         
-        # Get access points
-        try:
-            access_points = self.api_client.get_wifi_ap_list()
-        except Exception as e:
-            logger.warning(f"Failed to get access points: {e}")
-            access_points = []
-            
-        for i, ap in enumerate(access_points[:20]):  # Limit to first 20 APs
-            ap_device = {
-                "id": f"ap_{ap.get('name', f'ap_{i}')}",
-                "name": ap.get('name', f'AP {i}'),
-                "type": "access_point",
-                "model": ap.get('model', 'Unknown'),
-                "serial": ap.get('serial', 'Unknown'),
-                "ip": ap.get('ip', ''),
-                "position": {"x": 3, "y": 0, "z": i * 1.5},
-                "connected_to": "fortigate_main",
-                "metadata": {
-                    "status": ap.get('status', 'unknown'),
-                    "wifi_clients": ap.get('wifi_clients', 0),
-                    "radio_1": ap.get('radio_1', {}),
-                    "radio_2": ap.get('radio_2', {})
-                }
-            }
-            self.topology["devices"].append(ap_device)
+        # Switch uplinks: to the parent switch, the FortiLink interface, or the FortiGate
+        for switch_device in switch_devices:
+            connections.append(self._switch_link(switch_device, physical, attachments['switches']))
+        
+        # Access points
+        for i, ap in enumerate(access_points):
+            ap_device = FortiAP(
+                id=f"ap_{ap.get('name', f'ap_{i}')}",
+                name=ap.get('name', f'AP {i}'),
+                model=ap.get('model', 'Unknown'),
+                serial=ap.get('serial', 'Unknown'),
+                ip=ap.get('ip', ''),
+                z=i * 1.5,
+                status=ap.get('status', 'unknown'),
+                wifi_clients=ap.get('wifi_clients', 0),
+                radio_1=ap.get('radio_1', {}),
+                radio_2=ap.get('radio_2', {})
+            )
+            devices.append(ap_device)
+            attachments['access_points'].update({ap_device.name: ap_device.id, ap_device.serial: ap_device.id})
             
-            # Create connection to FortiGate
-            self.topology["connections"].append({
-                "source": "fortigate_main",
-                "target": ap_device["id"],
-                "type": "wifi",
-                "bandwidth": ap.get('radio_1', {}).get('max_bandwidth', 0)
-            })
+            # Create connection to the switch port the AP is plugged into, else the FortiGate
+            bandwidth = ap.get('radio_1', {}).get('max_bandwidth', 0)
+            location = physical.locate(ap.get('ethernet_mac'))
+            if location is not None and location.switch in attachments['switches']:
+                ap_device.connected_to = attachments['switches'][location.switch]
+                connections.append(Link(ap_device.connected_to, ap_device.id, "switch_port", bandwidth, port=location.port))
+            else:
+                connections.append(Link(FORTIGATE_ID, ap_device.id, "wifi", bandwidth))
         
-        # Get user devices
+        # User devices: every one goes into the endpoint table, the first few are kept as records
+        collect_rows = endpoint_table is None
+        table = EndpointTableBuilder() if collect_rows else endpoint_table
+        placed = []
         try:
-            user_devices = self.api_client.get_user_devices()
-        except Exception as e:
-            logger.warning(f"Failed to get user devices: {e}")
-            user_devices = []
-            
-        for i, device in enumerate(user_devices[:50]):  # Limit to first 50 devices
-            user_device = {
-                "id": f"device_{device.get('mac', f'device_{i}').replace(':', '_')}",
-                "name": device.get('hostname', f'Device {i}'),
-                "type": "endpoint",
-                "ip": device.get('ip', ''),
-                "mac": device.get('mac', ''),
-                "position": {"x": 5, "y": 0, "z": i * 0.5},
-                "connected_to": "fortigate_main",
-                "metadata": {
-                    "os": device.get('os_type', 'Unknown'),
-                    "user": device.get('user', 'Unknown'),
-                    "last_seen": device.get('last_seen', ''),
-                    "device_type": device.get('devtype', 'Unknown')
-                }
-            }
-            self.topology["devices"].append(user_device)
+            for i, device in enumerate(user_devices):
+                if collect_rows:
+                    table.append(device)
+                if i < self.MAX_ENDPOINTS:
+                    placed.append(device)
+        except IncompleteResults as e:
+            logger.warning(f"User devices are incomplete: {e}")
+            self.incomplete_sections.append('user_devices')
+        
+        if physical.locations:
+            table.locate_ports(physical.locate)
+        attributed = table.attribute_interfaces(subnets.interfaces_for) if len(subnets) else 0
+        self.endpoint_table = table.build()
+        self.endpoint_groups = group_endpoints(self.endpoint_table, vlans=vlans, **attachments)
+        grouped = len(self.endpoint_table) > self.MAX_ENDPOINTS
+        
+        if grouped:
+            # Large sites: one node per attachment point, expanded on demand
+            for group in self.endpoint_groups.groups:
+                devices.append(group)
+                connections.append(Link(group.connected_to, group.id, "endpoint_group", 100))
+        
+        for i, device in enumerate(placed if not grouped else ()):
+            location = physical.locate(device.get('mac'), device.get('ip'))
+            user_device = Endpoint(
+                id=f"device_{device.get('mac', f'device_{i}').replace(':', '_')}",
+                name=device.get('hostname', f'Device {i}'),
+                ip=device.get('ip') or physical.host(device.get('mac')).get('ip', ''),
+                mac=device.get('mac', ''),
+                z=i * 0.5,
+                os=device.get('os_type', 'Unknown'),
+                user=device.get('user', 'Unknown'),
+                last_seen=device.get('last_seen', ''),
+                device_type=device.get('devtype', 'Unknown')
+            )
+            devices.append(user_device)
             
-            # Create connection
-            self.topology["connections"].append({
-                "source": "fortigate_main",
-                "target": user_device["id"],
-                "type": "endpoint",
-                "bandwidth": 100
-            })
+            # Create connection from the endpoint's switch port or FortiAP, else the FortiGate
+            ap_id = attachments['access_points'].get(device.get('fortiap_name') or device.get('fortiap_id'))
+            if location is not None and location.switch in attachments['switches']:
+                user_device.connected_to = attachments['switches'][location.switch]
+                connections.append(Link(user_device.connected_to, user_device.id, "switch_port", 100, port=location.port))
+            elif ap_id is not None:
+                user_device.connected_to = ap_id
+                connections.append(Link(ap_id, user_device.id, "wifi", 100))
+            else:
+                connections.append(Link(FORTIGATE_ID, user_device.id, "endpoint", 100))
         
         # Update metadata
         self.topology["metadata"]["last_updated"] = datetime.now().isoformat()
@@ -461,18 +986,70 @@ class NetworkTopologyBuilder:
             "firewall": 1,
             "switch": len(switches),
             "access_point": len(access_points),
-            "endpoint": len(user_devices),
+            "endpoint": len(self.endpoint_table),
             "interface": len([i for i in interfaces if i.get('status') == 'up'])
         }
+        self.topology["metadata"]["endpoint_summary"] = self.endpoint_table.summary()
+        self.topology["metadata"]["level_of_detail"] = {
+            "endpoints": "grouped" if grouped else "individual",
+            "endpoint_groups": len(self.endpoint_groups)
+        }
+        self.topology["metadata"]["physical_links"] = physical.summary()
+        self.topology["metadata"]["subnets"] = {**subnets.summary(), "attributed_endpoints": attributed}
+        self.topology["metadata"]["incomplete_sections"] = list(self.incomplete_sections)
+        if layout and self.LAYOUT_ITERATIONS:
+            self.layout_topology()
         
         logger.info(f"Built topology with {len(self.topology['devices'])} devices and {len(self.topology['connections'])} connections")
-        return self.topology
+        return self.topology if as_records else self.to_dict()
+    
+    def layout_topology(self) -> Dict:
+        """Lay out the last built topology in 3D, setting every device's position"""
+        layout = apply_layout(self.topology["devices"], self.topology["connections"], cache=self.position_cache,
+                              relax_iterations=self.LAYOUT_RELAX_ITERATIONS, iterations=self.LAYOUT_ITERATIONS)
+        self.topology["metadata"]["layout"] = layout
+        return layout
+    
+    @staticmethod
+    def _gateway_macs(interfaces: List[Dict]) -> Dict[str, str]:
+        """The FortiGate's own MACs, mapped to the interface node switches uplink through"""
+        gateway_macs = {}
+        # VLANs share their parent interface's MAC; the parent is the node to link to
+        for iface in sorted(interfaces, key=lambda iface: iface.get('type') == 'vlan'):
+            mac = normalize_mac(iface.get('macaddr'))
+            if mac and iface.get('status') == 'up':
+                gateway_macs.setdefault(mac, f"interface_{iface.get('name', 'unknown')}")
+        return gateway_macs
+    
+    @staticmethod
+    def _switch_link(switch: ManagedSwitch, physical: PhysicalIndex, switch_ids: Dict[str, str]) -> Link:
+        """A switch's uplink, as far as the MAC tables tell it"""
+        uplink = physical.uplink(switch.serial) or physical.uplink(switch.name)
+        if uplink is not None and uplink.parent in switch_ids:
+            switch.connected_to = switch_ids[uplink.parent]
+            return Link(switch.connected_to, switch.id, "uplink", 1000, port=uplink.parent_port)
+        if uplink is not None and uplink.gateway:
+            switch.connected_to = uplink.gateway
+            return Link(uplink.gateway, switch.id, "fortilink", 1000, port=uplink.port)
+        return Link(FORTIGATE_ID, switch.id, "network", 1000)
+    
+    def to_dict(self) -> Dict:
+        """Return the last built topology in its JSON shape (plain dicts)"""
+        return {
+            "devices": records_to_dicts(self.topology["devices"]),
+            "connections": records_to_dicts(self.topology["connections"]),
+            "metadata": self.topology["metadata"]
+        }
+    
+    def to_json(self) -> str:
+        """Serialize the last built topology compactly"""
+        return json.dumps(self.to_dict(), separators=(',', ':'))
     
     def save_topology(self, output_path: Path):
         """Save topology to JSON file"""
         output_path.parent.mkdir(parents=True, exist_ok=True)
         with open(output_path, 'w') as f:
-            json.dump(self.topology, f, indent=2)
+            json.dump(self.to_dict(), f, indent=2)
         logger.info(f"Topology saved to {output_path}")
     
     def export_to_babylon_format(self) -> Dict:
@@ -484,7 +1061,8 @@ class NetworkTopologyBuilder:
             "metadata": self.topology["metadata"]
         }
         
-        for device in self.topology["devices"]:
+        for record in self.topology["devices"]:
+            device = record.to_dict()
             model = {
                 "name": device["id"],
                 "displayName": device["name"],
@@ -501,13 +1079,7 @@ class NetworkTopologyBuilder:
             babylon_data["models"].append(model)
         
         for conn in self.topology["connections"]:
-            connection = {
-                "source": conn["source"],
-                "target": conn["target"],
-                "type": conn["type"],
-                "bandwidth": conn.get("bandwidth", 0)
-            }
-            babylon_data["connections"].append(connection)
+            babylon_data["connections"].append(conn.to_dict())
         
         return babylon_data
 
@@ -0,0 +1,15 @@
+"""
+FortiGate helpers shared by the babylon_3d service and the root-level clients
+
+The babylon_3d service imports this package as fortigate_common (its own
+directory is on sys.path); scripts at the repository root import it as
+babylon_3d.fortigate_common. Modules here only use relative imports among
+themselves and the standard library, so both names work without either
+tree adding the other to sys.path.
+
+    fields       ?format= projection and its client-side fallback
+    paging       start/count paging
+    streaming    incremental parsing of 'results' arrays
+    correlation  physical links from switch MAC tables, ARP and DHCP
+    records      slotted records for topology nodes, links and client entities
+"""
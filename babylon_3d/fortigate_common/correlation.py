@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Topology Correlation
+Physical links from FortiSwitch MAC tables, ARP and DHCP leases
+
+user/device/query says which FortiGate interface a device was seen on, not
+where it is plugged in. PhysicalIndex joins the switch MAC tables
+(switch-controller/detected-device) with the ARP table and DHCP leases
+through hash indexes on MAC and IP:
+
+    mac -> PortLocation    the access port each MAC is learned on
+    ip  -> mac             DHCP leases, then ARP (ARP wins)
+    mac -> host            IP, hostname and FortiGate interface
+
+Ports that learn one of the FortiGate's own MACs are uplinks. A MAC
+learned on several other ports is placed on the one that learned the fewest
+MACs, since an access port sits below every port that also sees its
+traffic. The losing ports tell which switch sits above which, so tiered
+switches hang off their parent's port and top-tier switches off the
+FortiGate interface their uplink learns. Every table is read once and
+every lookup is a dict hit, so the join stays linear in the number of MAC
+entries.
+"""
+
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+
+class PortLocation(NamedTuple):
+    """Where a MAC is learned: switch id, port name and VLAN"""
+    switch: str
+    port: str
+    vlan: Any = None
+
+
+class Uplink(NamedTuple):
+    """
+    How a switch reaches the FortiGate
+
+    port is the switch's own uplink port. A tiered switch has the parent
+    switch and parent_port it hangs off; a top-tier switch has the gateway
+    node (a FortiGate interface) its uplink learns.
+    """
+    port: Optional[str] = None
+    parent: Optional[str] = None
+    parent_port: Optional[str] = None
+    gateway: Optional[str] = None
+
+
+def normalize_mac(mac: Any) -> str:
+    """Lower-case, colon-separated MAC address ('' for anything else)"""
+    if not isinstance(mac, str):
+        return ''
+    mac = mac.strip().lower()
+    if len(mac) == 17 and mac[2] == ':':
+        return mac
+    digits = mac.replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        return ''
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+class PhysicalIndex:
+    """Hash indexes joining switch MAC tables, ARP and DHCP leases"""
+
+    def __init__(self, mac_table: Iterable[Dict] = (), arp: Iterable[Dict] = (), leases: Iterable[Dict] = (),
+                 gateway_macs: Optional[Dict[str, str]] = None):
+        """
+        mac_table holds detected-device entries (mac, switch_id, port_name,
+        vlan_id), arp holds network/arp entries (ip, mac, interface) and
+        leases DHCP leases (ip, mac, hostname, interface). Each may be a lazy
+        page iterator; it is read once. gateway_macs maps the FortiGate's own
+        MACs to the topology node switches uplink to, usually the FortiLink
+        interface.
+        """
+        self.gateway_macs = {}
+        for mac, node in (gateway_macs or {}).items():
+            mac = normalize_mac(mac)
+            if mac:
+                self.gateway_macs.setdefault(mac, node)
+        self.locations: Dict[str, PortLocation] = {}
+        self.mac_for_ip: Dict[str, str] = {}
+        self.hosts: Dict[str, Dict] = {}
+        # MACs learned per switch, in the order the switches first appear
+        self.switches: Dict[str, int] = {}
+        self.entries = 0
+        self._uplinks: Dict[str, Tuple[str, str]] = {}
+        self._parents: Dict[str, Tuple[int, str, str]] = {}
+        self._index_mac_table(mac_table)
+        self._index_hosts(leases, arp)
+        self._break_cycles()
+
+    def _index_mac_table(self, mac_table: Iterable[Dict]):
+        learned = []
+        port_counts: Dict[Tuple[str, str], int] = {}
+        uplink_ports: Set[Tuple[str, str]] = set()
+        for entry in mac_table:
+            mac = normalize_mac(entry.get('mac'))
+            switch, port = entry.get('switch_id'), entry.get('port_name')
+            if not mac or not switch or not port:
+                continue
+            self.entries += 1
+            self.switches[switch] = self.switches.get(switch, 0) + 1
+            key = (switch, port)
+            port_counts[key] = port_counts.get(key, 0) + 1
+            gateway = self.gateway_macs.get(mac)
+            if gateway is not None:
+                self._uplinks.setdefault(switch, (port, gateway))
+                uplink_ports.add(key)
+            else:
+                learned.append((mac, key, entry.get('vlan_id')))
+
+        # Place each MAC on its least crowded non-uplink port; a port it loses
+        # to on another switch is upstream of the winner's switch
+        best: Dict[str, Tuple[Tuple[str, str], Any]] = {}
+        for mac, key, vlan in learned:
+            if key in uplink_ports:
+                continue
+            current = best.get(mac)
+            if current is None:
+                best[mac] = (key, vlan)
+                continue
+            if port_counts[key] < port_counts[current[0]]:
+                best[mac], loser = (key, vlan), current[0]
+            else:
+                loser = key
+            winner = best[mac][0][0]
+            if loser[0] != winner:
+                candidate = (port_counts[loser], loser[0], loser[1])
+                parent = self._parents.get(winner)
+                if parent is None or candidate[0] < parent[0]:
+                    self._parents[winner] = candidate
+
+        self.locations = {mac: PortLocation(key[0], key[1], vlan) for mac, (key, vlan) in best.items()}
+
+    def _index_hosts(self, leases: Iterable[Dict], arp: Iterable[Dict]):
+        # ARP is read last so current entries win over leases
+        for records in (leases, arp):
+            for record in records:
+                mac = normalize_mac(record.get('mac'))
+                if not mac:
+                    continue
+                host = self.hosts.setdefault(mac, {})
+                ip = record.get('ip')
+                if ip:
+                    self.mac_for_ip[ip] = mac
+                    host['ip'] = ip
+                for key in ('hostname', 'interface'):
+                    if record.get(key):
+                        host[key] = record[key]
+
+    def _break_cycles(self):
+        """Drop parent links that would loop back (conflicting MAC tables)"""
+        for switch in list(self._parents):
+            seen, current = {switch}, self._parents.get(switch)
+            while current is not None:
+                if current[1] in seen:
+                    del self._parents[switch]
+                    break
+                seen.add(current[1])
+                current = self._parents.get(current[1])
+
+    def resolve_mac(self, mac: Any = None, ip: Optional[str] = None) -> str:
+        """A device's MAC, looked up by IP when it did not report one"""
+        return normalize_mac(mac) or (self.mac_for_ip.get(ip, '') if ip else '')
+
+    def locate(self, mac: Any = None, ip: Optional[str] = None) -> Optional[PortLocation]:
+        """The switch port a device (by MAC, else IP) is plugged into"""
+        return self.locations.get(self.resolve_mac(mac, ip))
+
+    def host(self, mac: Any = None, ip: Optional[str] = None) -> Dict:
+        """IP, hostname and interface known for a device from ARP and DHCP"""
+        return self.hosts.get(self.resolve_mac(mac, ip), {})
+
+    def uplink(self, switch: str) -> Optional[Uplink]:
+        """How switch reaches the FortiGate, or None if the MAC tables do not say"""
+        own = self._uplinks.get(switch)
+        parent = self._parents.get(switch)
+        if parent is not None:
+            return Uplink(port=own[0] if own else None, parent=parent[1], parent_port=parent[2])
+        if own is not None:
+            return Uplink(port=own[0], gateway=own[1])
+        return None
+
+    def summary(self) -> Dict:
+        return {
+            "mac_entries": self.entries,
+            "switches": len(self.switches),
+            "located_macs": len(self.locations),
+            "hosts": len(self.hosts),
+            "tiered_switches": len(self._parents)
+        }
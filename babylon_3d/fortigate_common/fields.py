@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+FortiGate Field Projection Helpers
+Trim API objects down to the fields a client actually reads
+
+CMDB tables accept a server-side projection (?format=name|ip|status).
+Monitor endpoints do not, so their results are trimmed client-side right
+after parsing, before they are normalized or retained.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def supports_server_projection(path: str) -> bool:
+    """Return True for API paths that honour the format= query parameter"""
+    return path.lstrip('/').startswith(('cmdb/', 'api/v2/cmdb/'))
+
+
+def projection_params(path: str, fields: Optional[Sequence[str]], params: Dict = None) -> Dict:
+    """Add a format=field1|field2 projection to params when the path supports it"""
+    params = dict(params or {})
+    if fields and supports_server_projection(path):
+        params['format'] = '|'.join(fields)
+    return params
+
+
+def project_record(record: Any, fields: Optional[Sequence[str]]) -> Any:
+    """Keep only the requested fields of a single API object"""
+    if not fields or not isinstance(record, dict):
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def project_results(results: Any, fields: Optional[Sequence[str]]) -> Any:
+    """Client-side fallback projection for a results list"""
+    if not fields or not isinstance(results, list):
+        return results
+    return [project_record(record, fields) for record in results]
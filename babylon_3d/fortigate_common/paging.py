@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+FortiGate Paging Helper
+Walk large monitor/cmdb collections with the FortiOS start/count parameters
+"""
+
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Optional
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+def iter_paged(fetch_page: Callable[[int, int], Optional[Iterable[Any]]],
+               page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Any]:
+    """
+    Yield records page by page from fetch_page(start, count)
+
+    fetch_page returns the records of one page (a list, or a lazy iterator
+    that parses them as the body downloads), or None when the request
+    failed. Iteration stops on a failed or short page. Endpoints that ignore
+    start/count return the whole table every time; that is detected (an
+    oversized page, or the same first record at a new offset) and the table is
+    yielded once instead of looping forever.
+    """
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+
+    start = 0
+    previous_first = None
+    while True:
+        page = fetch_page(start, page_size)
+        if page is None:
+            return
+
+        count, first = 0, None
+        for record in page:
+            if count == 0:
+                if start and record == previous_first:
+                    return
+                first = record
+            yield record
+            count += 1
+
+        if count != page_size:
+            return
+        previous_first = first
+        start += page_size
+
+
+async def aiter_paged(fetch_page: Callable[[int, int], AsyncIterator[Any]],
+                      page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[Any]:
+    """Async variant of iter_paged; fetch_page returns an async iterator (empty on failure)"""
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+
+    start, previous_first = 0, None
+    while True:
+        count, first = 0, None
+        page = fetch_page(start, page_size)
+        try:
+            async for record in page:
+                if count == 0:
+                    if start and record == previous_first:
+                        return
+                    first = record
+                yield record
+                count += 1
+        finally:
+            # Release the pooled connection when the walk stops mid-page
+            await page.aclose()
+        if count != page_size:
+            return
+        previous_first = first
+        start += page_size
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+FortiGate Records
+Compact, slotted record types for the devices and links both FortiGate clients produce
+
+Each record stores its fields in __slots__ instead of a per-instance dict,
+keeps the device type as a class attribute and interns repeated strings
+(status, OS, device type), so large inventories cost a fraction of the
+equivalent dicts. to_dict() returns exactly the JSON shape its producer used
+to emit; to_json() serializes it compactly.
+
+Firewall, Interface, ManagedSwitch, FortiAP, Endpoint and EndpointGroup are
+the nodes NetworkTopologyBuilder places; a node's position is the fixed
+offset of its type until a layout (topology_layout.py) sets one. The *Detail
+records are the flatter, fuller entities EnhancedFortiGateClient returns.
+Both share Link and ManagedSwitch.
+"""
+
+import json
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+FORTIGATE_ID = "fortigate_main"
+
+# Share of a group's endpoints that must be online for the group to count as healthy
+HEALTHY_RATIO = 0.9
+
+
+def intern_value(value: Any) -> Any:
+    """Intern short repeated strings such as status or OS names"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class TopologyRecord:
+    """Base class for slotted topology records"""
+
+    __slots__ = ()
+    type = None
+
+    def to_dict(self) -> Dict:
+        raise NotImplementedError
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and other.to_dict() == self.to_dict()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Firewall(TopologyRecord):
+    """The FortiGate at the centre of the topology"""
+
+    __slots__ = ('id', 'name', 'model', 'serial', 'version', 'ip', 'status', 'cpu_usage', 'memory_usage', 'uptime',
+                 'position')
+    type = "firewall"
+
+    def __init__(self, name: str, model: str, serial: str, version: str, ip: str,
+                 status: str = 'unknown', cpu_usage: Any = 0, memory_usage: Any = 0, uptime: Any = 0,
+                 id: str = FORTIGATE_ID, position: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.model = model
+        self.serial = serial
+        self.version = version
+        self.ip = ip
+        self.status = intern_value(status)
+        self.cpu_usage = cpu_usage
+        self.memory_usage = memory_usage
+        self.uptime = uptime
+        self.position = position
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "model": self.model,
+            "serial": self.serial,
+            "version": self.version,
+            "ip": self.ip,
+            "position": self.position or {"x": 0, "y": 0, "z": 0},
+            "metadata": {
+                "status": self.status,
+                "cpu_usage": self.cpu_usage,
+                "memory_usage": self.memory_usage,
+                "uptime": self.uptime
+            }
+        }
+
+
+class Interface(TopologyRecord):
+    """An up FortiGate interface"""
+
+    __slots__ = ('id', 'name', 'ip', 'subnet', 'mac', 'mtu', 'speed', 'connected_to', 'position')
+    type = "interface"
+
+    def __init__(self, id: str, name: str, ip: str = '', subnet: str = '', mac: str = '', mtu: Any = 1500,
+                 speed: Any = 0, connected_to: str = FORTIGATE_ID, position: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.ip = ip
+        self.subnet = subnet
+        self.mac = mac
+        self.mtu = mtu
+        self.speed = speed
+        self.connected_to = connected_to
+        self.position = position
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "ip": self.ip,
+            "subnet": self.subnet,
+            "connected_to": self.connected_to,
+            "position": self.position or {"x": 2, "y": 0, "z": 0},
+            "metadata": {
+                "mac": self.mac,
+                "mtu": self.mtu,
+                "speed": self.speed
+            }
+        }
+
+
+class ManagedSwitch(TopologyRecord):
+    """
+    A FortiLink managed FortiSwitch
+
+    uplink_port and mac_count are only known when the switch comes from the
+    MAC tables (see correlation.py) and only appear in its metadata then.
+    """
+
+    __slots__ = ('id', 'name', 'model', 'serial', 'ip', 'z', 'status', 'ports', 'firmware', 'connected_to', 'position',
+                 'uplink_port', 'mac_count')
+    type = "switch"
+
+    def __init__(self, id: str, name: str, model: str = 'Unknown', serial: str = 'Unknown', ip: str = '',
+                 z: float = 0, status: str = 'unknown', ports: Any = 0, firmware: str = 'Unknown',
+                 connected_to: str = FORTIGATE_ID, position: Optional[Dict] = None,
+                 uplink_port: Optional[str] = None, mac_count: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.model = intern_value(model)
+        self.serial = serial
+        self.ip = ip
+        self.z = z
+        self.status = intern_value(status)
+        self.ports = ports
+        self.firmware = intern_value(firmware)
+        self.connected_to = connected_to
+        self.position = position
+        self.uplink_port = uplink_port
+        self.mac_count = mac_count
+
+    def to_dict(self) -> Dict:
+        metadata = {
+            "status": self.status,
+            "ports": self.ports,
+            "firmware": self.firmware
+        }
+        if self.uplink_port is not None:
+            metadata["uplink_port"] = self.uplink_port
+        if self.mac_count is not None:
+            metadata["mac_count"] = self.mac_count
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "model": self.model,
+            "serial": self.serial,
+            "ip": self.ip,
+            "position": self.position or {"x": -3, "y": 0, "z": self.z},
+            "connected_to": self.connected_to,
+            "metadata": metadata
+        }
+
+
+class FortiAP(TopologyRecord):
+    """A managed FortiAP access point"""
+
+    __slots__ = ('id', 'name', 'model', 'serial', 'ip', 'z', 'status', 'wifi_clients', 'radio_1', 'radio_2',
+                 'connected_to', 'position')
+    type = "access_point"
+
+    def __init__(self, id: str, name: str, model: str = 'Unknown', serial: str = 'Unknown', ip: str = '',
+                 z: float = 0, status: str = 'unknown', wifi_clients: Any = 0, radio_1: Dict = None,
+                 radio_2: Dict = None, connected_to: str = FORTIGATE_ID, position: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.model = intern_value(model)
+        self.serial = serial
+        self.ip = ip
+        self.z = z
+        self.status = intern_value(status)
+        self.wifi_clients = wifi_clients
+        self.radio_1 = radio_1
+        self.radio_2 = radio_2
+        self.connected_to = connected_to
+        self.position = position
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "model": self.model,
+            "serial": self.serial,
+            "ip": self.ip,
+            "position": self.position or {"x": 3, "y": 0, "z": self.z},
+            "connected_to": self.connected_to,
+            "metadata": {
+                "status": self.status,
+                "wifi_clients": self.wifi_clients,
+                "radio_1": self.radio_1 if self.radio_1 is not None else {},
+                "radio_2": self.radio_2 if self.radio_2 is not None else {}
+            }
+        }
+
+
+class Endpoint(TopologyRecord):
+    """A user device seen by the FortiGate"""
+
+    __slots__ = ('id', 'name', 'ip', 'mac', 'z', 'os', 'user', 'last_seen', 'device_type', 'connected_to',
+                 'position')
+    type = "endpoint"
+
+    def __init__(self, id: str, name: str, ip: str = '', mac: str = '', z: float = 0, os: str = 'Unknown',
+                 user: str = 'Unknown', last_seen: Any = '', device_type: str = 'Unknown',
+                 connected_to: str = FORTIGATE_ID, position: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.ip = ip
+        self.mac = mac
+        self.z = z
+        self.os = intern_value(os)
+        self.user = user
+        self.last_seen = last_seen
+        self.device_type = intern_value(device_type)
+        self.connected_to = connected_to
+        self.position = position
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "ip": self.ip,
+            "mac": self.mac,
+            "position": self.position or {"x": 5, "y": 0, "z": self.z},
+            "connected_to": self.connected_to,
+            "metadata": {
+                "os": self.os,
+                "user": self.user,
+                "last_seen": self.last_seen,
+                "device_type": self.device_type
+            }
+        }
+
+
+class EndpointGroup(TopologyRecord):
+    """Endpoints sharing one attachment point (AP, switch port, VLAN or interface), drawn as one node"""
+
+    __slots__ = ('id', 'name', 'kind', 'z', 'count', 'online', 'last_seen', 'device_types', 'connected_to',
+                 'position')
+    type = "endpoint_group"
+
+    def __init__(self, id: str, name: str, kind: str, count: int, online: int = 0, z: float = 0,
+                 last_seen: Any = None, device_types: Dict = None, connected_to: str = FORTIGATE_ID,
+                 position: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.kind = intern_value(kind)
+        self.z = z
+        self.count = count
+        self.online = online
+        self.last_seen = last_seen
+        self.device_types = device_types
+        self.connected_to = connected_to
+        self.position = position
+
+    @property
+    def health(self) -> str:
+        """'healthy' with at least HEALTHY_RATIO of members online, 'down' with none, else 'degraded'"""
+        if not self.online:
+            return "down"
+        return "healthy" if self.online >= HEALTHY_RATIO * self.count else "degraded"
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "kind": self.kind,
+            "position": self.position or {"x": 5, "y": 0, "z": self.z},
+            "connected_to": self.connected_to,
+            "metadata": {
+                "count": self.count,
+                "online": self.online,
+                "offline": self.count - self.online,
+                "online_ratio": round(self.online / self.count, 4) if self.count else 0.0,
+                "health": self.health,
+                "last_seen": self.last_seen,
+                "device_types": self.device_types if self.device_types is not None else {}
+            }
+        }
+
+
+class Link(TopologyRecord):
+    """A connection between two topology devices; port is the FortiSwitch port it runs through, if known"""
+
+    __slots__ = ('source', 'target', 'type', 'bandwidth', 'port')
+
+    def __init__(self, source: str, target: str, type: str, bandwidth: Any = 0, port: Optional[str] = None):
+        self.source = source
+        self.target = target
+        self.type = intern_value(type)
+        self.bandwidth = bandwidth
+        self.port = port
+
+    def to_dict(self) -> Dict:
+        link = {
+            "source": self.source,
+            "target": self.target,
+            "type": self.type,
+            "bandwidth": self.bandwidth
+        }
+        if self.port is not None:
+            link["port"] = self.port
+        return link
+
+
+class FortiAPDetail(TopologyRecord):
+    """A managed FortiAP with its status and radios, as EnhancedFortiGateClient returns it (wifi/managed_ap/select)"""
+
+    __slots__ = (
+        'id', 'name', 'serial', 'model', 'ip', 'status', 'profile', 'vdom', 'is_local', 'radio_1', 'radio_2',
+        'wifi_clients', 'ethernet_mac', 'last_seen', 'uptime', 'cpu_usage', 'memory_usage', 'temperature',
+        'metadata'
+    )
+
+    def __init__(self, id: str, name: str = 'Unknown', serial: str = 'Unknown', model: str = 'Unknown',
+                 ip: str = '', status: str = 'unknown', profile: str = '', vdom: str = 'root',
+                 is_local: bool = False, radio_1: Optional[Dict] = None, radio_2: Optional[Dict] = None,
+                 wifi_clients: Any = 0, ethernet_mac: str = '', last_seen: Any = '', uptime: Any = 0,
+                 cpu_usage: Any = 0, memory_usage: Any = 0, temperature: Any = 0,
+                 metadata: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.serial = serial
+        self.model = intern_value(model)
+        self.ip = ip
+        self.status = intern_value(status)
+        self.profile = intern_value(profile)
+        self.vdom = intern_value(vdom)
+        self.is_local = is_local
+        self.radio_1 = radio_1
+        self.radio_2 = radio_2
+        self.wifi_clients = wifi_clients
+        self.ethernet_mac = ethernet_mac
+        self.last_seen = last_seen
+        self.uptime = uptime
+        self.cpu_usage = cpu_usage
+        self.memory_usage = memory_usage
+        self.temperature = temperature
+        self.metadata = metadata or None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "serial": self.serial,
+            "model": self.model,
+            "ip": self.ip,
+            "status": self.status,
+            "profile": self.profile,
+            "vdom": self.vdom,
+            "is_local": self.is_local,
+            "radio_1": self.radio_1 if self.radio_1 is not None else {},
+            "radio_2": self.radio_2 if self.radio_2 is not None else {},
+            "wifi_clients": self.wifi_clients,
+            "ethernet_mac": self.ethernet_mac,
+            "last_seen": self.last_seen,
+            "uptime": self.uptime,
+            "cpu_usage": self.cpu_usage,
+            "memory_usage": self.memory_usage,
+            "temperature": self.temperature,
+            "metadata": dict(self.metadata) if self.metadata else {}
+        }
+
+
+class EndpointDetail(TopologyRecord):
+    """A connected user device, as EnhancedFortiGateClient returns it (user/device/query)"""
+
+    __slots__ = (
+        'id', 'name', 'mac', 'ip', 'user', 'device_type', 'os', 'vdom', 'last_seen', 'online', 'auth_user',
+        'auth_group', 'interface', 'traffic_stats', 'metadata'
+    )
+    type = 'endpoint'
+
+    def __init__(self, id: str, name: str = 'Unknown', mac: str = '', ip: str = '', user: str = 'Unknown',
+                 device_type: str = 'Unknown', os: str = 'Unknown', vdom: str = 'root', last_seen: Any = 0,
+                 online: bool = False, auth_user: str = '', auth_group: str = '', interface: str = '',
+                 traffic_stats: Optional[Dict] = None, metadata: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.mac = mac
+        self.ip = ip
+        self.user = user
+        self.device_type = intern_value(device_type)
+        self.os = intern_value(os)
+        self.vdom = intern_value(vdom)
+        self.last_seen = last_seen
+        self.online = online
+        self.auth_user = auth_user
+        self.auth_group = intern_value(auth_group)
+        self.interface = intern_value(interface)
+        self.traffic_stats = traffic_stats or None
+        self.metadata = metadata or None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "mac": self.mac,
+            "ip": self.ip,
+            "type": self.type,
+            "user": self.user,
+            "device_type": self.device_type,
+            "os": self.os,
+            "vdom": self.vdom,
+            "last_seen": self.last_seen,
+            "online": self.online,
+            "auth_user": self.auth_user,
+            "auth_group": self.auth_group,
+            "interface": self.interface,
+            "traffic_stats": self.traffic_stats if self.traffic_stats is not None else {},
+            "metadata": dict(self.metadata) if self.metadata else {}
+        }
+
+
+class InterfaceDetail(TopologyRecord):
+    """A FortiGate network interface, as EnhancedFortiGateClient returns it (system/interface)"""
+
+    __slots__ = (
+        'id', 'name', 'ip', 'subnet', 'status', 'mtu', 'speed', 'mac', 'alias', 'vdom', 'role', 'connected_to',
+        'metadata'
+    )
+    type = 'interface'
+
+    def __init__(self, id: str, name: str = 'Unknown', ip: str = '', subnet: str = '', status: str = 'down',
+                 mtu: Any = 1500, speed: Any = 'auto', mac: str = '', alias: str = '', vdom: str = 'root',
+                 role: str = '', connected_to: str = FORTIGATE_ID, metadata: Optional[Dict] = None):
+        self.id = id
+        self.name = name
+        self.ip = ip
+        self.subnet = subnet
+        self.status = intern_value(status)
+        self.mtu = mtu
+        self.speed = intern_value(speed)
+        self.mac = mac
+        self.alias = alias
+        self.vdom = intern_value(vdom)
+        self.role = intern_value(role)
+        self.connected_to = connected_to
+        self.metadata = metadata or None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "ip": self.ip,
+            "subnet": self.subnet,
+            "status": self.status,
+            "mtu": self.mtu,
+            "speed": self.speed,
+            "mac": self.mac,
+            "alias": self.alias,
+            "vdom": self.vdom,
+            "role": self.role,
+            "connected_to": self.connected_to,
+            "metadata": dict(self.metadata) if self.metadata else {}
+        }
+
+
+def records_to_dicts(records: Iterable[TopologyRecord]) -> List[Dict]:
+    """Convert a sequence of records to their JSON shape"""
+    return [record.to_dict() for record in records]
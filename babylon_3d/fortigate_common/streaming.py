@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON parsing for FortiGate responses
+Yield elements of a response's 'results' array while the body is still downloading
+
+Requirements (optional): pip install ijson
+Without ijson (or with only its pure-Python backend, which is slower than the
+stdlib parser) responses are decoded whole with response.json().
+
+iter_json_results reads a requests response; aiter_json_results is the same
+for an aiohttp response. Callers that must not mistake a body that broke off
+for a short collection wrap the former in require_complete; the latter
+raises IncompleteResults itself.
+"""
+
+import logging
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from .fields import project_record
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Incremental parsing only pays off with one of the compiled ijson backends
+STREAMING_AVAILABLE = ijson is not None and ijson.backend != 'python'
+
+logger = logging.getLogger(__name__)
+
+
+class IncompleteResults(Exception):
+    """A results array that broke off, or a collection whose later pages failed"""
+
+
+def iter_json_results(response, fields: Optional[Sequence[str]] = None) -> Iterator[Any]:
+    """
+    Yield the elements of response['results'] one at a time
+
+    The response should come from session.get(..., stream=True) so the body
+    has not been read yet. Each element is projected to fields (when given)
+    as soon as it is parsed, so the full object tree is never built. The
+    response is closed once the array has been consumed. A body that breaks
+    off or fails to parse ends the stream after the last complete element.
+
+    The generator returns True once the whole array was read and False when
+    it broke off; `complete = yield from iter_json_results(...)` tells a
+    partial page from a full one.
+    """
+    try:
+        if STREAMING_AVAILABLE:
+            response.raw.decode_content = True
+            records = ijson.items(response.raw, 'results.item', use_float=True)
+        else:
+            results = response.json().get('results', [])
+            records = results if isinstance(results, list) else []
+
+        for record in records:
+            yield project_record(record, fields)
+    except Exception as e:
+        logger.error(f"Failed to parse results from {response.url}: {e}")
+        return False
+    finally:
+        response.close()
+    return True
+
+
+def require_complete(records: Iterator[Any], source: str = '') -> Iterator[Any]:
+    """Pass iter_json_results records through, raising IncompleteResults if the body broke off"""
+    complete = yield from records
+    if complete is False:
+        raise IncompleteResults(f"Results from {source or 'response'} broke off")
+
+
+async def aiter_json_results(response, fields: Optional[Sequence[str]] = None) -> AsyncIterator[Any]:
+    """
+    Async variant of iter_json_results reading from an aiohttp response's content
+
+    Async generators cannot return a value, so a body that breaks off raises
+    IncompleteResults after the last complete element instead.
+    """
+    try:
+        if STREAMING_AVAILABLE:
+            async for record in ijson.items_async(response.content, 'results.item', use_float=True):
+                yield project_record(record, fields)
+        else:
+            data = await response.json(content_type=None)
+            results = data.get('results', []) if isinstance(data, dict) else []
+            for record in results if isinstance(results, list) else []:
+                yield project_record(record, fields)
+    except Exception as e:
+        logger.error(f"Failed to parse results from {response.url}: {e}")
+        raise IncompleteResults(f"Results from {response.url} broke off") from e
@@ -17,17 +17,43 @@ import aiohttp_cors
 sys.path.insert(0, str(Path(__file__).parent))
 
 try:
-    from fortigate_api_integration import FortiGateAPIClient
+    from service_metrics import CONTENT_TYPE, FortiGateMetrics, metrics_middleware
+except ImportError:
+    print("Warning: service metrics not available, /metrics is disabled")
+    FortiGateMetrics = None
+
+# Live topology needs the FortiGate client and the poll/encode/stream stack behind it
+try:
+    from fortigate_api_integration import FortiGateAPIClient, AsyncFortiGateAPIClient, NetworkTopologyBuilder
     from fortigate_config import get_config, validate_config
+    from response_encoding import EncodedBody, dumps, encode_sections
+    from topology_diff import without_volatile
+    from topology_layout import PositionCache
+    from topology_poller import TopologyPoller
+    from topology_stream import TopologyStreamer
 except ImportError:
     print("Warning: FortiGate modules not available, using mock data")
     FortiGateAPIClient = None
+    AsyncFortiGateAPIClient = None
+    NetworkTopologyBuilder = None
 
 class PythonAPIService:
+    # Snapshot sections served as JSON; the rest (endpoint_groups) are only read by handlers
+    JSON_SECTIONS = ('topology', 'fortiaps', 'fortiswitches')
+    # Endpoints per /topology/groups page unless the request sets limit
+    GROUP_PAGE_SIZE = 1000
+    
     def __init__(self):
         self.config = self.get_mock_config()
         self.forti_client = None
-        self.cache = {}
+        # Background poller owning the current topology snapshot; handlers only read it
+        self.poller = None
+        self.streamer = None
+        self.metrics = FortiGateMetrics() if FortiGateMetrics is not None else None
+        # Device positions carried from poll to poll, so only changes are re-laid out
+        self.position_cache = None
+        if AsyncFortiGateAPIClient is not None:
+            self.position_cache = PositionCache(self.config['fortigate']['layout_cache'])
         
     def get_mock_config(self):
         return {
@@ -36,7 +62,12 @@ class PythonAPIService:
                 'username': os.environ.get('FORTIGATE_USERNAME', 'admin'),
                 'password': os.environ.get('FORTIGATE_PASSWORD', ''),
                 'port': int(os.environ.get('FORTIGATE_PORT', 443)),
-                'verify_ssl': os.environ.get('VERIFY_SSL', 'false').lower() == 'true'
+                'api_token': os.environ.get('FORTIGATE_API_TOKEN', ''),
+                'verify_ssl': os.environ.get('VERIFY_SSL', 'false').lower() == 'true',
+                'max_in_flight': int(os.environ.get('FORTIGATE_MAX_IN_FLIGHT', 8)),
+                'poll_interval': float(os.environ.get('TOPOLOGY_POLL_INTERVAL', 30)),
+                'first_snapshot_timeout': float(os.environ.get('TOPOLOGY_FIRST_SNAPSHOT_TIMEOUT', 15)),
+                'layout_cache': os.environ.get('TOPOLOGY_LAYOUT_CACHE', '')
             }
         }
     
@@ -44,8 +75,93 @@ class PythonAPIService:
         """Initialize the service"""
         print("Python API Service starting...")
         
+        fortigate = self.config['fortigate']
+        if AsyncFortiGateAPIClient is not None and fortigate['api_token']:
+            self.forti_client = AsyncFortiGateAPIClient(
+                host=fortigate['host'],
+                port=fortigate['port'],
+                api_token=fortigate['api_token'],
+                verify_ssl=fortigate['verify_ssl'],
+                max_in_flight=fortigate['max_in_flight'],
+                metrics=self.metrics
+            )
+            print(f"Using live FortiGate data from {fortigate['host']}")
+        
+        if self.forti_client is not None:
+            self.poller = TopologyPoller(self._collect_snapshot, interval=fortigate['poll_interval'],
+                                         encode=self._encode_snapshot)
+            self.streamer = TopologyStreamer(self.poller)
+            self.poller.start()
+    
+    async def stop(self):
+        """Stop polling and release the FortiGate connection pool"""
+        if self.poller is not None:
+            await self.poller.stop()
+        if self.forti_client is not None:
+            await self.forti_client.close()
+    
+    async def _collect_snapshot(self):
+        """One poll of the FortiGate; identical requests inside it are coalesced by the client"""
+        builder = NetworkTopologyBuilder(self.forti_client, position_cache=self.position_cache)
+        with self.metrics.topology_build_seconds.time():
+            # Same fields as the builder asks for, so each list is fetched once per poll
+            topology, fortiaps, fortiswitches = await asyncio.gather(
+                builder.build_topology_async(),
+                self.forti_client.get_wifi_ap_list(fields=builder.ACCESS_POINT_FIELDS),
+                self.forti_client.get_managed_switches(fields=builder.SWITCH_FIELDS)
+            )
+        return {'topology': topology, 'fortiaps': fortiaps, 'fortiswitches': fortiswitches,
+                'endpoint_groups': builder.endpoint_groups}
+    
+    def _encode_snapshot(self, sections):
+        """
+        encode_sections, timed per section (runs in the poller's worker thread)
+
+        ETags leave out volatile metadata, so polls of an unchanged network
+        keep answering If-None-Match with 304.
+        """
+        encoded = {}
+        for name in self.JSON_SECTIONS:
+            if name not in sections:
+                continue
+            with self.metrics.serialization_seconds.time(section=name):
+                encoded.update(encode_sections(sections, (name,), tag_view=without_volatile))
+        return encoded
+    
+    async def _current_snapshot(self):
+        """The current snapshot, waiting for the first poll if there is none yet (None on timeout)"""
+        snapshot = self.poller.snapshot
+        if snapshot is None:
+            snapshot = await self.poller.wait_ready(self.config['fortigate']['first_snapshot_timeout'])
+        return snapshot
+    
+    def _not_ready(self):
+        return web.json_response(
+            {'error': 'Topology not collected yet', 'last_error': self.poller.last_error},
+            status=503, headers={'Retry-After': str(int(self.poller.interval))}
+        )
+    
+    async def _snapshot_response(self, request, section):
+        """
+        Serve one section of the current snapshot; only the very first request waits for a poll
+        
+        The body was serialized and compressed when the snapshot was published;
+        a matching If-None-Match gets 304 Not Modified.
+        """
+        snapshot = await self._current_snapshot()
+        if snapshot is None:
+            return self._not_ready()
+        encoded = snapshot.encoded.get(section) or EncodedBody(snapshot[section])
+        return encoded.response(request, headers={
+            'X-Topology-Version': str(snapshot.version),
+            'X-Topology-Age': f"{snapshot.age():.1f}"
+        })
+        
     async def get_topology(self, request):
         """Get network topology data"""
+        if self.poller is not None:
+            return await self._snapshot_response(request, 'topology')
+        
         # Return mock topology data
         topology_data = {
             'fortigate': {
@@ -60,14 +176,50 @@ class PythonAPIService:
         }
         return web.json_response(topology_data)
     
+    async def stream_topology(self, request):
+        """Stream the topology: one full snapshot, then deltas (WebSocket or Server-Sent Events)"""
+        if self.streamer is None:
+            return web.json_response({'error': 'Topology streaming requires a live FortiGate'}, status=503)
+        return await self.streamer.handle(request)
+    
+    async def get_endpoint_group(self, request):
+        """Expand one endpoint group of the current topology into its endpoints (paged by offset/limit)"""
+        if self.poller is None:
+            return web.json_response({'error': 'Endpoint groups require a live FortiGate'}, status=503)
+        try:
+            offset = max(int(request.query.get('offset', 0)), 0)
+            limit = max(int(request.query.get('limit', self.GROUP_PAGE_SIZE)), 0)
+        except ValueError:
+            return web.json_response({'error': 'offset and limit must be integers'}, status=400)
+        
+        snapshot = await self._current_snapshot()
+        if snapshot is None:
+            return self._not_ready()
+        group_id = request.match_info['group_id']
+        expanded = snapshot['endpoint_groups'].expand(group_id, offset, limit)
+        if expanded is None:
+            return web.json_response({'error': f'Unknown endpoint group: {group_id}'}, status=404)
+        return web.Response(body=dumps(expanded), content_type='application/json',
+                            headers={'X-Topology-Version': str(snapshot.version)})
+    
     async def get_fortiaps(self, request):
         """Get FortiAP data"""
+        if self.poller is not None:
+            return await self._snapshot_response(request, 'fortiaps')
         return web.json_response([])
     
     async def get_fortiswitches(self, request):
         """Get FortiSwitch data"""
+        if self.poller is not None:
+            return await self._snapshot_response(request, 'fortiswitches')
         return web.json_response([])
     
+    async def get_metrics(self, request):
+        """Prometheus text exposition of the service and FortiGate client metrics"""
+        if self.metrics is None:
+            return web.json_response({'error': 'Metrics are not available'}, status=503)
+        return web.Response(body=self.metrics.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+    
     async def get_historical(self, request):
         """Get historical data"""
         return web.json_response([])
@@ -96,7 +248,8 @@ async def main():
     service = PythonAPIService()
     await service.start()
     
-    app = web.Application()
+    middlewares = [metrics_middleware(service.metrics)] if service.metrics is not None else []
+    app = web.Application(middlewares=middlewares)
     cors = aiohttp_cors.setup(app, defaults={
         "*": aiohttp_cors.ResourceOptions(
             allow_credentials=True,
@@ -107,9 +260,12 @@ async def main():
     
     # Add routes
     app.router.add_get('/topology', service.get_topology)
+    app.router.add_get('/topology/stream', service.stream_topology)
+    app.router.add_get('/topology/groups/{group_id}', service.get_endpoint_group)
     app.router.add_get('/fortiaps', service.get_fortiaps)
     app.router.add_get('/fortiswitches', service.get_fortiswitches)
     app.router.add_get('/historical', service.get_historical)
+    app.router.add_get('/metrics', service.get_metrics)
     app.router.add_post('/discover', service.discover_devices)
     app.router.add_post('/convert_vss', service.convert_vss)
     
@@ -128,6 +284,9 @@ async def main():
         await asyncio.Future()  # Run forever
     except KeyboardInterrupt:
         pass
+    finally:
+        await service.stop()
+        await runner.cleanup()
 
 if __name__ == '__main__':
     asyncio.run(main())
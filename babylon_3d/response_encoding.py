@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Response Encoding
+Serialize a payload once into JSON bytes, gzip and brotli variants and an ETag
+
+Snapshot sections are encoded when the poller publishes them. Requests then
+pick a pre-built variant and answer If-None-Match with 304 Not Modified,
+without serializing or compressing anything themselves. A section whose body
+carries per-build values (a topology's last_updated) is tagged from a view
+without them, so an unchanged network keeps its ETag from poll to poll.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(payload: Any) -> bytes:
+    """Compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+class EncodedBody:
+    """
+    One payload's JSON bytes, its compressed variants and a content-hash ETag
+
+    The ETag hashes the body, or tag_payload when given: a view of payload
+    that leaves out values which change without the content changing. Such
+    ETags are weak, since bodies that differ only there share one.
+    """
+
+    __slots__ = ('identity', 'variants', 'tag', 'weak')
+
+    def __init__(self, payload: Any, tag_payload: Any = None):
+        self.identity = dumps(payload)
+        self.weak = tag_payload is not None
+        tagged = dumps(tag_payload) if self.weak else self.identity
+        self.tag = hashlib.blake2b(tagged, digest_size=16).hexdigest()
+        self.variants: Dict[str, bytes] = {}
+        if len(self.identity) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = gzip.compress(self.identity, GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(self.identity, quality=BROTLI_QUALITY)
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        """ETag (weak with tag_payload); each content coding gets its own so caches never mix representations"""
+        tag = f'"{self.tag}-{encoding}"' if encoding else f'"{self.tag}"'
+        return f'W/{tag}' if self.weak else tag
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        """True if If-None-Match names any representation of this content"""
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate == '*':
+                return True
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate.strip('"').split('-')[0] == self.tag:
+                return True
+        return False
+
+    def choose_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Best available variant the client accepts: brotli, then gzip, else identity"""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return None
+
+    def response(self, request: web.Request, headers: Optional[Mapping[str, str]] = None) -> web.Response:
+        """304 when the client already has this content, otherwise the best encoded variant"""
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        response_headers = {'ETag': self.etag(encoding), 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        response_headers.update(headers or {})
+        if self.not_modified(request.headers.get('If-None-Match')):
+            return web.Response(status=304, headers=response_headers)
+        if encoding is not None:
+            response_headers['Content-Encoding'] = encoding
+            body = self.variants[encoding]
+        else:
+            body = self.identity
+        return web.Response(body=body, content_type='application/json', headers=response_headers)
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings the client accepts (q=0 entries excluded)"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith('q=') and q[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def encode_sections(sections: Mapping[str, Any], names: Optional[Iterable[str]] = None,
+                    tag_view: Optional[Callable[[Any], Any]] = None) -> Dict[str, EncodedBody]:
+    """
+    Encode every (or the named) snapshot sections
+
+    tag_view, if given, maps a section to the view its ETag hashes; sections
+    it returns unchanged are tagged from their bytes.
+    """
+    encoded = {}
+    for name in (names if names is not None else sections):
+        payload = sections[name]
+        view = tag_view(payload) if tag_view is not None else payload
+        encoded[name] = EncodedBody(payload, view if view is not payload else None)
+    return encoded
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Service Metrics
+Counters and latency histograms rendered in the Prometheus text format
+
+FortiGateMetrics bundles the instruments the API service exposes on /metrics
+and the hook methods the clients call from their shared request paths. The
+FortiGate clients report request, parse and error (the Enhanced clients also
+cache); they do not retry, so retry is only called by the Meraki client when
+it backs off after a 429. Clients take it as an optional metrics argument and
+skip instrumentation when it is None, so anything with the same hook methods
+can stand in for it.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp import web
+from requests.adapters import HTTPAdapter
+
+# Seconds; covers a cached lookup through a slow FortiGate page
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Streaming connections last from seconds to hours
+STREAM_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 3600.0, 14400.0, 86400.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named family of series, one per label combination"""
+
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics in registration order"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def endpoint_label(url_or_path: str) -> str:
+    """Low-cardinality endpoint name: the API path without /api/v2/ and query"""
+    path = urlsplit(url_or_path).path if '://' in url_or_path else url_or_path.split('?')[0]
+    return path.split('/api/v2/', 1)[-1].strip('/') or '/'
+
+
+class FortiGateMetrics:
+    """The service's instruments plus the hooks the FortiGate clients call"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.request_seconds = r.histogram(
+            'fortigate_request_duration_seconds', 'FortiGate API latency until response headers', ('endpoint',))
+        self.parse_seconds = r.histogram(
+            'fortigate_response_parse_seconds', 'Time spent decoding FortiGate JSON bodies', ('endpoint',))
+        self.responses = r.counter(
+            'fortigate_responses_total', 'FortiGate API responses by HTTP status', ('endpoint', 'status'))
+        self.errors = r.counter(
+            'fortigate_errors_total', 'Failed FortiGate API calls by error kind', ('endpoint', 'kind'))
+        self.retries = r.counter(
+            'api_retries_total', 'Meraki API requests retried after a 429', ('endpoint',))
+        self.cache_hits = r.counter('cache_hits_total', 'Cache lookups that were served', ('cache',))
+        self.cache_misses = r.counter('cache_misses_total', 'Cache lookups that missed', ('cache',))
+        self.topology_build_seconds = r.histogram(
+            'topology_build_duration_seconds', 'Time to collect and assemble one topology snapshot')
+        self.serialization_seconds = r.histogram(
+            'snapshot_serialization_seconds', 'Time to encode one snapshot section', ('section',))
+        self.handler_seconds = r.histogram(
+            'http_handler_duration_seconds', 'API service handler latency', ('route', 'method', 'status'))
+        self.stream_seconds = r.histogram(
+            'http_stream_duration_seconds', 'How long streaming connections stayed open', ('route', 'method'),
+            buckets=STREAM_BUCKETS)
+
+    # Hooks called by the clients
+
+    def request(self, endpoint: str, seconds: float, status: int):
+        self.request_seconds.observe(seconds, endpoint=endpoint)
+        self.responses.inc(endpoint=endpoint, status=status)
+        if status >= 400:
+            self.errors.inc(endpoint=endpoint, kind=f'http_{status}')
+
+    def parse(self, endpoint: str, seconds: float):
+        self.parse_seconds.observe(seconds, endpoint=endpoint)
+
+    def error(self, endpoint: str, kind: str):
+        self.errors.inc(endpoint=endpoint, kind=kind)
+
+    def retry(self, endpoint: str):
+        self.retries.inc(endpoint=endpoint)
+
+    def cache(self, hit: bool, cache: str = 'response'):
+        (self.cache_hits if hit else self.cache_misses).inc(cache=cache)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """
+    requests transport adapter reporting every request to a metrics hook object
+
+    Mounting it on a Session instruments every call made through that session,
+    whichever client method issued it. Latency is measured to the response
+    headers; streamed bodies are timed by the parse hooks. Requests are sent
+    through transport when one is given (e.g. a record/replay adapter).
+    """
+
+    def __init__(self, metrics, transport: Optional[HTTPAdapter] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+        self.transport = transport
+
+    def send(self, request, **kwargs):
+        endpoint = endpoint_label(request.url)
+        started = time.perf_counter()
+        try:
+            if self.transport is not None:
+                response = self.transport.send(request, **kwargs)
+            else:
+                response = super().send(request, **kwargs)
+        except Exception as e:
+            self.metrics.error(endpoint, type(e).__name__)
+            raise
+        self.metrics.request(endpoint, time.perf_counter() - started, response.status_code)
+        return response
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        super().close()
+
+
+def metrics_middleware(metrics: FortiGateMetrics):
+    """
+    aiohttp middleware timing every handler by route
+
+    Streaming responses (Server-Sent Events, WebSockets) are only returned
+    once the connection closes, so their time goes to stream_seconds instead
+    of the handler latency histogram.
+    """
+    @web.middleware
+    async def middleware(request, handler):
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+        try:
+            response = await handler(request)
+            status = response.status
+            # Plain responses are web.Response; streamed ones are written by the handler itself
+            streaming = not isinstance(response, web.Response)
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            route = request.match_info.route.resource
+            name = route.canonical if route is not None else 'unmatched'
+            if streaming:
+                metrics.stream_seconds.observe(time.perf_counter() - started, route=name, method=request.method)
+            else:
+                metrics.handler_seconds.observe(time.perf_counter() - started,
+                                                route=name, method=request.method, status=status)
+
+    return middleware
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Single-flight Request Coalescing
+Concurrent callers asking for the same key share one in-flight coroutine
+
+Used in front of the FortiGate clients so that many dashboard viewers
+refreshing at once cost the firewall one request per endpoint instead of one
+per viewer. Every caller receives the same parsed result object, which must be
+treated as read-only.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def flight_key(path: str, params: Optional[Dict] = None) -> Tuple:
+    """Order-independent key for an API path and its query params (vdom included)"""
+    return (path, tuple(sorted((params or {}).items())))
+
+
+class SingleFlight:
+    """
+    Share one running call per key between concurrent awaiters
+
+    The shared call runs in its own task, so a caller that is cancelled does
+    not cancel it for the others. Nothing is cached: once the call finishes
+    the next caller starts a fresh one.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> Dict:
+        return {'started': self.started, 'coalesced': self.coalesced, 'in_flight': self.in_flight()}
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Topology Diff
+Linear-time deltas between two topologies, keyed by stable device identity
+
+Works on any topology dict whose record lists are sections: the builder's
+devices/connections, or EnhancedFortiGateClient's fortiaps/devices/
+interfaces/connections. Records may be plain dicts or records with to_dict().
+
+Each record is indexed under a stable identity (serial, MAC address or
+interface name, falling back to its id) together with a content hash, so a
+device keeps its identity when its display id changes and unchanged records
+are skipped by comparing hashes. Links are keyed by the identities of their
+endpoints. Build a TopologyIndex once per topology and reuse it as the old
+side of the next diff to hash every record only once.
+
+A delta lists added records in full, removed records by wire id (device id,
+or [source, target, type] for links) and, for changed records, only the
+fields whose values differ, so applying it to the old topology yields the
+new one.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Metadata fields that change on every build and say nothing about the network:
+# the build time, and the layout pass stats (mode, moved, iterations)
+VOLATILE_METADATA = frozenset({'last_updated', 'layout'})
+
+# Placeholder values the builders use when a field is missing
+UNKNOWN_VALUES = frozenset({'', 'Unknown', 'unknown'})
+
+# Identity fields, most stable first; interfaces share MACs (VLANs) so go by name
+DEVICE_IDENTITY = ('serial', 'mac', 'id')
+INTERFACE_IDENTITY = ('name', 'id')
+
+_MISSING = object()
+
+
+def record_dict(record: Any) -> Dict:
+    return record.to_dict() if hasattr(record, 'to_dict') else record
+
+
+def canonical_json(record: Any) -> bytes:
+    """Key-order independent JSON bytes for hashing"""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_SORT_KEYS, default=str)
+    return json.dumps(record, sort_keys=True, separators=(',', ':'), default=str).encode()
+
+
+def content_hash(record: Any) -> bytes:
+    return hashlib.blake2b(canonical_json(record), digest_size=8).digest()
+
+
+def is_link(record: Dict) -> bool:
+    return 'source' in record and 'target' in record
+
+
+def link_key(link: Dict) -> Tuple:
+    return (link.get('source'), link.get('target'), link.get('type'))
+
+
+def device_identity(section: str, record: Dict) -> Tuple:
+    """Stable key for a device record: (section, field, value)"""
+    fields = INTERFACE_IDENTITY if section == 'interfaces' or record.get('type') == 'interface' else DEVICE_IDENTITY
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, Hashable) and value is not None and value not in UNKNOWN_VALUES:
+            return (section, field, value)
+    return (section, 'id', record.get('id'))
+
+
+class TopologyIndex:
+    """
+    One topology indexed for diffing
+
+    sections maps each record list to {identity: (content hash, record dict)};
+    everything else at the top level (metadata, the Enhanced fortigate entry)
+    is kept as a single hashed value.
+    """
+
+    __slots__ = ('sections', 'link_sections', 'values')
+
+    def __init__(self, topology: Dict):
+        self.sections: Dict[str, Dict[Tuple, Tuple[bytes, Dict]]] = {}
+        self.link_sections = set()
+        self.values: Dict[str, Tuple[bytes, Any]] = {}
+        identities: Dict[Any, Tuple] = {}
+        links = []
+
+        for name, value in topology.items():
+            if not isinstance(value, list):
+                self.values[name] = (content_hash(_stable_value(name, value)), value)
+                continue
+            records = [record_dict(record) for record in value]
+            if records and is_link(records[0]):
+                links.append((name, records))
+                continue
+            entries = self.sections[name] = {}
+            for record in records:
+                key = _unique(entries, device_identity(name, record))
+                entries[key] = (content_hash(record), record)
+                identities.setdefault(record.get('id'), key)
+
+        # Links are keyed by the identities of their endpoints, so renaming a device keeps its links
+        for name, records in links:
+            self.link_sections.add(name)
+            entries = self.sections[name] = {}
+            for link in records:
+                key = _unique(entries, (
+                    identities.get(link.get('source'), link.get('source')),
+                    identities.get(link.get('target'), link.get('target')),
+                    link.get('type')
+                ))
+                entries[key] = (content_hash(link), link)
+
+    def wire_id(self, section: str, record: Dict) -> Any:
+        """How a delta refers to an existing record"""
+        return list(link_key(record)) if section in self.link_sections else record.get('id')
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.sections.values())
+
+
+def _unique(entries: Dict, key: Tuple) -> Tuple:
+    while key in entries:
+        key = key + ('dup',)
+    return key
+
+
+def _stable_value(name: str, value: Any) -> Any:
+    if name == 'metadata' and isinstance(value, dict):
+        return {key: item for key, item in value.items() if key not in VOLATILE_METADATA}
+    return value
+
+
+def without_volatile(topology: Any) -> Any:
+    """topology with VOLATILE_METADATA left out of its metadata; anything else is returned as is"""
+    if isinstance(topology, dict) and isinstance(topology.get('metadata'), dict):
+        return {**topology, 'metadata': _stable_value('metadata', topology['metadata'])}
+    return topology
+
+
+def _field_change(wire_id: Any, old: Dict, new: Dict) -> Dict:
+    """{'id', 'fields': changed or new values, 'unset': dropped field names (only if any)}"""
+    change = {'id': wire_id, 'fields': {field: value for field, value in new.items() if old.get(field, _MISSING) != value}}
+    unset = [field for field in old if field not in new]
+    if unset:
+        change['unset'] = unset
+    return change
+
+
+def diff_indexes(old: TopologyIndex, new: TopologyIndex) -> Dict:
+    """
+    Delta from old to new
+
+    {<section>: {'added': [record...], 'removed': [wire id...], 'changed': [{'id', 'fields', 'unset'?}...]},
+     ...,
+     'replace': {<top-level key>: new value}}   # only present when metadata etc. changed
+    """
+    delta = {}
+    for name in list(new.sections) + [name for name in old.sections if name not in new.sections]:
+        before, after = old.sections.get(name, {}), new.sections.get(name, {})
+        added, changed = [], []
+        for key, (digest, record) in after.items():
+            previous = before.get(key)
+            if previous is None:
+                added.append(record)
+            elif previous[0] != digest:
+                changed.append(_field_change(old.wire_id(name, previous[1]), previous[1], record))
+        removed = [old.wire_id(name, record) for key, (_, record) in before.items() if key not in after]
+        delta[name] = {'added': added, 'removed': removed, 'changed': changed}
+
+    replace = {}
+    for name in list(new.values) + [name for name in old.values if name not in new.values]:
+        digest, value = new.values.get(name, (None, None))
+        if old.values.get(name, (None, None))[0] != digest:
+            replace[name] = value
+    if replace:
+        delta['replace'] = replace
+    return delta
+
+
+def diff_topologies(old: Dict, new: Dict) -> Dict:
+    """Delta from old to new topology (see diff_indexes)"""
+    return diff_indexes(TopologyIndex(old), TopologyIndex(new))
+
+
+def is_empty(delta: Optional[Dict]) -> bool:
+    """True if the delta carries no change at all"""
+    if not delta:
+        return True
+    return 'replace' not in delta and not any(
+        section[kind] for section in delta.values() for kind in ('added', 'removed', 'changed')
+    )
+
+
+def summarize(delta: Dict) -> Dict[str, Dict[str, int]]:
+    """Per-section counts of added, removed and changed records (for alerts and logs)"""
+    return {
+        name: {kind: len(section[kind]) for kind in ('added', 'removed', 'changed')}
+        for name, section in delta.items() if name != 'replace'
+    }
+
+
+def apply_delta(topology: Dict, delta: Dict) -> Dict:
+    """Return a new topology with delta applied (the input is not modified)"""
+    result = dict(topology)
+    for name, changes in delta.items():
+        if name == 'replace':
+            continue
+        records = [record_dict(record) for record in topology.get(name, [])]
+        links = any(is_link(record) for record in records[:1] + changes['added'][:1])
+        key = link_key if links else (lambda record: record.get('id'))
+        index = {key(record): record for record in records}
+        _apply_changes(index, changes, key, tuple if links else (lambda wire_id: wire_id))
+        result[name] = list(index.values())
+    for name, value in delta.get('replace', {}).items():
+        if value is None:
+            result.pop(name, None)
+        else:
+            result[name] = value
+    return result
+
+
+def _apply_changes(index: Dict, changes: Dict, key, from_wire):
+    for removed in changes['removed']:
+        index.pop(from_wire(removed), None)
+    for change in changes['changed']:
+        change_key = from_wire(change['id'])
+        record = dict(index[change_key])
+        record.update(change['fields'])
+        for field in change.get('unset', ()):
+            record.pop(field, None)
+        index[change_key] = record
+    for record in changes['added']:
+        index[key(record)] = record
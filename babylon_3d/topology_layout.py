@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Topology Layout
+Force-directed 3D positions for topology devices, computed server-side
+
+force_layout() is a Fruchterman-Reingold simulation in NumPy. Links pull
+their ends together (d^2 / k), every pair of nodes pushes apart (k^2 / d), a
+weak pull towards the origin keeps disconnected nodes in view, and the
+largest step a node may take cools linearly, so the layout settles. Nodes
+start on shells by hop count from the pinned root (the FortiGate at the
+origin), which is most of the way to the final tree shape.
+
+Repulsion uses a Barnes-Hut octree rebuilt every iteration from Morton
+codes: with the bodies sorted by code, each octree level is a run-length
+split of the sorted codes, and cell masses and centres of mass come from
+np.add.reduceat. The tree is walked for all bodies at once, as a frontier of
+(body, cell) pairs. A pair whose cell is far enough away (width / distance
+< theta) or holds a single other body contributes its force; the others are
+replaced by the cell's children. Repulsion thus costs O(n log n) per
+iteration instead of O(n^2).
+
+apply_layout() lays out a builder's device and link records and stores the
+result in each device's position. Given a PositionCache it warm-starts from
+the previous layout, keyed by device id: devices seen before keep their
+position, and only new devices and the devices whose links changed (the
+neighbours of new and removed ones) are relaxed for a few iterations.
+force_layout() then moves just those nodes and re-indexes only them each
+iteration, so re-layout cost follows the size of the change, not of the
+network.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from fortigate_common.records import FORTIGATE_ID
+
+# Octree levels below the root; Morton codes take 3 bits per level
+OCTREE_DEPTH = 10
+DEFAULT_ITERATIONS = 100
+DEFAULT_THETA = 0.9
+# Ideal link length, in scene units
+DEFAULT_SPACING = 3.0
+# Pull towards the origin, relative to the spacing
+GRAVITY = 0.02
+# Warm starts relax the changed nodes this many iterations...
+RELAX_ITERATIONS = 30
+# ...unless more than this share of the nodes changed, which gets a full layout
+FULL_LAYOUT_SHARE = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Spread 10-bit integers out so two zero bits follow every bit"""
+    v = values.astype(np.int64)
+    v = (v | (v << 16)) & 0x030000FF
+    v = (v | (v << 8)) & 0x0300F00F
+    v = (v | (v << 4)) & 0x030C30C3
+    v = (v | (v << 2)) & 0x09249249
+    return v
+
+
+def _sum_by(index: np.ndarray, vectors: np.ndarray, count: int) -> np.ndarray:
+    """Sum of vectors (m x 3) per index value, as a count x 3 array"""
+    return np.stack([np.bincount(index, weights=vectors[:, axis], minlength=count) for axis in range(3)], axis=1)
+
+
+class Octree:
+    """Barnes-Hut octree over 3D points, stored as one set of arrays per level (level 0 is the root)"""
+
+    def __init__(self, points: np.ndarray, depth: int = OCTREE_DEPTH):
+        self.points = points
+        self.depth = depth
+        self.low = points.min(axis=0)
+        self.width = float((points.max(axis=0) - self.low).max()) or 1.0
+        self.codes = self._codes(points)
+        order = np.argsort(self.codes, kind='stable')
+        sorted_codes, sorted_points = self.codes[order], points[order]
+
+        # Per level: each cell's code, body count and centre of mass
+        self.cell_codes: List[np.ndarray] = []
+        self.mass: List[np.ndarray] = []
+        self.centre: List[np.ndarray] = []
+        for level in range(depth + 1):
+            level_codes = sorted_codes >> (3 * (depth - level))
+            starts = np.flatnonzero(np.r_[True, level_codes[1:] != level_codes[:-1]])
+            mass = np.diff(np.r_[starts, len(level_codes)])
+            self.cell_codes.append(level_codes[starts])
+            self.mass.append(mass)
+            self.centre.append(np.add.reduceat(sorted_points, starts, axis=0) / mass[:, None])
+        # Per level: the range of each cell's children in the next level
+        self.children = [
+            (np.searchsorted(self.cell_codes[level + 1], self.cell_codes[level] << 3),
+             np.searchsorted(self.cell_codes[level + 1], (self.cell_codes[level] + 1) << 3))
+            for level in range(depth)
+        ]
+
+    def _codes(self, points: np.ndarray) -> np.ndarray:
+        """Morton code of the leaf cell each point falls in (points outside the tree are clamped to it)"""
+        cells = 1 << self.depth
+        grid = np.clip(((points - self.low) * (cells / self.width)).astype(np.int64), 0, cells - 1)
+        return _spread_bits(grid[:, 0]) | (_spread_bits(grid[:, 1]) << 1) | (_spread_bits(grid[:, 2]) << 2)
+
+    def repulsion(self, strength: float, theta: float = DEFAULT_THETA,
+                  queries: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        For every body, about the sum over the other bodies of strength * (p - q) / |p - q|^2
+
+        With queries, the same sum over all the bodies for each query point
+        instead, e.g. the push of nodes that stay put on nodes that move.
+        """
+        external = queries is not None
+        points = queries if external else self.points
+        codes = self._codes(points) if external else self.codes
+        count = len(points)
+        force = np.zeros_like(points)
+        # Distances below this are grid noise; clamping keeps coincident bodies finite
+        floor = (self.width * 1e-6) ** 2 + 1e-12
+        bodies = np.arange(count)
+        cells = np.zeros(count, dtype=np.int64)
+        for level in range(self.depth + 1):
+            mass = self.mass[level][cells]
+            own = (codes[bodies] >> (3 * (self.depth - level))) == self.cell_codes[level][cells]
+            delta = points[bodies] - self.centre[level][cells]
+            distance2 = np.einsum('ij,ij->i', delta, delta)
+            if level == self.depth and external:
+                accept = np.ones(len(bodies), dtype=bool)
+            elif level == self.depth:
+                # Bodies sharing a leaf push each other apart, the body's own share taken out of its cell
+                keep = ~own | (mass > 1)
+                own, mass, delta, bodies = own[keep], mass[keep], delta[keep], bodies[keep]
+                delta = np.where(own[:, None], delta * (mass / np.maximum(mass - 1, 1))[:, None], delta)
+                distance2 = np.einsum('ij,ij->i', delta, delta)
+                mass = mass - own
+                accept = np.ones(len(bodies), dtype=bool)
+            else:
+                width = self.width / (1 << level)
+                far = width * width < theta * theta * distance2
+                # A single body is exact wherever it is, unless it is the body itself
+                accept = (mass == 1) | (~own & far) if external else ~own & ((mass == 1) | far)
+
+            push = delta[accept] * (strength * mass[accept] / np.maximum(distance2[accept], floor))[:, None]
+            force += _sum_by(bodies[accept], push, count)
+            if level == self.depth:
+                break
+
+            # Open the rest, except a body's own single-body leaf (itself)
+            expand = ~accept if external else ~accept & ~(own & (mass == 1))
+            bodies, cells = bodies[expand], cells[expand]
+            first, last = self.children[level]
+            start, children = first[cells], last[cells] - first[cells]
+            bodies = np.repeat(bodies, children)
+            offsets = np.arange(len(bodies)) - np.repeat(np.cumsum(children) - children, children)
+            cells = np.repeat(start, children) + offsets
+            if not len(bodies):
+                break
+        return force
+
+
+def _neighbours(count: int, edges: np.ndarray) -> List[List[int]]:
+    """Adjacency lists of an m x 2 edge array"""
+    neighbours: List[List[int]] = [[] for _ in range(count)]
+    for source, target in edges.tolist():
+        neighbours[source].append(target)
+        neighbours[target].append(source)
+    return neighbours
+
+
+def _directions(count: int, seed: int) -> np.ndarray:
+    """count seeded random unit vectors"""
+    directions = np.random.default_rng(seed).normal(size=(count, 3))
+    return directions / np.maximum(np.linalg.norm(directions, axis=1), 1e-12)[:, None]
+
+
+def _shells(count: int, edges: np.ndarray, roots: Sequence[int], spacing: float, seed: int) -> np.ndarray:
+    """Starting positions: each node at spacing per hop from the roots, in a seeded random direction"""
+    hops = np.full(count, -1, dtype=np.int64)
+    hops[list(roots)] = 0
+    neighbours = _neighbours(count, edges)
+    frontier = list(roots)
+    while frontier:
+        following = []
+        for node in frontier:
+            for neighbour in neighbours[node]:
+                if hops[neighbour] < 0:
+                    hops[neighbour] = hops[node] + 1
+                    following.append(neighbour)
+        frontier = following
+    # Unreachable nodes go on a shell beyond the farthest reachable one
+    hops[hops < 0] = hops.max() + 1
+    return _directions(count, seed) * (hops * spacing)[:, None]
+
+
+def _place_new(positions: np.ndarray, placed: np.ndarray, edges: np.ndarray, spacing: float,
+               seed: int) -> np.ndarray:
+    """
+    Warm-start positions for the nodes not yet placed
+
+    Each new node goes one spacing from an already placed neighbour, in a
+    seeded random direction, nearest the placed nodes first; new nodes with
+    no placed node in reach go on a shell around the rest.
+    """
+    positions, placed = positions.copy(), placed.copy()
+    neighbours = _neighbours(len(positions), edges)
+    directions = _directions(len(positions), seed)
+    frontier = np.flatnonzero(placed).tolist()
+    while frontier:
+        following = []
+        for node in frontier:
+            for neighbour in neighbours[node]:
+                if not placed[neighbour]:
+                    positions[neighbour] = positions[node] + directions[neighbour] * spacing
+                    placed[neighbour] = True
+                    following.append(neighbour)
+        frontier = following
+    if not placed.all():
+        reach = np.linalg.norm(positions[placed], axis=1).max() if placed.any() else 0.0
+        positions[~placed] = directions[~placed] * (reach + spacing)
+    return positions
+
+
+def force_layout(count: int, edges: np.ndarray, pinned: Sequence[int] = (), initial: Optional[np.ndarray] = None,
+                 iterations: int = DEFAULT_ITERATIONS, spacing: float = DEFAULT_SPACING,
+                 theta: float = DEFAULT_THETA, seed: int = 0, movable: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    3D positions (count x 3) for a graph of count nodes
+
+    edges is an m x 2 array of node numbers. pinned nodes keep their
+    starting position; initial gives the starting positions (by default,
+    shells around the pinned nodes, or node 0). movable, a boolean mask,
+    limits the simulation to those nodes: the rest stay where initial put
+    them and only push and pull, and each iteration costs O(k log n) for k
+    movable nodes. The same graph and seed always give the same layout.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    pinned = list(pinned)
+    positions = initial.astype(np.float64) if initial is not None else \
+        _shells(count, edges, pinned or [0], spacing, seed) if count else np.zeros((0, 3))
+    if count < 2:
+        return positions
+    moving = np.ones(count, dtype=bool) if movable is None else np.asarray(movable, dtype=bool).copy()
+    moving[pinned] = False
+    active = np.flatnonzero(moving)
+    if not len(active):
+        return positions
+    # Slot of each node among the active ones, -1 for nodes that stay put
+    slot = np.full(count, -1, dtype=np.int64)
+    slot[active] = np.arange(len(active))
+    # Only links touching a moving node pull on anything
+    edges = edges[moving[edges[:, 0]] | moving[edges[:, 1]]]
+    still = Octree(positions[~moving]) if len(active) < count else None
+
+    strength = spacing * spacing
+    temperature = spacing * max(len(active) ** (1 / 3), 1.0)
+    for step in range(iterations):
+        points = positions[active]
+        force = Octree(points).repulsion(strength, theta) if len(active) > 1 else np.zeros_like(points)
+        if still is not None:
+            force += still.repulsion(strength, theta, queries=points)
+        if len(edges):
+            delta = positions[edges[:, 1]] - positions[edges[:, 0]]
+            pull = delta * (np.sqrt((delta * delta).sum(axis=1)) / spacing)[:, None]
+            source, target = slot[edges[:, 0]], slot[edges[:, 1]]
+            force += _sum_by(source[source >= 0], pull[source >= 0], len(active)) \
+                - _sum_by(target[target >= 0], pull[target >= 0], len(active))
+        force -= GRAVITY * spacing * points
+
+        # Move each node along its force, by at most the current temperature
+        length = np.sqrt((force * force).sum(axis=1))
+        limit = temperature * (1 - step / iterations)
+        positions[active] = points + force * (np.minimum(length, limit) / np.maximum(length, 1e-12))[:, None]
+    return positions
+
+
+class PositionCache:
+    """
+    Device positions and links of the last layout, keyed by device id
+
+    With a path, load() and save() keep them in a JSON file, so a restarted
+    service picks up where the last layout left off.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self.positions: Dict[str, List[float]] = {}
+        self.links: Set[Tuple[str, str]] = set()
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def load(self) -> bool:
+        """Read the cache file; a missing or unreadable one leaves the cache empty"""
+        if not self.path or not self.path.exists():
+            return False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            positions = {str(key): [float(v) for v in value] for key, value in data['positions'].items()}
+            links = {_link(*link) for link in data['links']}
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring layout cache {self.path}: {e}")
+            return False
+        self.positions, self.links = positions, links
+        return True
+
+    def save(self):
+        """Write the cache file, replacing it atomically"""
+        if not self.path:
+            return
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temporary, 'w') as f:
+                json.dump({"positions": self.positions, "links": sorted(self.links)}, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save layout cache {self.path}: {e}")
+
+    def update(self, ids: Sequence[str], positions: np.ndarray, links: Iterable[Tuple[str, str]]):
+        self.positions = dict(zip(ids, positions.tolist()))
+        self.links = set(links)
+
+
+def _link(source: str, target: str) -> Tuple[str, str]:
+    """Direction-free key of a link"""
+    return (source, target) if source <= target else (target, source)
+
+
+def apply_layout(devices: List, connections: List, root: str = FORTIGATE_ID, cache: Optional[PositionCache] = None,
+                 relax_iterations: int = RELAX_ITERATIONS, **options) -> Dict:
+    """
+    Lay out topology records in place, setting each device's position
+
+    Links to ids that are not among devices are ignored. root is pinned at
+    the origin. options are passed to force_layout. With a cache holding a
+    previous layout, only the devices that are new or whose links changed
+    are relaxed, for relax_iterations, and an unchanged topology is not laid
+    out at all; the cache is then updated (and saved) with the result.
+    Returns a summary for the topology metadata.
+    """
+    ids = [device.id for device in devices]
+    index = {device_id: i for i, device_id in enumerate(ids)}
+    links = {_link(link.source, link.target) for link in connections
+             if link.source in index and link.target in index and link.source != link.target}
+    edges = np.array([(index[source], index[target]) for source, target in sorted(links)],
+                     dtype=np.int64).reshape(-1, 2)
+    pinned = [index[root]] if root in index else []
+    iterations = options.pop('iterations', DEFAULT_ITERATIONS)
+    spacing = options.get('spacing', DEFAULT_SPACING)
+
+    known = np.array([device_id in cache.positions for device_id in ids], dtype=bool) if cache else \
+        np.zeros(len(ids), dtype=bool)
+    if not known.any():
+        mode, changed = "full", len(ids)
+        positions = force_layout(len(ids), edges, pinned, iterations=iterations, **options)
+    else:
+        initial = np.zeros((len(ids), 3))
+        initial[known] = [cache.positions[device_id] for device_id, seen in zip(ids, known) if seen]
+        initial[pinned] = 0.0
+        initial = _place_new(initial, known, edges, spacing, options.get('seed', 0))
+        # New devices, and both ends of every added or removed link that are still here
+        moved = ~known
+        for source, target in links ^ cache.links:
+            for device_id in (source, target):
+                if device_id in index:
+                    moved[index[device_id]] = True
+        changed = int(moved.sum())
+        if not changed:
+            mode, iterations, positions = "unchanged", 0, initial
+        elif changed > FULL_LAYOUT_SHARE * len(ids):
+            mode = "full"
+            positions = force_layout(len(ids), edges, pinned, initial, iterations=iterations, **options)
+        else:
+            mode, iterations = "incremental", relax_iterations
+            positions = force_layout(len(ids), edges, pinned, initial, iterations=iterations, movable=moved,
+                                     **options)
+
+    # + 0.0 turns -0.0 into 0.0, so a warm start serializes exactly like the layout it came from
+    positions = np.round(positions, 3) + 0.0
+    for device, (x, y, z) in zip(devices, positions.tolist()):
+        device.position = {"x": x, "y": y, "z": z}
+    if cache is not None and (changed or len(cache) != len(ids)):
+        cache.update(ids, positions, links)
+        cache.save()
+    return {
+        "engine": "barnes_hut",
+        "mode": mode,
+        "nodes": len(devices),
+        "links": len(edges),
+        "moved": changed,
+        "iterations": iterations
+    }
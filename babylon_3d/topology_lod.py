@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Topology Level of Detail
+Group endpoints by where they attach, so large sites stay complete and renderable
+
+Every endpoint is assigned to the most specific attachment the FortiGate
+reports for it: its FortiAP, else its FortiSwitch port, else its VLAN or
+interface. Each group becomes one EndpointGroup node, with member counts
+and health rollups, linked to the AP, switch or interface node it hangs
+off. Groups are computed with NumPy from the EndpointTable's categorical
+codes. Members are kept as row numbers into that table, so expand() can
+list a group's endpoints on demand without the raw records.
+"""
+
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from endpoint_table import UNKNOWN, EndpointTable
+from fortigate_common.records import FORTIGATE_ID, Endpoint, EndpointGroup, Link
+
+# Group kinds in order of preference; the code of each is its index
+GROUP_KINDS = ('access_point', 'switch_port', 'interface', 'vlan', 'unassigned')
+# Device types listed per group, most common first
+TOP_DEVICE_TYPES = 5
+# Expanded endpoints sit on a sphere around their group node whose radius grows
+# with the square root of the member count, keeping neighbours this far apart
+EXPANDED_SPACING = 0.5
+GOLDEN_ANGLE = np.pi * (3 - np.sqrt(5))
+
+
+def endpoint_from_row(table: EndpointTable, row: int, z: float = 0, connected_to: str = FORTIGATE_ID,
+                      position: Optional[Dict] = None) -> Endpoint:
+    """An Endpoint record for one EndpointTable row"""
+    values = table.row(row)
+    mac = values['mac']
+    return Endpoint(
+        id=f"device_{mac.replace(':', '_')}" if mac else f"device_{row}",
+        name=values['hostname'] or f"Device {row}",
+        ip=values['ip'],
+        mac=mac,
+        z=z,
+        os=values['os'],
+        user=values['user'] or 'Unknown',
+        last_seen=values['last_seen'] if values['last_seen'] is not None else '',
+        device_type=values['device_type'],
+        connected_to=connected_to,
+        position=position
+    )
+
+
+def _around(center: Dict, indices: np.ndarray, total: int) -> List[Dict]:
+    """Positions of members indices (of total) spread over a Fibonacci sphere centred on center"""
+    y = 1 - 2 * (indices + 0.5) / total
+    ring = np.sqrt(1 - y * y)
+    angle = GOLDEN_ANGLE * indices
+    unit = np.column_stack((ring * np.cos(angle), y, ring * np.sin(angle)))
+    points = np.round(unit * (EXPANDED_SPACING * np.sqrt(total)) + [center['x'], center['y'], center['z']], 3) + 0.0
+    return [{"x": x, "y": y, "z": z} for x, y, z in points.tolist()]
+
+
+def _attachment(table: EndpointTable, column: str):
+    """(codes, categories, mask of rows where the column is known)"""
+    codes, categories = table.codes[column], table.categories[column]
+    unknown = categories.index(UNKNOWN) if UNKNOWN in categories else -1
+    return codes, categories, codes != unknown
+
+
+class EndpointGroups:
+    """The endpoint groups of one topology and their members"""
+
+    def __init__(self, table: EndpointTable, groups: List[EndpointGroup], order: np.ndarray, offsets: np.ndarray):
+        self.table = table
+        self.groups = groups
+        self._order = order
+        self._offsets = offsets
+        self._index = {group.id: i for i, group in enumerate(groups)}
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def __contains__(self, group_id: str) -> bool:
+        return group_id in self._index
+
+    def get(self, group_id: str) -> Optional[EndpointGroup]:
+        i = self._index.get(group_id)
+        return self.groups[i] if i is not None else None
+
+    def members(self, group_id: str) -> np.ndarray:
+        """EndpointTable rows of the group's endpoints"""
+        i = self._index[group_id]
+        return self._order[self._offsets[i]:self._offsets[i + 1]]
+
+    def expand(self, group_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[Dict]:
+        """
+        The group's endpoints (a page of them with offset/limit) as devices and connections
+
+        Expanded endpoints link to the group's parent, so a client can swap
+        the group node for them, and are placed around the group node's
+        position; a member keeps its place whichever page lists it. Returns
+        None for an unknown group.
+        """
+        group = self.get(group_id)
+        if group is None:
+            return None
+        members = self.members(group_id)
+        page = members[offset:offset + limit if limit is not None else None]
+        summary = group.to_dict()
+        positions = _around(summary["position"], np.arange(offset, offset + len(page)), len(members))
+        devices = [endpoint_from_row(self.table, int(row), z=position["z"], connected_to=group.connected_to,
+                                     position=position)
+                   for row, position in zip(page, positions)]
+        return {
+            "group": summary,
+            "total": len(members),
+            "offset": offset,
+            "devices": [device.to_dict() for device in devices],
+            "connections": [Link(group.connected_to, device.id, "endpoint", 100).to_dict() for device in devices]
+        }
+
+
+def group_endpoints(table: EndpointTable, access_points: Optional[Dict[str, str]] = None,
+                    switches: Optional[Dict[str, str]] = None, interfaces: Optional[Dict[str, str]] = None,
+                    vlans: Set[str] = frozenset()) -> EndpointGroups:
+    """
+    Group every endpoint in table by attachment point
+
+    access_points, switches and interfaces map the names (and serials) the
+    endpoints report to topology node ids; groups whose attachment is not
+    in the topology hang off the FortiGate. Interfaces named in vlans form
+    'vlan' groups.
+    """
+    access_points, switches, interfaces = access_points or {}, switches or {}, interfaces or {}
+    ap, ap_categories, has_ap = _attachment(table, 'access_point')
+    switch, switch_categories, has_switch = _attachment(table, 'switch')
+    port, port_categories, _ = _attachment(table, 'switch_port')
+    interface, interface_categories, has_interface = _attachment(table, 'interface')
+
+    # One integer key per row: kind * width + attachment code within that kind
+    ports = max(len(port_categories), 1)
+    width = max(len(ap_categories), len(switch_categories) * ports, len(interface_categories), 1)
+    conditions = [has_ap, has_switch, has_interface]
+    kind = np.select(conditions, [0, 1, 2], default=4).astype(np.int64)
+    key = np.select(conditions, [ap, switch * ports + port, interface], default=0).astype(np.int64)
+    labels, inverse, counts = np.unique(kind * width + key, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    online = np.bincount(inverse, weights=table.online, minlength=len(labels)).astype(np.int64)
+    last_seen = np.full(len(labels), np.nan)
+    np.fmax.at(last_seen, inverse, table.last_seen)
+    type_codes, type_categories = table.codes['device_type'], table.categories['device_type']
+    types = np.bincount(inverse * len(type_categories) + type_codes,
+                        minlength=len(labels) * len(type_categories)).reshape(len(labels), len(type_categories))
+
+    groups = []
+    for i, label in enumerate(labels):
+        group_kind, code = divmod(int(label), width)
+        if group_kind == 0:
+            name = ap_categories[code]
+            group_id, parent, title = f"group_ap_{name}", access_points.get(name), f"{name} clients"
+        elif group_kind == 1:
+            switch_name, port_name = switch_categories[code // ports], port_categories[code % ports]
+            group_id, parent = f"group_port_{switch_name}_{port_name}", switches.get(switch_name)
+            title = f"{switch_name} {port_name}"
+        elif group_kind == 2:
+            name = interface_categories[code]
+            group_kind = 3 if name in vlans else 2
+            group_id, parent, title = f"group_if_{name}", interfaces.get(name), f"{name} endpoints"
+        else:
+            group_id, parent, title = "group_unassigned", None, "Unassigned endpoints"
+
+        top = np.argsort(-types[i], kind='stable')[:TOP_DEVICE_TYPES]
+        groups.append(EndpointGroup(
+            id=group_id,
+            name=title,
+            kind=GROUP_KINDS[group_kind],
+            count=int(counts[i]),
+            online=int(online[i]),
+            z=i * 0.5,
+            last_seen=None if np.isnan(last_seen[i]) else float(last_seen[i]),
+            device_types={type_categories[t]: int(types[i, t]) for t in top if types[i, t]},
+            connected_to=parent or FORTIGATE_ID
+        ))
+
+    order = np.argsort(inverse, kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return EndpointGroups(table, groups, order, offsets)
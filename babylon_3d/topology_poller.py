@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Topology Poller
+Background refresh of a versioned, immutable topology snapshot
+
+One poller task talks to the FortiGate on a fixed schedule and swaps in a new
+TopologySnapshot when a refresh succeeds. Request handlers only read the
+current snapshot, so their latency no longer depends on the appliance and the
+appliance sees one poller however many dashboards are connected. A failed
+refresh keeps serving the previous snapshot. An optional encode hook turns
+the sections into ready-to-send bodies once per version, in a worker thread.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 30
+
+
+class TopologySnapshot:
+    """
+    One successful refresh: the collected sections plus a monotonically increasing version
+
+    Attributes cannot be reassigned once set, and the section payloads are
+    shared between every request that serves the snapshot, so they must be
+    treated as read-only.
+    """
+
+    __slots__ = ('version', 'taken_at', 'duration', 'sections', 'encoded')
+
+    def __init__(self, version: int, sections: Dict[str, Any], taken_at: float, duration: float = 0.0,
+                 encoded: Optional[Dict[str, Any]] = None):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'sections', dict(sections))
+        object.__setattr__(self, 'encoded', dict(encoded or {}))
+        object.__setattr__(self, 'taken_at', taken_at)
+        object.__setattr__(self, 'duration', duration)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getitem__(self, section: str) -> Any:
+        return self.sections[section]
+
+    def get(self, section: str, default: Any = None) -> Any:
+        return self.sections.get(section, default)
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (time.time() if now is None else now) - self.taken_at
+
+    def __repr__(self) -> str:
+        return f"TopologySnapshot(version={self.version}, sections={sorted(self.sections)})"
+
+
+class TopologyPoller:
+    """
+    Periodically run collect() and publish the result as the current snapshot
+
+    collect is a coroutine function returning a dict of named sections (for
+    example topology, fortiaps, fortiswitches). Refreshes never overlap: the
+    next one starts interval seconds after the previous one finished. encode,
+    if given, maps the sections to their encoded forms (see
+    response_encoding.encode_sections) and runs off the event loop.
+    """
+
+    def __init__(self, collect: Callable[[], Awaitable[Dict[str, Any]]],
+                 interval: float = DEFAULT_POLL_INTERVAL, clock: Callable[[], float] = time.time,
+                 encode: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None):
+        self.collect = collect
+        self.interval = interval
+        self.encode = encode
+        self._clock = clock
+        self._snapshot: Optional[TopologySnapshot] = None
+        self._ready = asyncio.Event()
+        # Replaced on every publish so waiters wake once per new version
+        self._published = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def snapshot(self) -> Optional[TopologySnapshot]:
+        """Current snapshot, or None until the first refresh succeeds"""
+        return self._snapshot
+
+    async def refresh(self) -> Optional[TopologySnapshot]:
+        """Collect once and publish a new snapshot; on failure keep the previous one"""
+        started = self._clock()
+        try:
+            sections = await self.collect()
+            encoded = None
+            if self.encode is not None:
+                encoded = await asyncio.get_running_loop().run_in_executor(None, self.encode, sections)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.warning(f"Topology refresh failed, keeping snapshot v{self.version}: {e}")
+            return None
+        finished = self._clock()
+        self._snapshot = TopologySnapshot(self.version + 1, sections, taken_at=finished,
+                                          duration=finished - started, encoded=encoded)
+        self.refreshes += 1
+        self.last_error = None
+        self._ready.set()
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot is not None else 0
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> Optional[TopologySnapshot]:
+        """Wait for the first snapshot; returns None if none arrived within timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._snapshot
+
+    async def wait_for_newer(self, version: int, timeout: Optional[float] = None) -> Optional[TopologySnapshot]:
+        """
+        Wait until a snapshot newer than version is published and return it
+
+        Returns the latest snapshot at once if it is already newer (so slow
+        consumers skip the versions they missed), or None on timeout.
+        """
+        while self.version <= version:
+            try:
+                await asyncio.wait_for(self._published.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._snapshot
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        """Start the background task on the running loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            'version': self.version,
+            'running': self.running,
+            'interval': self.interval,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'age': round(snapshot.age(self._clock()), 3) if snapshot is not None else None,
+            'last_duration': round(snapshot.duration, 3) if snapshot is not None else None
+        }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Topology Stream
+Push the topology to dashboards as one snapshot followed by deltas
+
+Each connection first receives the current snapshot, then a delta whenever
+the poller publishes a newer version. A consumer only gets its next message
+once the previous one has been written, and that message is the delta from
+the version it last received to the latest one: slow consumers skip
+intermediate versions instead of queueing them, and memory per connection
+stays constant. Each version is indexed for diffing once, and deltas and
+their encoded bytes are computed once per version pair and shared by every
+connection. Indexing, diffing and encoding run in the default executor, one
+job at a time, so a large topology does not stall the event loop.
+
+Served as a WebSocket when the request asks for an upgrade and as
+Server-Sent Events otherwise.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+from response_encoding import dumps
+from topology_diff import TopologyIndex, diff_indexes, is_empty
+from topology_poller import TopologyPoller, TopologySnapshot
+
+HEARTBEAT_INTERVAL = 15
+# Version pairs whose encoded delta is kept; consumers are normally one version behind
+DELTA_CACHE_SIZE = 8
+
+
+class TopologyStreamer:
+    """Builds and shares snapshot/delta messages for one poller section"""
+
+    def __init__(self, poller: TopologyPoller, section: str = 'topology',
+                 heartbeat: float = HEARTBEAT_INTERVAL):
+        self.poller = poller
+        self.section = section
+        self.heartbeat = heartbeat
+        self._snapshots: Dict[int, bytes] = {}
+        self._deltas: 'OrderedDict[Tuple[int, int], Optional[bytes]]' = OrderedDict()
+        self._indexes: 'OrderedDict[int, TopologyIndex]' = OrderedDict()
+        # Serializes executor jobs, which own the caches above while they run
+        self._building = asyncio.Lock()
+        self.connections = 0
+        self.messages_sent = 0
+
+    def snapshot_message(self, snapshot: TopologySnapshot) -> bytes:
+        message = self._snapshots.get(snapshot.version)
+        if message is None:
+            message = dumps({'type': 'snapshot', 'version': snapshot.version, self.section: snapshot[self.section]})
+            self._snapshots = {snapshot.version: message}
+        return message
+
+    def delta_message(self, old: TopologySnapshot, new: TopologySnapshot) -> Optional[bytes]:
+        """Encoded delta from old to new, or None if nothing changed"""
+        key = (old.version, new.version)
+        if key in self._deltas:
+            self._deltas.move_to_end(key)
+            return self._deltas[key]
+        delta = diff_indexes(self._index(old), self._index(new))
+        message = None
+        if not is_empty(delta):
+            message = dumps({'type': 'delta', 'from': old.version, 'version': new.version, **delta})
+        self._deltas[key] = message
+        while len(self._deltas) > DELTA_CACHE_SIZE:
+            self._deltas.popitem(last=False)
+        return message
+
+    async def _offload(self, build, *args):
+        """Run snapshot_message or delta_message in the default executor"""
+        async with self._building:
+            return await asyncio.get_running_loop().run_in_executor(None, build, *args)
+
+    def _index(self, snapshot: TopologySnapshot) -> TopologyIndex:
+        index = self._indexes.get(snapshot.version)
+        if index is None:
+            index = self._indexes[snapshot.version] = TopologyIndex(snapshot[self.section])
+            while len(self._indexes) > DELTA_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        return index
+
+    async def messages(self):
+        """
+        Yield (event, version, bytes) for one consumer, pulling the next one only when asked
+
+        None messages are heartbeats, yielded when no new version arrived
+        within the heartbeat interval.
+        """
+        snapshot = self.poller.snapshot or await self.poller.wait_ready()
+        yield 'snapshot', snapshot.version, await self._offload(self.snapshot_message, snapshot)
+        sent = snapshot
+        while True:
+            latest = await self.poller.wait_for_newer(sent.version, timeout=self.heartbeat)
+            if latest is None:
+                yield 'heartbeat', sent.version, None
+                continue
+            message = await self._offload(self.delta_message, sent, latest)
+            sent = latest
+            if message is not None:
+                yield 'delta', latest.version, message
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        """aiohttp handler: WebSocket on upgrade, Server-Sent Events otherwise"""
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await self._serve_websocket(request)
+        return await self._serve_sse(request)
+
+    async def _serve_sse(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        await response.prepare(request)
+        self.connections += 1
+        try:
+            async for event, version, message in self.messages():
+                if message is None:
+                    await response.write(b': keepalive\n\n')
+                    continue
+                # write() waits for the transport to drain, which is our backpressure
+                await response.write(b'event: %s\nid: %d\ndata: %s\n\n' % (event.encode(), version, message))
+                self.messages_sent += 1
+        except ConnectionResetError:
+            pass
+        finally:
+            self.connections -= 1
+        return response
+
+    async def _serve_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=self.heartbeat)
+        await ws.prepare(request)
+        self.connections += 1
+        sender = asyncio.ensure_future(self._send_websocket(ws))
+        try:
+            # Drain control frames and notice when the client goes away
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            self.connections -= 1
+        return ws
+
+    async def _send_websocket(self, ws: web.WebSocketResponse):
+        try:
+            async for event, version, message in self.messages():
+                if message is None:
+                    continue
+                await ws.send_str(message.decode())
+                self.messages_sent += 1
+        except ConnectionResetError:
+            pass
+        finally:
+            await ws.close()
+
+    def stats(self) -> Dict:
+        return {'connections': self.connections, 'messages_sent': self.messages_sent}
@@ -0,0 +1,134 @@
+"""
+Benchmark fixtures
+Synthetic fleets at several sizes, served to the real clients from memory
+
+Each fleet is served by the local FortiGate simulator through a CassetteTransport
+in 'new' mode: the first request for a URL is recorded, later ones are
+replayed from memory, so benchmark rounds measure client-side parsing,
+normalization and topology assembly without sockets or the simulator's own work.
+
+Run with pytest-benchmark (pip install pytest-benchmark), see README.md.
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+# Add project root and babylon_3d to path
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'babylon_3d'))
+
+from api_replay import CassetteTransport
+from enhanced_fortigate_client import EnhancedFortiGateClient
+from fortigate_api_integration import FortiGateAPIClient
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+
+BASELINE_DIR = Path(__file__).parent / 'baselines'
+
+# Fleet sizes; pick some with -k, e.g. -k small
+SIZES = {
+    'small': dict(switches=4, aps=20, endpoints=200, interfaces=8),
+    'medium': dict(switches=16, aps=200, endpoints=5000, interfaces=16),
+    'large': dict(switches=64, aps=1000, endpoints=50000, interfaces=32),
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--cassette', default=None,
+                     help='Recorded API cassette (api_replay.py) to also benchmark collection against')
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Keep saved runs next to the suite instead of in ./.benchmarks of whatever the cwd is
+    if config.getoption('benchmark_storage', None) == 'file://./.benchmarks':
+        config.option.benchmark_storage = f'file://{BASELINE_DIR}'
+
+
+class SimulatorServer:
+    """A FortiGateSimulator listening on a loopback port, run by a background event loop"""
+
+    def __init__(self, simulator: FortiGateSimulator):
+        self.simulator = simulator
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._runner = None
+        self.base_url = None
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self) -> 'SimulatorServer':
+        self._thread.start()
+        self._runner = web.AppRunner(self.simulator.app())
+        self._run(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        self._run(site.start())
+        port = self._runner.addresses[0][1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        return self
+
+    def stop(self):
+        self._run(self._runner.cleanup())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+class Fleet:
+    """One fleet size: its synthetic data, simulator server and payload store"""
+
+    def __init__(self, name: str, **sizes):
+        self.name = name
+        self.fleet = SyntheticFleet(**sizes)
+        self.server = SimulatorServer(FortiGateSimulator(self.fleet)).start()
+        self.transport = CassetteTransport(mode='new')
+
+    def attach(self, client):
+        """Point a requests-based client at this fleet through the shared cassette"""
+        client.base_url = self.server.base_url
+        client.session.mount('http://', self.transport)
+        return client
+
+    def api_client(self) -> FortiGateAPIClient:
+        return self.attach(FortiGateAPIClient(host='127.0.0.1', username='admin', password='', api_token='token'))
+
+    def enhanced_client(self) -> EnhancedFortiGateClient:
+        # No response cache, so every round parses and normalizes every page
+        return self.attach(EnhancedFortiGateClient(host='127.0.0.1', api_token='token', cache_ttl=0))
+
+    def records(self, name: str):
+        total, record = self.fleet.collection(name)
+        return [record(i) for i in range(total)]
+
+
+@pytest.fixture(scope='session')
+def fleets():
+    started = {}
+
+    def get(name: str) -> Fleet:
+        if name not in started:
+            started[name] = Fleet(name, **SIZES[name])
+        return started[name]
+
+    yield get
+    for fleet in started.values():
+        fleet.server.stop()
+
+
+@pytest.fixture(params=list(SIZES))
+def fleet(request, fleets) -> Fleet:
+    return fleets(request.param)
+
+
+@pytest.fixture
+def cassette(request) -> CassetteTransport:
+    """Replay transport for --cassette; benchmarks using it are skipped without one"""
+    path = request.config.getoption('--cassette')
+    if not path:
+        pytest.skip("No --cassette given")
+    return CassetteTransport(path, mode='replay')
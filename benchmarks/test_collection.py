@@ -0,0 +1,45 @@
+"""
+Collection benchmarks
+Full topology collection by the FortiGate clients, from replayed fleet payloads
+"""
+
+from urllib.parse import urlsplit
+
+import pytest
+
+from enhanced_fortigate_client import EnhancedFortiGateClient
+from fortigate_api_integration import NetworkTopologyBuilder
+
+
+@pytest.mark.benchmark(group='collection')
+def test_enhanced_get_complete_topology(benchmark, fleet):
+    client = fleet.enhanced_client()
+    client.get_complete_topology()
+    recorded = fleet.transport.recorded
+
+    topology = benchmark(client.get_complete_topology)
+
+    assert topology['metadata']['endpoints_count'] == fleet.fleet.endpoints
+    assert fleet.transport.recorded == recorded, "Rounds should be replayed from memory"
+
+
+@pytest.mark.benchmark(group='collection')
+def test_builder_build_topology(benchmark, fleet):
+    client = fleet.api_client()
+    NetworkTopologyBuilder(client).build_topology()
+
+    topology = benchmark(lambda: NetworkTopologyBuilder(client).build_topology())
+
+    assert topology['metadata']['device_counts']['access_point'] == fleet.fleet.aps
+
+
+@pytest.mark.benchmark(group='collection')
+def test_replayed_get_complete_topology(benchmark, cassette):
+    # Talk to the recorded firewall's address; its responses come from the cassette
+    recorded = urlsplit(cassette.cassette.interactions[0]['url'])
+    client = EnhancedFortiGateClient(host=recorded.hostname, api_token='replay', cache_ttl=0, transport=cassette)
+    client.base_url = f'{recorded.scheme}://{recorded.netloc}'
+
+    topology = benchmark(client.get_complete_topology)
+
+    assert cassette.replayed and topology['metadata']['total_devices'] > 0
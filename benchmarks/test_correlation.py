@@ -0,0 +1,30 @@
+"""
+Correlation benchmarks
+Joining switch MAC tables with ARP and DHCP leases at each fleet size
+"""
+
+import pytest
+
+from fortigate_common.correlation import PhysicalIndex
+
+GATEWAY_MACS = {'02:f0:00:00:00:01': 'interface_fortilink'}
+
+
+@pytest.mark.benchmark(group='correlation')
+def test_physical_index(benchmark, fleet):
+    mac_table, arp, leases = fleet.records('mac_table'), fleet.records('arp'), fleet.records('dhcp_leases')
+
+    index = benchmark(PhysicalIndex, mac_table, arp, leases, gateway_macs=GATEWAY_MACS)
+
+    assert index.entries == len(mac_table)
+    assert len(index.switches) == fleet.fleet.switches
+
+
+@pytest.mark.benchmark(group='correlation')
+def test_locate_every_endpoint(benchmark, fleet):
+    index = PhysicalIndex(fleet.records('mac_table'), fleet.records('arp'), gateway_macs=GATEWAY_MACS)
+    endpoints = [(endpoint['mac'], endpoint['ip']) for endpoint in fleet.records('endpoints')]
+
+    located = benchmark(lambda: sum(index.locate(mac, ip) is not None for mac, ip in endpoints))
+
+    assert located == fleet.fleet.wired_endpoints
@@ -0,0 +1,63 @@
+"""
+Export benchmarks
+Babylon.js export, Draw.io context generation and device parsing at each fleet size
+"""
+
+import pytest
+
+from fortigate_api_integration import NetworkTopologyBuilder
+from fortigate_network_mapper import FortiGateNetworkMapper
+
+
+def draw_io_topology(fleet):
+    """The collect_all_topology_data() shape the Draw.io context is generated from"""
+    devices = fleet.records('endpoints')
+    switches = fleet.records('switches')
+    aps = fleet.records('aps')
+    leases = fleet.records('dhcp_leases')
+    interfaces = fleet.records('interfaces')
+    return {
+        'timestamp': '2024-01-01T00:00:00',
+        'devices': {'devices': devices, 'total_devices': len(devices)},
+        'fortiswitch': {'switches': switches, 'total_switches': len(switches)},
+        'fortiap': {'access_points': aps, 'total_aps': len(aps)},
+        'dhcp_leases': {'leases': leases, 'total_leases': len(leases)},
+        'interfaces': {'interfaces': interfaces, 'total_interfaces': len(interfaces)},
+    }
+
+
+def make_mapper():
+    """Mapper without the connectivity check"""
+    mapper = FortiGateNetworkMapper.__new__(FortiGateNetworkMapper)
+    mapper.host = '127.0.0.1'
+    return mapper
+
+
+@pytest.mark.benchmark(group='export')
+def test_export_to_babylon_format(benchmark, fleet):
+    builder = NetworkTopologyBuilder(fleet.api_client())
+    topology = builder.build_topology()
+
+    babylon = benchmark(builder.export_to_babylon_format)
+
+    assert len(babylon['models']) == len(topology['devices'])
+
+
+@pytest.mark.benchmark(group='export')
+def test_generate_draw_io_context(benchmark, fleet):
+    mapper = make_mapper()
+    topology = draw_io_topology(fleet)
+
+    context = benchmark(mapper.generate_draw_io_context, topology)
+
+    assert f"Connected Devices ({fleet.fleet.endpoints} total)" in context
+
+
+@pytest.mark.benchmark(group='export')
+def test_parse_device_info(benchmark, fleet):
+    mapper = make_mapper()
+    devices = fleet.records('endpoints')
+
+    parsed = benchmark(mapper.parse_device_info, devices)
+
+    assert len(parsed) == len(devices)
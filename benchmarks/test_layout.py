@@ -0,0 +1,56 @@
+"""
+Layout benchmarks
+Barnes-Hut force-directed layout of the builder's topology at each fleet size, cold and warm-started
+"""
+
+import numpy as np
+import pytest
+
+from fortigate_api_integration import NetworkTopologyBuilder
+from topology_layout import Octree, PositionCache, apply_layout
+
+
+def unlaid_topology(fleet):
+    builder = NetworkTopologyBuilder(fleet.api_client())
+    builder.LAYOUT_ITERATIONS = 0
+    return builder.build_topology(as_records=True)
+
+
+@pytest.mark.benchmark(group='layout')
+def test_apply_layout(benchmark, fleet):
+    topology = unlaid_topology(fleet)
+
+    layout = benchmark.pedantic(apply_layout, (topology['devices'], topology['connections']), rounds=3)
+
+    assert layout['nodes'] == len(topology['devices'])
+    assert topology['devices'][0].position == {'x': 0.0, 'y': 0.0, 'z': 0.0}
+
+
+@pytest.mark.benchmark(group='layout')
+def test_incremental_layout(benchmark, fleet):
+    topology = unlaid_topology(fleet)
+    devices, connections = topology['devices'], topology['connections']
+    cache = PositionCache()
+    apply_layout(devices[:-1], connections, cache=cache)
+    laid_out = (dict(cache.positions), set(cache.links))
+
+    def relayout():
+        # One device joined since the last layout
+        cache.positions, cache.links = dict(laid_out[0]), set(laid_out[1])
+        return apply_layout(devices, connections, cache=cache)
+
+    layout = benchmark.pedantic(relayout, rounds=3)
+
+    assert layout['mode'] == 'incremental'
+    assert layout['moved'] <= 2
+
+
+@pytest.mark.benchmark(group='layout')
+def test_octree_repulsion(benchmark, fleet):
+    topology = unlaid_topology(fleet)
+    apply_layout(topology['devices'], topology['connections'], iterations=0)
+    tree = Octree(np.array([[device.position[axis] for axis in 'xyz'] for device in topology['devices']]))
+
+    force = benchmark(tree.repulsion, 9.0)
+
+    assert force.shape == (len(topology['devices']), 3)
@@ -0,0 +1,33 @@
+"""
+Subnet attribution benchmarks
+Longest-prefix-match lookups of every endpoint IP at each fleet size
+"""
+
+import pytest
+
+from subnet_index import SubnetIndex
+
+
+def fleet_index(fleet) -> SubnetIndex:
+    return SubnetIndex.from_fortigate(fleet.records('interfaces'), fleet.records('dhcp_servers'),
+                                      fleet.records('addresses'))
+
+
+@pytest.mark.benchmark(group='subnets')
+def test_lookup_many(benchmark, fleet):
+    index = fleet_index(fleet)
+    ips = [endpoint['ip'] for endpoint in fleet.records('endpoints')]
+
+    numbers = benchmark(index.lookup_many, ips)
+
+    assert (numbers >= 0).all()
+
+
+@pytest.mark.benchmark(group='subnets')
+def test_lookup_each(benchmark, fleet):
+    index = fleet_index(fleet)
+    ips = [endpoint['ip'] for endpoint in fleet.records('endpoints')]
+
+    found = benchmark(lambda: sum(index.lookup(ip) is not None for ip in ips))
+
+    assert found == len(ips)
@@ -0,0 +1,52 @@
+"""
+SVG to 3D benchmarks
+Advanced3DConverter path parsing and extrusion for icons of increasing complexity
+"""
+
+import math
+
+import pytest
+
+from advanced_3d_converter import Advanced3DConverter
+
+# Paths per icon and points per path
+ICON_SIZES = {
+    'small': (10, 16),
+    'medium': (100, 64),
+    'large': (1000, 64),
+}
+
+
+def write_icon(path, paths: int, points: int):
+    """An SVG of concentric polygons drawn with M/L/C/Z commands"""
+    elements = []
+    for p in range(paths):
+        radius = 1 + p
+        coords = [(radius * math.cos(2 * math.pi * k / points), radius * math.sin(2 * math.pi * k / points))
+                  for k in range(points)]
+        d = [f'M {coords[0][0]:.3f},{coords[0][1]:.3f}']
+        for k, (x, y) in enumerate(coords[1:], 1):
+            if k % 4:
+                d.append(f'L {x:.3f},{y:.3f}')
+            else:
+                d.append(f'C {x:.3f},{y:.3f} {x:.3f},{y:.3f} {x:.3f},{y:.3f}')
+        d.append('Z')
+        elements.append(f'<path d="{" ".join(d)}"/>')
+    path.write_text('<svg xmlns="http://www.w3.org/2000/svg">' + ''.join(elements) + '</svg>')
+    return path
+
+
+@pytest.fixture(params=list(ICON_SIZES))
+def icon(request, tmp_path):
+    paths, points = ICON_SIZES[request.param]
+    return write_icon(tmp_path / f'icon_{request.param}.svg', paths, points), paths
+
+
+@pytest.mark.benchmark(group='svg_to_3d')
+def test_svg_to_3d_mesh(benchmark, icon, tmp_path):
+    svg_path, paths = icon
+    converter = Advanced3DConverter(tmp_path, tmp_path / 'out')
+
+    mesh = benchmark(converter.svg_to_3d_mesh, svg_path)
+
+    assert len(mesh['paths']) == paths and mesh['faces']
@@ -4,12 +4,25 @@ Enhanced FortiGate API Client for FortiAP-Switch Dashboard
 Built using discovered API schemas from FortiGate-61F (v7.6.4)
 """
 
+import copy
 import requests
 import json
 import urllib3
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 from datetime import datetime
 import logging
+import time
+
+from api_replay import mount_transport
+from babylon_3d.fortigate_common.correlation import PhysicalIndex
+from babylon_3d.fortigate_common.fields import project_record, project_results
+from babylon_3d.fortigate_common.paging import DEFAULT_PAGE_SIZE, iter_paged
+from babylon_3d.fortigate_common.records import (
+    FORTIGATE_ID, EndpointDetail, FortiAPDetail, InterfaceDetail, Link, ManagedSwitch, records_to_dicts
+)
+from babylon_3d.fortigate_common.streaming import iter_json_results
+from fortigate_cache import TTLCache, cache_key
+from fortigate_raw_store import RawPayloadStore
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -17,11 +30,60 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 class EnhancedFortiGateClient:
     """Enhanced FortiGate API Client with discovered endpoints"""
     
-    def __init__(self, host: str, api_token: str, port: int = 10443, verify_ssl: bool = False):
+    # Fields each getter reads from the API objects; results are trimmed to these
+    FORTIAP_FIELDS = (
+        'serial', 'name', 'model', 'ip', 'connecting_from', 'state', 'ap_profile', 'vdom',
+        'is_local', 'radio_1', 'radio_2', 'wifi_clients', 'ethernet_mac', 'last_seen',
+        'uptime', 'cpu_usage', 'memory_usage', 'temperature'
+    )
+    DEVICE_FIELDS = (
+        'mac', 'hostname', 'name', 'ip', 'ipv4', 'user', 'devtype', 'type', 'os', 'vdom',
+        'last_seen', 'online', 'auth_user', 'auth_group', 'src_intf', 'traffic_stats'
+    )
+    INTERFACE_FIELDS = (
+        'name', 'ip', 'subnet', 'status', 'mtu', 'speed', 'mac', 'alias', 'vdom', 'role'
+    )
+    MAC_TABLE_FIELDS = ('mac', 'switch_id', 'port_name', 'vlan_id')
+    ARP_FIELDS = ('ip', 'mac', 'interface')
+    DHCP_LEASE_FIELDS = ('ip', 'mac', 'hostname', 'interface')
+    
+    def __init__(self, host: str, api_token: str, port: int = 10443, verify_ssl: bool = False,
+                 project_fields: bool = True, raw: str = 'none', cache_ttl: float = 30, metrics=None,
+                 transport=None):
+        """
+        raw selects how the source objects behind normalized records are kept:
+        'none' drops them, 'ref' keeps the latest one per record id in
+        self.raw_store (see get_raw_payload), 'full' embeds a copy in each
+        record's metadata['raw_data']. Kept payloads are the objects as the
+        FortiGate sent them; the records the getters return are projected
+        to their fields under every policy.
+        
+        The default 'none' is the cheap one: collections are requested with
+        ?format= and only the projected fields are downloaded and held. 'ref'
+        and 'full' have to fetch every object whole so it can be kept, and
+        'ref' holds one unprojected payload per record on top of the records
+        until the next collection of that kind; pick them only when
+        get_raw_payload or the embedded copies are actually needed.
+        
+        Parsed responses are cached for cache_ttl seconds per endpoint and
+        params (0 disables the cache); see invalidate_cache and cache_stats.
+        
+        metrics, if given, receives request/parse/cache/error hook calls
+        (see FortiGateMetrics in babylon_3d/service_metrics.py).
+        
+        transport, if given, is a requests adapter every API call goes through,
+        such as a record/replay CassetteTransport from api_replay.py.
+        """
         self.host = host
         self.port = port
         self.api_token = api_token
         self.verify_ssl = verify_ssl
+        self.project_fields = project_fields
+        self.raw_store = RawPayloadStore(raw)
+        self.cache = TTLCache(cache_ttl)
+        self.metrics = metrics
+        # (taken_at, counts) of the last complete topology, reused by get_discovery_summary
+        self._topology_counts = None
         self.base_url = f"https://{host}:{port}"
         self.session = requests.Session()
         self.session.headers.update({
@@ -31,22 +93,77 @@ class EnhancedFortiGateClient:
         
         if not verify_ssl:
             self.session.verify = False
+        mount_transport(self.session, transport)
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
-    def _make_request(self, endpoint: str, params: Dict = None, timeout: int = 10) -> Dict:
-        """Make API request with enhanced error handling"""
+    def _build_url(self, endpoint: str, params: Dict = None) -> str:
+        url = f"{self.base_url}/api/v2/monitor/{endpoint}"
+        if params:
+            url += '?' + '&'.join([f"{k}={v}" for k, v in params.items()])
+        return url
+    
+    def _metric(self, hook: str, *args):
+        """Report to the optional metrics hooks; a no-op without metrics"""
+        if self.metrics is not None:
+            getattr(self.metrics, hook)(*args)
+    
+    def _get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """The one place requests reach the FortiGate: times them and counts failures"""
+        started = time.perf_counter()
         try:
-            url = f"{self.base_url}/api/v2/monitor/{endpoint}"
-            if params:
-                url += '?' + '&'.join([f"{k}={v}" for k, v in params.items()])
-            
-            response = self.session.get(url, timeout=timeout)
+            response = self.session.get(url, **kwargs)
+        except Exception as e:
+            self._metric('error', endpoint, type(e).__name__)
+            raise
+        self._metric('request', endpoint, time.perf_counter() - started, response.status_code)
+        return response
+    
+    def _timed_records(self, endpoint: str, records: Iterator[Dict]) -> Iterator[Dict]:
+        """Pass streamed records through, reporting the time spent reading and parsing them"""
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    record = next(records)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield record
+        finally:
+            self._metric('parse', endpoint, elapsed)
+    
+    def _make_request(self, endpoint: str, params: Dict = None, timeout: int = 10,
+                      fields: Optional[tuple] = None) -> Dict:
+        """
+        Make API request with enhanced error handling
+        
+        Monitor endpoints ignore format=, so when fields are given the results
+        are trimmed client-side before anything else holds on to them.
+        Successful responses are served from the TTL cache until they expire;
+        the cache keeps its own copy and every caller gets a fresh one, so the
+        result is the caller's to modify.
+        """
+        key = cache_key(endpoint, params, fields)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._get(endpoint, self._build_url(endpoint, params), timeout=timeout)
             if response.status_code == 200:
+                started = time.perf_counter()
                 data = response.json()
+                self._metric('parse', endpoint, time.perf_counter() - started)
+                if fields and self.project_fields and 'results' in data:
+                    data['results'] = project_results(data['results'], fields)
                 if data.get('status') == 'success':
+                    if self.cache.ttl:
+                        self.cache.set(key, copy.deepcopy(data))
                     return data
                 else:
                     self.logger.error(f"API Error: {data.get('error', 'Unknown error')}")
@@ -58,131 +175,305 @@ class EnhancedFortiGateClient:
             self.logger.error(f"Request Exception: {e}")
             return {"error": str(e)}
     
+    def _stream_results(self, endpoint: str, params: Dict = None, timeout: int = 10,
+                        fields: Optional[tuple] = None) -> Optional[Iterator[Dict]]:
+        """
+        GET a monitor collection and parse its results incrementally
+        
+        Records are yielded while the body is still downloading (ijson); without
+        ijson the body is decoded whole. Returns None when the request fails.
+        A page read to the end is cached and replayed, as copies, until it
+        expires.
+        """
+        key = cache_key(endpoint, params, fields)
+        cached = self._cached(key)
+        if cached is not None:
+            return iter(cached)
+        
+        try:
+            response = self._get(endpoint, self._build_url(endpoint, params), timeout=timeout, stream=True)
+        except Exception as e:
+            self.logger.error(f"Request Exception: {e}")
+            return None
+        
+        if response.status_code != 200:
+            self.logger.error(f"HTTP Error: {response.status_code} - {response.text}")
+            return None
+        records = iter_json_results(response, fields if self.project_fields else None)
+        if self.metrics is not None:
+            records = self._timed_records(endpoint, records)
+        return self._cache_when_consumed(key, records) if self.cache.ttl else records
+    
+    def _cached(self, key: tuple) -> Any:
+        """
+        A copy of the cached response for key, or None
+        
+        Lookups only reach the metrics when caching is enabled.
+        """
+        if not self.cache.ttl:
+            return None
+        cached = self.cache.get(key)
+        self._metric('cache', cached is not None)
+        return copy.deepcopy(cached) if cached is not None else None
+    
+    def _cache_when_consumed(self, key: tuple, records: Iterator[Dict]) -> Iterator[Dict]:
+        """Pass records through, caching them only if the caller reads to the end of a complete body"""
+        seen = []
+        while True:
+            try:
+                record = next(records)
+            except StopIteration as stop:
+                # iter_json_results returns False when the body broke off or failed to parse
+                complete = stop.value is not False
+                break
+            seen.append(copy.deepcopy(record))
+            yield record
+        if complete:
+            self.cache.set(key, seen)
+    
+    def invalidate_cache(self, endpoint: Optional[str] = None) -> int:
+        """Drop cached responses (all, or one endpoint such as 'wifi/managed_ap/select')"""
+        self._topology_counts = None
+        return self.cache.invalidate(endpoint)
+    
+    def cache_stats(self) -> Dict:
+        """Cache hit/miss counters and size"""
+        return self.cache.stats()
+    
+    def _iter_results(self, endpoint: str, params: Dict = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      fields: Optional[tuple] = None) -> Iterator[Dict]:
+        """Walk a monitor collection with FortiOS start/count paging, parsing each page incrementally"""
+        def fetch_page(start: int, count: int) -> Optional[Iterator[Dict]]:
+            return self._stream_results(endpoint, {**(params or {}), 'start': start, 'count': count}, fields=fields)
+        
+        return iter_paged(fetch_page, page_size)
+    
+    def _retained_fields(self, fields: tuple) -> Optional[tuple]:
+        """
+        Fields to request for a collection whose objects may be retained
+        
+        With raw='ref' or 'full' the objects have to arrive whole so the raw
+        store can keep them; the getter then projects each one itself (_project).
+        """
+        return fields if self.raw_store.policy == 'none' else None
+    
+    def _project(self, payload: Any, fields: tuple) -> Any:
+        """The part of an API object a getter normalizes, whatever the raw policy"""
+        return project_record(payload, fields) if self.project_fields else payload
+    
+    def get_raw_payload(self, record_id: str, kind: Optional[str] = None) -> Optional[Dict]:
+        """
+        Return the source object behind a normalized record (raw='ref' only)
+        
+        None under the default raw='none', which keeps no payloads to save
+        memory and bandwidth; see __init__ for the trade-off.
+        """
+        return self.raw_store.get(record_id, kind)
+    
     def get_system_status(self) -> Dict:
         """Get FortiGate system status"""
         return self._make_request("system/status", {"vdom": "root"})
     
-    def get_fortiaps(self) -> List[Dict]:
-        """Get FortiAP access points with enhanced data"""
-        result = self._make_request("wifi/managed_ap/select", {"vdom": "root"})
+    def get_fortiaps(self, records: bool = False) -> List[Dict]:
+        """
+        Get FortiAP access points with enhanced data (FortiAPDetail records with records=True)
+        
+        Only the FORTIAP_FIELDS are downloaded unless raw is 'ref' or 'full',
+        which fetch and keep each full AP object as well.
+        """
+        result = self._make_request("wifi/managed_ap/select", {"vdom": "root"},
+                                    fields=self._retained_fields(self.FORTIAP_FIELDS))
         
         if 'error' not in result:
             aps = result.get('results', [])
             enhanced_aps = []
+            self.raw_store.reset('fortiap')
             
-            for ap in aps:
-                enhanced_ap = {
-                    'id': ap.get('serial', ap.get('name', 'unknown')),
-                    'name': ap.get('name', 'Unknown'),
-                    'serial': ap.get('serial', 'Unknown'),
-                    'model': ap.get('model', 'Unknown'),
-                    'ip': ap.get('ip', ap.get('connecting_from', '')),
-                    'status': ap.get('state', 'unknown'),
-                    'profile': ap.get('ap_profile', ''),
-                    'vdom': ap.get('vdom', 'root'),
-                    'is_local': ap.get('is_local', False),
-                    'radio_1': ap.get('radio_1', {}),
-                    'radio_2': ap.get('radio_2', {}),
-                    'wifi_clients': ap.get('wifi_clients', 0),
-                    'ethernet_mac': ap.get('ethernet_mac', ''),
-                    'last_seen': ap.get('last_seen', ''),
-                    'uptime': ap.get('uptime', 0),
-                    'cpu_usage': ap.get('cpu_usage', 0),
-                    'memory_usage': ap.get('memory_usage', 0),
-                    'temperature': ap.get('temperature', 0),
-                    'metadata': {
-                        'raw_data': ap
-                    }
-                }
+            for payload in aps:
+                ap = self._project(payload, self.FORTIAP_FIELDS)
+                ap_id = ap.get('serial', ap.get('name', 'unknown'))
+                enhanced_ap = FortiAPDetail(
+                    id=ap_id,
+                    name=ap.get('name', 'Unknown'),
+                    serial=ap.get('serial', 'Unknown'),
+                    model=ap.get('model', 'Unknown'),
+                    ip=ap.get('ip', ap.get('connecting_from', '')),
+                    status=ap.get('state', 'unknown'),
+                    profile=ap.get('ap_profile', ''),
+                    vdom=ap.get('vdom', 'root'),
+                    is_local=ap.get('is_local', False),
+                    radio_1=ap.get('radio_1', {}),
+                    radio_2=ap.get('radio_2', {}),
+                    wifi_clients=ap.get('wifi_clients', 0),
+                    ethernet_mac=ap.get('ethernet_mac', ''),
+                    last_seen=ap.get('last_seen', ''),
+                    uptime=ap.get('uptime', 0),
+                    cpu_usage=ap.get('cpu_usage', 0),
+                    memory_usage=ap.get('memory_usage', 0),
+                    temperature=ap.get('temperature', 0),
+                    metadata=self.raw_store.retain('fortiap', ap_id, payload)
+                )
                 enhanced_aps.append(enhanced_ap)
             
-            return enhanced_aps
+            return enhanced_aps if records else records_to_dicts(enhanced_aps)
         
         return []
     
-    def get_connected_devices(self) -> List[Dict]:
-        """Get connected user devices with enhanced information"""
-        result = self._make_request("user/device/query", {"vdom": "root"})
+    def iter_connected_devices(self, page_size: int = DEFAULT_PAGE_SIZE, records: bool = False) -> Iterator[Dict]:
+        """
+        Stream connected user devices page by page, normalized as each page arrives
         
-        if 'error' not in result:
-            devices = result.get('results', [])
-            enhanced_devices = []
-            
-            for device in devices:
-                enhanced_device = {
-                    'id': device.get('mac', 'unknown'),
-                    'name': device.get('hostname', device.get('name', 'Unknown')),
-                    'mac': device.get('mac', ''),
-                    'ip': device.get('ip', device.get('ipv4', '')),
-                    'type': 'endpoint',
-                    'user': device.get('user', 'Unknown'),
-                    'device_type': device.get('devtype', device.get('type', 'Unknown')),
-                    'os': device.get('os', 'Unknown'),
-                    'vdom': device.get('vdom', 'root'),
-                    'last_seen': device.get('last_seen', 0),
-                    'online': device.get('online', False),
-                    'auth_user': device.get('auth_user', ''),
-                    'auth_group': device.get('auth_group', ''),
-                    'interface': device.get('src_intf', ''),
-                    'traffic_stats': device.get('traffic_stats', {}),
-                    'metadata': {
-                        'raw_data': device
-                    }
-                }
-                enhanced_devices.append(enhanced_device)
-            
-            return enhanced_devices
-        
-        return []
+        Only the DEVICE_FIELDS are downloaded unless raw is 'ref' or 'full';
+        with 'ref' the full object of every device stays in raw_store, which
+        for a large device table can outweigh the records themselves.
+        """
+        self.raw_store.reset('device')
+        for device in self._iter_results("user/device/query", {"vdom": "root"}, page_size,
+                                         self._retained_fields(self.DEVICE_FIELDS)):
+            endpoint = self._normalize_device(device)
+            yield endpoint if records else endpoint.to_dict()
     
-    def get_interfaces(self) -> List[Dict]:
-        """Get network interfaces with status"""
-        result = self._make_request("system/interface", {"vdom": "root"})
+    def get_connected_devices(self, records: bool = False) -> List[Dict]:
+        """Get connected user devices with enhanced information (EndpointDetail records with records=True)"""
+        return list(self.iter_connected_devices(records=records))
+    
+    def _normalize_device(self, payload: Dict) -> EndpointDetail:
+        """Map a user/device/query record onto the dashboard endpoint shape"""
+        device = self._project(payload, self.DEVICE_FIELDS)
+        device_id = device.get('mac', 'unknown')
+        return EndpointDetail(
+            id=device_id,
+            name=device.get('hostname', device.get('name', 'Unknown')),
+            mac=device.get('mac', ''),
+            ip=device.get('ip', device.get('ipv4', '')),
+            user=device.get('user', 'Unknown'),
+            device_type=device.get('devtype', device.get('type', 'Unknown')),
+            os=device.get('os', 'Unknown'),
+            vdom=device.get('vdom', 'root'),
+            last_seen=device.get('last_seen', 0),
+            online=device.get('online', False),
+            auth_user=device.get('auth_user', ''),
+            auth_group=device.get('auth_group', ''),
+            interface=device.get('src_intf', ''),
+            traffic_stats=device.get('traffic_stats', {}),
+            metadata=self.raw_store.retain('device', device_id, payload)
+        )
+    
+    def get_interfaces(self, records: bool = False) -> List[Dict]:
+        """
+        Get network interfaces with status (InterfaceDetail records with records=True)
+        
+        Only the INTERFACE_FIELDS are downloaded unless raw is 'ref' or 'full',
+        which fetch and keep each full interface object as well.
+        """
+        result = self._make_request("system/interface", {"vdom": "root"},
+                                    fields=self._retained_fields(self.INTERFACE_FIELDS))
         
         if 'error' not in result:
             interfaces = result.get('results', [])
             enhanced_interfaces = []
+            self.raw_store.reset('interface')
             
-            for interface in interfaces:
+            for payload in interfaces:
                 # Handle case where interface might be a string
-                if isinstance(interface, str):
-                    interface = {'name': interface}
-                elif not isinstance(interface, dict):
-                    interface = {}
+                if isinstance(payload, str):
+                    payload = {'name': payload}
+                elif not isinstance(payload, dict):
+                    payload = {}
+                interface = self._project(payload, self.INTERFACE_FIELDS)
                 
-                enhanced_interface = {
-                    'id': f"interface_{interface.get('name', 'unknown')}",
-                    'name': interface.get('name', 'Unknown'),
-                    'type': 'interface',
-                    'ip': interface.get('ip', ''),
-                    'subnet': interface.get('subnet', ''),
-                    'status': interface.get('status', 'down'),
-                    'mtu': interface.get('mtu', 1500),
-                    'speed': interface.get('speed', 'auto'),
-                    'mac': interface.get('mac', ''),
-                    'alias': interface.get('alias', ''),
-                    'vdom': interface.get('vdom', 'root'),
-                    'role': interface.get('role', ''),
-                    'connected_to': 'fortigate_main',
-                    'metadata': {
-                        'raw_data': interface
-                    }
-                }
+                interface_id = f"interface_{interface.get('name', 'unknown')}"
+                enhanced_interface = InterfaceDetail(
+                    id=interface_id,
+                    name=interface.get('name', 'Unknown'),
+                    ip=interface.get('ip', ''),
+                    subnet=interface.get('subnet', ''),
+                    status=interface.get('status', 'down'),
+                    mtu=interface.get('mtu', 1500),
+                    speed=interface.get('speed', 'auto'),
+                    mac=interface.get('mac', ''),
+                    alias=interface.get('alias', ''),
+                    vdom=interface.get('vdom', 'root'),
+                    role=interface.get('role', ''),
+                    metadata=self.raw_store.retain('interface', interface_id, payload)
+                )
                 enhanced_interfaces.append(enhanced_interface)
             
-            return enhanced_interfaces
+            return enhanced_interfaces if records else records_to_dicts(enhanced_interfaces)
         
         return []
     
-    def get_complete_topology(self) -> Dict:
-        """Build complete network topology using discovered endpoints"""
+    def iter_switch_mac_table(self, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict]:
+        """Stream the MACs learned on each managed FortiSwitch port"""
+        return self._iter_results("switch-controller/detected-device", {"vdom": "root"}, page_size,
+                                  self.MAC_TABLE_FIELDS)
+    
+    def iter_arp_table(self, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict]:
+        """Stream the FortiGate ARP table"""
+        return self._iter_results("network/arp", {"vdom": "root"}, page_size, self.ARP_FIELDS)
+    
+    def iter_dhcp_leases(self, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict]:
+        """Stream DHCP leases"""
+        return self._iter_results("system/dhcp/lease", {"vdom": "root"}, page_size, self.DHCP_LEASE_FIELDS)
+    
+    def get_dhcp_leases(self) -> List[Dict]:
+        """Get DHCP leases (ip, mac, hostname, interface)"""
+        return list(self.iter_dhcp_leases())
+    
+    def get_physical_index(self, interfaces: Optional[List[InterfaceDetail]] = None) -> PhysicalIndex:
+        """
+        Join the switch MAC tables with ARP and DHCP leases (see babylon_3d/fortigate_common/correlation.py)
+        
+        interfaces (InterfaceDetail records, fetched when not given) supply the
+        FortiGate MACs that switches learn on their uplinks.
+        """
+        if interfaces is None:
+            interfaces = self.get_interfaces(records=True)
+        gateway_macs = {}
+        for interface in interfaces:
+            if interface.mac:
+                gateway_macs.setdefault(interface.mac, interface.id)
+        return PhysicalIndex(self.iter_switch_mac_table(), self.iter_arp_table(), self.iter_dhcp_leases(),
+                             gateway_macs=gateway_macs)
+    
+    @staticmethod
+    def _physical_switches(physical: PhysicalIndex) -> List[ManagedSwitch]:
+        """One ManagedSwitch record per switch in the MAC tables, linked to its upstream node"""
+        switches = []
+        for switch_id, mac_count in physical.switches.items():
+            uplink = physical.uplink(switch_id)
+            connected_to, uplink_port = FORTIGATE_ID, ''
+            if uplink is not None:
+                connected_to = f"switch_{uplink.parent}" if uplink.parent else uplink.gateway
+                uplink_port = uplink.port or ''
+            switches.append(ManagedSwitch(
+                id=f"switch_{switch_id}",
+                name=switch_id,
+                uplink_port=uplink_port,
+                mac_count=mac_count,
+                connected_to=connected_to
+            ))
+        return switches
+    
+    def get_complete_topology(self, records: bool = False) -> Dict:
+        """
+        Build complete network topology using discovered endpoints
+        
+        The fortiaps, switches, devices, interfaces and connections lists hold
+        plain dicts by default, or the compact records from fortigate_common.records
+        with records=True. Switches, and the switch ports FortiAPs and devices
+        are plugged into, come from the switch MAC tables joined with ARP and
+        DHCP; anything they cannot place links straight to the FortiGate.
+        """
         self.logger.info("Building complete network topology...")
         
         # Get all data
         system_status = self.get_system_status()
-        fortiaps = self.get_fortiaps()
-        devices = self.get_connected_devices()
-        interfaces = self.get_interfaces()
+        fortiaps = self.get_fortiaps(records=True)
+        devices = self.get_connected_devices(records=True)
+        interfaces = self.get_interfaces(records=True)
+        physical = self.get_physical_index(interfaces)
+        switches = self._physical_switches(physical)
         
         # Build topology
         topology = {
@@ -199,49 +490,87 @@ class EnhancedFortiGateClient:
                 'memory_usage': system_status.get('memory_usage', 0)
             },
             'fortiaps': fortiaps,
+            'switches': switches,
             'devices': devices,
             'interfaces': interfaces,
             'connections': [],
             'metadata': {
                 'last_updated': datetime.now().isoformat(),
-                'total_devices': len(fortiaps) + len(devices) + len(interfaces),
+                'total_devices': len(fortiaps) + len(switches) + len(devices) + len(interfaces),
                 'fortiaps_count': len(fortiaps),
+                'switches_count': len(switches),
                 'endpoints_count': len(devices),
                 'interfaces_count': len(interfaces),
-                'discovery_method': 'enhanced_fortigate_client'
+                'discovery_method': 'enhanced_fortigate_client',
+                'physical_links': physical.summary()
             }
         }
         
-        # Build connections
+        # Build connections: switch ports where the MAC tables place a device, else the FortiGate
+        connections = topology['connections']
         for ap in fortiaps:
-            topology['connections'].append({
-                'source': 'fortigate_main',
-                'target': ap['id'],
-                'type': 'wifi',
-                'bandwidth': 0
-            })
+            location = physical.locate(ap.ethernet_mac)
+            if location is not None:
+                connections.append(Link(f"switch_{location.switch}", ap.id, 'switch_port', 0, port=location.port))
+            else:
+                connections.append(Link(FORTIGATE_ID, ap.id, 'wifi', 0))
+        
+        for switch in switches:
+            uplink = physical.uplink(switch.name)
+            if uplink is not None and uplink.parent:
+                connections.append(Link(switch.connected_to, switch.id, 'uplink', 1000, port=uplink.parent_port))
+            elif uplink is not None:
+                connections.append(Link(switch.connected_to, switch.id, 'fortilink', 1000, port=uplink.port))
+            else:
+                connections.append(Link(FORTIGATE_ID, switch.id, 'network', 1000))
         
         for device in devices:
-            topology['connections'].append({
-                'source': 'fortigate_main',
-                'target': device['id'],
-                'type': 'endpoint',
-                'bandwidth': 100
-            })
+            if not device.ip:
+                device.ip = physical.host(device.mac).get('ip', '')
+            location = physical.locate(device.mac, device.ip)
+            if location is not None:
+                connections.append(Link(f"switch_{location.switch}", device.id, 'switch_port', 100, port=location.port))
+            else:
+                connections.append(Link(FORTIGATE_ID, device.id, 'endpoint', 100))
         
         for interface in interfaces:
-            topology['connections'].append({
-                'source': 'fortigate_main',
-                'target': interface['id'],
-                'type': 'network',
-                'bandwidth': interface.get('speed', 'auto')
-            })
+            topology['connections'].append(Link(FORTIGATE_ID, interface.id, 'network', interface.speed))
+        
+        if not records:
+            for key in ('fortiaps', 'switches', 'devices', 'interfaces', 'connections'):
+                topology[key] = records_to_dicts(topology[key])
+        
+        self._topology_counts = (time.monotonic(), {
+            'fortiaps_count': len(fortiaps),
+            'devices_count': len(devices),
+            'interfaces_count': len(interfaces)
+        })
         
         self.logger.info(f"Topology built: {topology['metadata']['total_devices']} total devices")
         return topology
     
-    def get_discovery_summary(self) -> Dict:
-        """Get summary of discovered capabilities"""
+    def _discovered_counts(self, max_age: Optional[float]) -> Dict:
+        """Counts from the last topology if it is younger than max_age, else from (cached) getters"""
+        max_age = self.cache.ttl if max_age is None else max_age
+        if self._topology_counts is not None:
+            taken_at, counts = self._topology_counts
+            if time.monotonic() - taken_at <= max_age:
+                return dict(counts)
+        
+        return {
+            'fortiaps_count': len(self.get_fortiaps(records=True)),
+            'devices_count': sum(1 for _ in self.iter_connected_devices(records=True)),
+            'interfaces_count': len(self.get_interfaces(records=True))
+        }
+    
+    def get_discovery_summary(self, max_age: Optional[float] = None) -> Dict:
+        """
+        Get summary of discovered capabilities
+        
+        Counts come from the most recent get_complete_topology when it is at
+        most max_age seconds old (default: the cache TTL); otherwise they are
+        fetched, through the response cache.
+        """
         return {
             'fortigate_info': {
                 'host': self.host,
@@ -254,11 +583,7 @@ class EnhancedFortiGateClient:
                 'interfaces': True,
                 'system_status': True
             },
-            'discovered_capabilities': {
-                'fortiaps_count': len(self.get_fortiaps()),
-                'devices_count': len(self.get_connected_devices()),
-                'interfaces_count': len(self.get_interfaces())
-            },
+            'discovered_capabilities': self._discovered_counts(max_age),
             'api_version': 'v7.6.4',
             'client_version': '1.0.0'
         }
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+FortiGate Response Cache
+Per-client TTL cache for parsed API responses, keyed by endpoint and params
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+def cache_key(endpoint: str, params: Optional[Dict] = None, *extra: Hashable) -> Tuple:
+    """Order-independent key for an endpoint + query params (+ anything else that shapes the result)"""
+    return (endpoint, tuple(sorted((params or {}).items())), *extra)
+
+
+class TTLCache:
+    """
+    Thread-safe TTL cache with explicit invalidation and hit/miss counters
+
+    A ttl of 0 disables caching: every lookup is a miss and nothing is stored.
+    """
+
+    def __init__(self, ttl: float = 30, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[Tuple, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if self._clock() < expires:
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Tuple, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+
+    def invalidate(self, endpoint: Optional[str] = None) -> int:
+        """Drop every entry, or only those for one endpoint; returns how many were dropped"""
+        with self._lock:
+            if endpoint is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            keys = [key for key in self._entries if key[0] == endpoint]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'ttl': self.ttl
+            }
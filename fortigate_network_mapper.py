@@ -12,11 +12,21 @@
 import requests
 import json
 import ssl
+import time
 import urllib3
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Sequence, Tuple, Optional
 from datetime import datetime
 import sys
 
+from api_replay import mount_transport
+from babylon_3d.fortigate_common.fields import project_results, projection_params
+from babylon_3d.fortigate_common.paging import DEFAULT_PAGE_SIZE, iter_paged
+from babylon_3d.fortigate_common.streaming import iter_json_results, require_complete
+from fortigate_raw_store import RawPayloadStore, validate_raw_policy
+from meraki_inventory import MerakiClientInventory
+from meraki_rate_limit import MERAKI_RATE_LIMIT, TokenBucket, next_page_url, retry_after_seconds
+
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -25,7 +35,22 @@ class FortiGateNetworkMapper:
     FortiGate Network Mapper - Collects connected endpoint information from Fortinet devices
     """
     
-    def __init__(self, fortigate_host: str, api_token: str, verify_ssl: bool = False):
+    # Fields kept from each collection (diagram context and Draw.io export);
+    # everything else is dropped as soon as a response is parsed
+    DEVICE_FIELDS = (
+        'hostname', 'mac', 'ipv4_address', 'hardware_type', 'hardware_vendor', 'hardware_family',
+        'os_name', 'os_version', 'detected_interface', 'is_online', 'last_seen', 'host_src'
+    )
+    SWITCH_FIELDS = (
+        'name', 'serial', 'switch-id', 'os_version', 'connecting_from', 'status', 'state', 'join_time'
+    )
+    AP_FIELDS = (
+        'name', 'serial', 'wtp_id', 'os_version', 'connecting_from', 'status', 'state', 'wtp_client', 'clients'
+    )
+    INTERFACE_FIELDS = ('name', 'ip', 'mac', 'state', 'link', 'speed', 'duplex')
+    LEASE_FIELDS = ('ip', 'mac', 'hostname', 'interface', 'vci', 'expire_time', 'status')
+    
+    def __init__(self, fortigate_host: str, api_token: str, verify_ssl: bool = False, transport=None):
         """
         Initialize FortiGate API connection
         
@@ -33,6 +58,7 @@ class FortiGateNetworkMapper:
             fortigate_host: IP address or FQDN of FortiGate (e.g., "192.168.1.1")
             api_token: REST API token generated in FortiGate GUI
             verify_ssl: Whether to verify SSL certificates (default: False for self-signed certs)
+            transport: Optional requests adapter all calls go through (e.g. api_replay.CassetteTransport)
         """
         self.host = fortigate_host
         self.api_token = api_token
@@ -40,6 +66,10 @@ class FortiGateNetworkMapper:
         self.base_url = f"https://{fortigate_host}"
         self.session = requests.Session()
         self.session.verify = verify_ssl
+        mount_transport(self.session, transport)
+        
+        # Full responses kept with raw='ref', keyed by API path
+        self.raw_store = RawPayloadStore('ref')
         
         # Set default headers
         self.headers = {
@@ -54,8 +84,9 @@ class FortiGateNetworkMapper:
         """Test API connectivity to FortiGate"""
         try:
             response = self.session.get(
-                f"{self.base_url}/api/v2/cmdb/system/interface?fields=name,ip,status",
+                f"{self.base_url}/api/v2/cmdb/system/interface",
                 headers=self.headers,
+                params=projection_params('cmdb/system/interface', ('name', 'ip', 'status')),
                 timeout=10
             )
             if response.status_code == 200:
@@ -69,7 +100,8 @@ class FortiGateNetworkMapper:
             print(f"✗ Connection error: {e}")
             return False
     
-    def get_connected_devices(self) -> Dict:
+    def get_connected_devices(self, timeout: float = 30, project: bool = True,
+                              raw: str = 'none') -> Dict:
         """
         Get all connected devices from FortiGate device inventory
         
@@ -82,18 +114,19 @@ class FortiGateNetworkMapper:
             response = self.session.get(
                 f"{self.base_url}/api/v2/monitor/user/device/query",
                 headers=self.headers,
-                timeout=30
+                timeout=timeout,
+                stream=raw == 'none'
             )
             
             if response.status_code == 200:
-                data = response.json()
-                devices = data.get('results', [])
+                devices, data = self._read_results(response, self.DEVICE_FIELDS if project else None, raw)
                 print(f"✓ Retrieved {len(devices)} devices")
-                return {
+                result = {
                     'total_devices': len(devices),
-                    'devices': devices,
-                    'raw_response': data
+                    'devices': devices
                 }
+                self._retain_raw(result, 'monitor/user/device/query', data, raw)
+                return result
             else:
                 print(f"✗ Error fetching devices: {response.status_code}")
                 print(f"  Response: {response.text}")
@@ -103,7 +136,8 @@ class FortiGateNetworkMapper:
             print(f"✗ Exception: {e}")
             return {'error': str(e), 'devices': []}
     
-    def get_fortiswitch_clients(self) -> Dict:
+    def get_fortiswitch_clients(self, timeout: float = 30, project: bool = True,
+                                raw: str = 'none') -> Dict:
         """
         Get connected clients on managed FortiSwitch devices
         
@@ -118,18 +152,19 @@ class FortiGateNetworkMapper:
             response = self.session.get(
                 f"{self.base_url}/api/v2/monitor/switch-controller/managed-switch/status",
                 headers=self.headers,
-                timeout=30
+                timeout=timeout,
+                stream=raw == 'none'
             )
             
             if response.status_code == 200:
-                data = response.json()
-                switches = data.get('results', [])
+                switches, data = self._read_results(response, self.SWITCH_FIELDS if project else None, raw)
                 print(f"✓ Retrieved {len(switches)} FortiSwitch devices")
-                return {
+                result = {
                     'total_switches': len(switches),
-                    'switches': switches,
-                    'raw_response': data
+                    'switches': switches
                 }
+                self._retain_raw(result, 'monitor/switch-controller/managed-switch/status', data, raw)
+                return result
             else:
                 print(f"✗ Error fetching FortiSwitch data: {response.status_code}")
                 return {'error': response.text, 'switches': []}
@@ -138,7 +173,8 @@ class FortiGateNetworkMapper:
             print(f"✗ Exception: {e}")
             return {'error': str(e), 'switches': []}
     
-    def get_fortiap_clients(self) -> Dict:
+    def get_fortiap_clients(self, timeout: float = 30, project: bool = True,
+                            raw: str = 'none') -> Dict:
         """
         Get connected clients on managed FortiAP wireless devices
         
@@ -151,18 +187,19 @@ class FortiGateNetworkMapper:
             response = self.session.get(
                 f"{self.base_url}/api/v2/monitor/wifi/managed_ap/status",
                 headers=self.headers,
-                timeout=30
+                timeout=timeout,
+                stream=raw == 'none'
             )
             
             if response.status_code == 200:
-                data = response.json()
-                aps = data.get('results', [])
+                aps, data = self._read_results(response, self.AP_FIELDS if project else None, raw)
                 print(f"✓ Retrieved {len(aps)} FortiAP devices")
-                return {
+                result = {
                     'total_aps': len(aps),
-                    'access_points': aps,
-                    'raw_response': data
+                    'access_points': aps
                 }
+                self._retain_raw(result, 'monitor/wifi/managed_ap/status', data, raw)
+                return result
             else:
                 print(f"✗ Error fetching FortiAP data: {response.status_code}")
                 return {'error': response.text, 'access_points': []}
@@ -171,7 +208,7 @@ class FortiGateNetworkMapper:
             print(f"✗ Exception: {e}")
             return {'error': str(e), 'access_points': []}
     
-    def get_endpoint_clients(self) -> Dict:
+    def get_endpoint_clients(self, timeout: float = 30, raw: str = 'none') -> Dict:
         """
         Get connected endpoint clients (FortiClient registered devices)
         
@@ -184,16 +221,15 @@ class FortiGateNetworkMapper:
             response = self.session.get(
                 f"{self.base_url}/api/v2/monitor/endpoint-control/registration/summary",
                 headers=self.headers,
-                timeout=30
+                timeout=timeout
             )
             
             if response.status_code == 200:
                 data = response.json()
                 print(f"✓ Retrieved endpoint registration summary")
-                return {
-                    'endpoints': data,
-                    'raw_response': data
-                }
+                result = {'endpoints': data}
+                self._retain_raw(result, 'monitor/endpoint-control/registration/summary', data, raw)
+                return result
             else:
                 print(f"✗ Error fetching endpoint data: {response.status_code}")
                 return {'error': response.text, 'endpoints': {}}
@@ -202,7 +238,8 @@ class FortiGateNetworkMapper:
             print(f"✗ Exception: {e}")
             return {'error': str(e), 'endpoints': {}}
     
-    def get_interface_status(self) -> Dict:
+    def get_interface_status(self, timeout: float = 30, project: bool = True,
+                             raw: str = 'none') -> Dict:
         """
         Get FortiGate interface status and statistics
         
@@ -215,18 +252,19 @@ class FortiGateNetworkMapper:
             response = self.session.get(
                 f"{self.base_url}/api/v2/monitor/interface/ethernet/status",
                 headers=self.headers,
-                timeout=30
+                timeout=timeout,
+                stream=raw == 'none'
             )
             
             if response.status_code == 200:
-                data = response.json()
-                interfaces = data.get('results', [])
+                interfaces, data = self._read_results(response, self.INTERFACE_FIELDS if project else None, raw)
                 print(f"✓ Retrieved {len(interfaces)} interfaces")
-                return {
+                result = {
                     'total_interfaces': len(interfaces),
-                    'interfaces': interfaces,
-                    'raw_response': data
+                    'interfaces': interfaces
                 }
+                self._retain_raw(result, 'monitor/interface/ethernet/status', data, raw)
+                return result
             else:
                 print(f"✗ Error fetching interface data: {response.status_code}")
                 return {'error': response.text, 'interfaces': []}
@@ -235,7 +273,8 @@ class FortiGateNetworkMapper:
             print(f"✗ Exception: {e}")
             return {'error': str(e), 'interfaces': []}
     
-    def get_dhcp_leases(self) -> Dict:
+    def get_dhcp_leases(self, timeout: float = 30, project: bool = True,
+                        raw: str = 'none') -> Dict:
         """
         Get DHCP lease information (connected clients via DHCP)
         
@@ -248,18 +287,19 @@ class FortiGateNetworkMapper:
             response = self.session.get(
                 f"{self.base_url}/api/v2/monitor/dhcp-server/leases",
                 headers=self.headers,
-                timeout=30
+                timeout=timeout,
+                stream=raw == 'none'
             )
             
             if response.status_code == 200:
-                data = response.json()
-                leases = data.get('results', [])
+                leases, data = self._read_results(response, self.LEASE_FIELDS if project else None, raw)
                 print(f"✓ Retrieved {len(leases)} DHCP leases")
-                return {
+                result = {
                     'total_leases': len(leases),
-                    'leases': leases,
-                    'raw_response': data
+                    'leases': leases
                 }
+                self._retain_raw(result, 'monitor/dhcp-server/leases', data, raw)
+                return result
             else:
                 print(f"✗ Error fetching DHCP leases: {response.status_code}")
                 return {'error': response.text, 'leases': []}
@@ -268,25 +308,133 @@ class FortiGateNetworkMapper:
             print(f"✗ Exception: {e}")
             return {'error': str(e), 'leases': []}
     
-    def collect_all_topology_data(self) -> Dict:
+    def iter_connected_devices(self, page_size: int = DEFAULT_PAGE_SIZE, timeout: float = 30,
+                               project: bool = True) -> Iterator[Dict]:
+        """
+        Stream the device inventory page by page instead of one large response
+        
+        API Endpoint: /api/v2/monitor/user/device/query (start/count paging)
+        Yields the same records as get_connected_devices()['devices'] while
+        holding at most one page in memory.
+        """
+        return self._iter_collection('monitor/user/device/query',
+                                     self.DEVICE_FIELDS if project else None, page_size, timeout)
+    
+    def iter_dhcp_leases(self, page_size: int = DEFAULT_PAGE_SIZE, timeout: float = 30,
+                         project: bool = True) -> Iterator[Dict]:
+        """
+        Stream DHCP leases page by page
+        
+        API Endpoint: /api/v2/monitor/dhcp-server/leases (start/count paging)
+        """
+        return self._iter_collection('monitor/dhcp-server/leases',
+                                     self.LEASE_FIELDS if project else None, page_size, timeout)
+    
+    def _iter_collection(self, path: str, fields: Optional[Sequence[str]], page_size: int,
+                         timeout: float) -> Iterator[Dict]:
+        """Walk a collection with FortiOS start/count paging, parsing each page incrementally"""
+        def fetch_page(start: int, count: int) -> Optional[Iterator[Dict]]:
+            try:
+                response = self.session.get(
+                    f"{self.base_url}/api/v2/{path}",
+                    headers=self.headers,
+                    params=projection_params(path, fields, {'start': start, 'count': count}),
+                    timeout=timeout,
+                    stream=True
+                )
+                if response.status_code != 200:
+                    print(f"✗ Error paging {path} at offset {start}: {response.status_code}")
+                    return None
+                return require_complete(iter_json_results(response, fields), path)
+            except Exception as e:
+                print(f"✗ Exception: {e}")
+                return None
+        
+        return iter_paged(fetch_page, page_size)
+    
+    def _read_results(self, response: requests.Response, fields: Optional[Sequence[str]],
+                      raw: str) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Parse the results list of a collection response
+        
+        With raw='none' the body (requested with stream=True) is parsed
+        incrementally and only the projected results survive; a body that
+        breaks off raises IncompleteResults, so the section reports an error
+        rather than a short list. Otherwise the full response is decoded and
+        returned next to the results.
+        """
+        if raw != 'none':
+            data = response.json()
+            data['results'] = project_results(data.get('results', []), fields)
+            return data['results'], data
+        return list(require_complete(iter_json_results(response, fields), response.url)), None
+    
+    def _retain_raw(self, result: Dict, path: str, data: Optional[Dict], raw: str) -> None:
+        """
+        Apply the raw retention policy to a section's full API response
+        
+        'full' embeds it as result['raw_response']; 'ref' files it in
+        self.raw_store under its API path and only records that key as
+        result['raw_ref']; 'none' drops it.
+        """
+        if raw == 'full':
+            result['raw_response'] = data
+        elif raw == 'ref':
+            result.update(self.raw_store.retain('response', path, data))
+    
+    def get_raw_payload(self, path: str) -> Optional[Dict]:
+        """Return the last full response kept for an API path with raw='ref'"""
+        return self.raw_store.get(path, 'response')
+    
+    # Topology sections: (section key, getter name, empty payload used as the error marker)
+    COLLECTION_SECTIONS = (
+        ('devices', 'get_connected_devices', {'devices': []}),
+        ('fortiswitch', 'get_fortiswitch_clients', {'switches': []}),
+        ('fortiap', 'get_fortiap_clients', {'access_points': []}),
+        ('endpoints', 'get_endpoint_clients', {'endpoints': {}}),
+        ('interfaces', 'get_interface_status', {'interfaces': []}),
+        ('dhcp_leases', 'get_dhcp_leases', {'leases': []}),
+    )
+    
+    def collect_all_topology_data(self, concurrent: bool = False, max_workers: int = 6,
+                                  endpoint_timeout: float = 30, raw: str = 'none') -> Dict:
         """
         Collect all network topology data from FortiGate
         
-        Returns comprehensive dictionary with all connected devices and clients
+        Args:
+            concurrent: Query all endpoints in parallel instead of one after another
+            max_workers: Size of the worker pool used in concurrent mode
+            endpoint_timeout: Per-endpoint deadline in seconds
+            raw: Retention of each section's full API response: 'none' drops it,
+                 'ref' keeps it in self.raw_store (see get_raw_payload), 'full'
+                 embeds it as 'raw_response'
+        
+        Returns comprehensive dictionary with all connected devices and clients.
+        A section that failed or missed its deadline carries an 'error' key next
+        to its empty payload; per-endpoint latency is reported in 'collection_stats'.
         """
+        validate_raw_policy(raw)
+        
         print("\n" + "="*60)
         print("FortiGate Network Topology Data Collection Started")
         print("="*60)
         
+        started = time.monotonic()
+        if concurrent:
+            sections, latency_ms = self._collect_sections_concurrently(max_workers, endpoint_timeout, raw)
+        else:
+            sections, latency_ms = self._collect_sections_sequentially(endpoint_timeout, raw)
+        
         topology_data = {
             'timestamp': datetime.now().isoformat(),
             'fortigate_host': self.host,
-            'devices': self.get_connected_devices(),
-            'fortiswitch': self.get_fortiswitch_clients(),
-            'fortiap': self.get_fortiap_clients(),
-            'endpoints': self.get_endpoint_clients(),
-            'interfaces': self.get_interface_status(),
-            'dhcp_leases': self.get_dhcp_leases()
+            **sections,
+            'collection_stats': {
+                'mode': 'concurrent' if concurrent else 'sequential',
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+                'latency_ms': latency_ms,
+                'failed_sections': [name for name, data in sections.items() if 'error' in data]
+            }
         }
         
         print("\n" + "="*60)
@@ -295,6 +443,60 @@ class FortiGateNetworkMapper:
         
         return topology_data
     
+    def _timed_call(self, getter_name: str, timeout: float, raw: str = 'none') -> Tuple[Dict, float]:
+        """Run one section getter and return its result with the latency in milliseconds"""
+        started = time.monotonic()
+        result = getattr(self, getter_name)(timeout=timeout, raw=raw)
+        return result, round((time.monotonic() - started) * 1000, 1)
+    
+    def _collect_sections_sequentially(self, endpoint_timeout: float, raw: str) -> Tuple[Dict, Dict]:
+        """Query each topology section one after another"""
+        sections, latency_ms = {}, {}
+        for section, getter_name, _ in self.COLLECTION_SECTIONS:
+            sections[section], latency_ms[section] = self._timed_call(getter_name, endpoint_timeout, raw)
+        return sections, latency_ms
+    
+    def _collect_sections_concurrently(self, max_workers: int, endpoint_timeout: float,
+                                       raw: str) -> Tuple[Dict, Dict]:
+        """
+        Query all topology sections over a bounded worker pool
+        
+        Every section gets endpoint_timeout seconds from the moment a worker picks it
+        up. Sections still running once the last possible deadline has passed are
+        reported as timed out and the collection returns with whatever completed.
+        """
+        sections, latency_ms = {}, {}
+        max_workers = max(1, min(max_workers, len(self.COLLECTION_SECTIONS)))
+        # With fewer workers than sections the later ones queue behind a full deadline
+        waves = -(-len(self.COLLECTION_SECTIONS) // max_workers)
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fgt-collect')
+        try:
+            futures = {
+                section: executor.submit(self._timed_call, getter_name, endpoint_timeout, raw)
+                for section, getter_name, _ in self.COLLECTION_SECTIONS
+            }
+            wait(futures.values(), timeout=endpoint_timeout * waves)
+            
+            for section, _, empty in self.COLLECTION_SECTIONS:
+                future = futures[section]
+                if not future.done():
+                    print(f"✗ {section}: no response within {endpoint_timeout}s")
+                    sections[section] = {'error': f'Timed out after {endpoint_timeout}s', 'timed_out': True, **empty}
+                    latency_ms[section] = None
+                    continue
+                try:
+                    sections[section], latency_ms[section] = future.result()
+                except Exception as e:
+                    print(f"✗ {section}: {e}")
+                    sections[section] = {'error': str(e), **empty}
+                    latency_ms[section] = None
+        finally:
+            # Do not block on stragglers; their requests time out on their own
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return sections, latency_ms
+    
     def export_to_json(self, data: Dict, filename: str = None) -> str:
         """Export topology data to JSON file for Draw.io MCP processing"""
         if filename is None:
@@ -395,35 +597,76 @@ class FortiGateNetworkMapper:
 class MerakiNetworkMapper:
     """
     Meraki API integration for access point and client endpoint information
+    
+    Every request goes through one TokenBucket so sequential and concurrent
+    collection both stay within the organization's rate limit; 429 responses
+    are retried after their Retry-After delay.
     """
     
-    def __init__(self, api_key: str, org_id: str):
+    # perPage maximums of the paginated Dashboard endpoints used here
+    NETWORKS_PAGE_SIZE = 100000
+    DEVICES_PAGE_SIZE = 1000
+    CLIENTS_PAGE_SIZE = 5000
+    
+    def __init__(self, api_key: str, org_id: str, rate_limit: float = MERAKI_RATE_LIMIT,
+                 max_retries: int = 5, metrics=None, transport=None):
         """
         Initialize Meraki Dashboard API connection
         
         Args:
             api_key: Meraki API key from Dashboard
             org_id: Organization ID from Meraki Dashboard
+            rate_limit: Requests per second allowed for this organization
+            max_retries: Attempts after a 429 before giving up on a request
+            metrics: Optional hook object; its retry(endpoint) is called for every retried request
+            transport: Optional requests adapter all calls go through (e.g. api_replay.CassetteTransport)
         """
         self.api_key = api_key
         self.org_id = org_id
         self.base_url = "https://api.meraki.com/api/v1"
         self.session = requests.Session()
+        mount_transport(self.session, transport)
         self.headers = {
             "X-Cisco-Meraki-API-Key": api_key,
             "Content-Type": "application/json"
         }
+        self.rate_limiter = TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        self.metrics = metrics
         
         self.test_connection()
     
+    def _get(self, url: str, params: Dict = None, timeout: float = 30) -> requests.Response:
+        """GET under the organization rate limit, retrying 429s after Retry-After"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = self.session.get(url, headers=self.headers, params=params, timeout=timeout)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            delay = retry_after_seconds(response, attempt)
+            print(f"  Rate limited by Meraki, retrying in {delay:.1f}s")
+            if self.metrics is not None:
+                self.metrics.retry(url.split('?')[0][len(self.base_url):].strip('/'))
+            self.rate_limiter.pause(delay)
+        return response
+    
+    def _get_all_pages(self, path: str, params: Dict = None, timeout: float = 30) -> Optional[List[Dict]]:
+        """GET a collection, following Link rel=next pages; None if any page fails"""
+        url, results = f"{self.base_url}/{path}", []
+        while url:
+            response = self._get(url, params, timeout)
+            if response.status_code != 200:
+                print(f"✗ Error fetching {path}: {response.status_code}")
+                return None
+            results.extend(response.json())
+            # The next link already carries every query parameter
+            url, params = next_page_url(response), None
+        return results
+    
     def test_connection(self) -> bool:
         """Test API connectivity to Meraki"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/organizations/{self.org_id}",
-                headers=self.headers,
-                timeout=10
-            )
+            response = self._get(f"{self.base_url}/organizations/{self.org_id}", timeout=10)
             if response.status_code == 200:
                 org_name = response.json().get('name', 'Unknown')
                 print(f"✓ Successfully connected to Meraki organization: {org_name}")
@@ -439,19 +682,12 @@ class MerakiNetworkMapper:
         """Get all networks in organization"""
         try:
             print("\n[*] Fetching Meraki networks...")
-            response = self.session.get(
-                f"{self.base_url}/organizations/{self.org_id}/networks",
-                headers=self.headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                networks = response.json()
-                print(f"✓ Retrieved {len(networks)} networks")
-                return networks
-            else:
-                print(f"✗ Error: {response.status_code}")
+            networks = self._get_all_pages(f"organizations/{self.org_id}/networks",
+                                           {"perPage": self.NETWORKS_PAGE_SIZE})
+            if networks is None:
                 return []
+            print(f"✓ Retrieved {len(networks)} networks")
+            return networks
         except Exception as e:
             print(f"✗ Exception: {e}")
             return []
@@ -459,11 +695,7 @@ class MerakiNetworkMapper:
     def get_network_devices(self, network_id: str) -> List[Dict]:
         """Get devices in a network"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/organizations/{self.org_id}/networks/{network_id}/devices",
-                headers=self.headers,
-                timeout=30
-            )
+            response = self._get(f"{self.base_url}/networks/{network_id}/devices")
             
             if response.status_code == 200:
                 return response.json()
@@ -473,6 +705,36 @@ class MerakiNetworkMapper:
             print(f"✗ Exception getting network devices: {e}")
             return []
     
+    def get_organization_devices(self) -> Optional[List[Dict]]:
+        """
+        Get every device in the organization in one paginated crawl
+        
+        API Endpoint: /organizations/{orgId}/devices
+        Returns None when the endpoint is unavailable so callers can fall back
+        to per-network device lists.
+        """
+        try:
+            return self._get_all_pages(f"organizations/{self.org_id}/devices",
+                                       {"perPage": self.DEVICES_PAGE_SIZE})
+        except Exception as e:
+            print(f"✗ Exception getting organization devices: {e}")
+            return None
+    
+    def get_network_clients(self, network_id: str, timespan: int = 2592000) -> Optional[List[Dict]]:
+        """
+        Get all clients of a network in one paginated crawl
+        
+        API Endpoint: /networks/{networkId}/clients
+        Each client names the device it was last seen on (recentDeviceSerial).
+        Returns None on failure so callers can fall back to per-device calls.
+        """
+        try:
+            return self._get_all_pages(f"networks/{network_id}/clients",
+                                       {"timespan": timespan, "perPage": self.CLIENTS_PAGE_SIZE})
+        except Exception as e:
+            print(f"✗ Exception getting network clients: {e}")
+            return None
+    
     def get_device_clients(self, device_serial: str, timespan: int = 2592000) -> List[Dict]:
         """
         Get clients connected to a specific device (AP, Switch, etc)
@@ -483,28 +745,91 @@ class MerakiNetworkMapper:
             device_serial: Device serial number
             timespan: Time range in seconds (default: 30 days)
         """
+        return self._fetch_device_clients(device_serial, timespan) or []
+    
+    def _fetch_device_clients(self, device_serial: str, timespan: int) -> Optional[List[Dict]]:
+        """/devices/{serial}/clients, or None when the request failed"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/devices/{device_serial}/clients",
-                headers=self.headers,
-                params={"timespan": timespan},
-                timeout=30
-            )
+            response = self._get(f"{self.base_url}/devices/{device_serial}/clients",
+                                 params={"timespan": timespan})
             
             if response.status_code == 200:
                 return response.json()
             else:
-                return []
+                return None
         except Exception as e:
             print(f"✗ Exception: {e}")
-            return []
+            return None
+    
+    def sync_clients(self, inventory: Optional[MerakiClientInventory] = None, max_workers: int = 8,
+                     now: Optional[float] = None) -> Dict:
+        """
+        Incrementally sync every device's clients into a local inventory
+        
+        Each device is asked only for the window since its watermark (30 days
+        on the first sync); the clients returned are upserted and the
+        watermark advances only when the request succeeded. The inventory is
+        saved once the sync finishes.
+        
+        Returns sync statistics; the merged clients are in the inventory.
+        """
+        inventory = inventory if inventory is not None else MerakiClientInventory()
+        started = time.monotonic()
+        now = time.time() if now is None else now
+        
+        devices = self.get_organization_devices()
+        if devices is None:
+            devices = [device for network in self.get_networks() for device in self.get_network_devices(network['id'])]
+        serials = [device['serial'] for device in devices]
+        
+        stats = {'devices': len(serials), 'devices_failed': [], 'clients_received': 0, 'clients_added': 0}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='meraki-sync') as executor:
+            futures = {
+                serial: executor.submit(self._fetch_device_clients, serial, inventory.timespan_for(serial, now))
+                for serial in serials
+            }
+            for serial, future in futures.items():
+                clients = future.result()
+                if clients is None:
+                    stats['devices_failed'].append(serial)
+                    continue
+                stats['clients_received'] += len(clients)
+                stats['clients_added'] += inventory.upsert(serial, clients, now)
+        
+        inventory.save()
+        stats['inventory_size'] = len(inventory)
+        stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        print(f"✓ Synced {len(serials) - len(stats['devices_failed'])}/{len(serials)} devices, "
+              f"{stats['clients_received']} client records ({stats['clients_added']} new)")
+        return stats
+    
+    @staticmethod
+    def _device_info(device: Dict, clients: List[Dict]) -> Dict:
+        return {
+            'serial': device['serial'],
+            'name': device.get('name', ''),
+            'device_type': device.get('type', device.get('productType', '')),
+            'address': device.get('address', ''),
+            'ip': device.get('ip', device.get('lanIp', '')),
+            'clients': clients
+        }
     
-    def collect_all_meraki_data(self) -> Dict:
-        """Collect all Meraki topology data"""
+    def collect_all_meraki_data(self, concurrent: bool = False, max_workers: int = 8,
+                                timespan: int = 2592000) -> Dict:
+        """
+        Collect all Meraki topology data
+        
+        Args:
+            concurrent: Use org-wide bulk endpoints and a worker pool instead of
+                        one request per network and per device in sequence
+            max_workers: Size of the worker pool used in concurrent mode
+            timespan: Client lookback window in seconds (default: 30 days)
+        """
         print("\n" + "="*60)
         print("Meraki Network Topology Data Collection Started")
         print("="*60)
         
+        started = time.monotonic()
         networks = self.get_networks()
         meraki_data = {
             'timestamp': datetime.now().isoformat(),
@@ -512,32 +837,83 @@ class MerakiNetworkMapper:
             'networks': []
         }
         
-        for network in networks:
-            network_info = {
-                'network_id': network['id'],
-                'network_name': network['name'],
-                'devices': []
-            }
-            
-            devices = self.get_network_devices(network['id'])
-            for device in devices:
-                device_info = {
-                    'serial': device['serial'],
-                    'name': device['name'],
-                    'device_type': device['type'],
-                    'address': device.get('address', ''),
-                    'ip': device.get('ip', ''),
-                    'clients': self.get_device_clients(device['serial'])
-                }
-                network_info['devices'].append(device_info)
-            
-            meraki_data['networks'].append(network_info)
+        if concurrent:
+            meraki_data['networks'] = self._collect_networks_concurrently(networks, max_workers, timespan)
+        else:
+            for network in networks:
+                devices = self.get_network_devices(network['id'])
+                meraki_data['networks'].append({
+                    'network_id': network['id'],
+                    'network_name': network['name'],
+                    'devices': [
+                        self._device_info(device, self.get_device_clients(device['serial'], timespan))
+                        for device in devices
+                    ]
+                })
+        
+        meraki_data['collection_stats'] = {
+            'mode': 'concurrent' if concurrent else 'sequential',
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        }
         
         print("="*60)
         print("Meraki Data Collection Complete")
         print("="*60)
         
         return meraki_data
+    
+    def _collect_networks_concurrently(self, networks: List[Dict], max_workers: int,
+                                       timespan: int) -> List[Dict]:
+        """
+        Crawl devices and clients with bulk endpoints over a bounded worker pool
+        
+        Devices come from one org-wide listing and clients from one listing per
+        network, attributed to devices by recentDeviceSerial. Networks whose
+        client listing fails fall back to per-device calls.
+        """
+        org_devices = self.get_organization_devices()
+        devices_by_network: Dict[str, List[Dict]] = {}
+        for device in org_devices or []:
+            devices_by_network.setdefault(device.get('networkId'), []).append(device)
+        
+        clients_by_serial: Dict[str, List[Dict]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='meraki-collect') as executor:
+            if org_devices is None:
+                device_futures = {
+                    network['id']: executor.submit(self.get_network_devices, network['id']) for network in networks
+                }
+                devices_by_network = {network_id: future.result() for network_id, future in device_futures.items()}
+            
+            client_futures = {
+                network['id']: executor.submit(self.get_network_clients, network['id'], timespan)
+                for network in networks if devices_by_network.get(network['id'])
+            }
+            fallback_serials = []
+            for network_id, future in client_futures.items():
+                clients = future.result()
+                if clients is None:
+                    fallback_serials.extend(device['serial'] for device in devices_by_network[network_id])
+                    continue
+                for client in clients:
+                    clients_by_serial.setdefault(client.get('recentDeviceSerial'), []).append(client)
+            
+            device_futures = {
+                serial: executor.submit(self.get_device_clients, serial, timespan) for serial in fallback_serials
+            }
+            for serial, future in device_futures.items():
+                clients_by_serial[serial] = future.result()
+        
+        return [
+            {
+                'network_id': network['id'],
+                'network_name': network['name'],
+                'devices': [
+                    self._device_info(device, clients_by_serial.get(device['serial'], []))
+                    for device in devices_by_network.get(network['id'], [])
+                ]
+            }
+            for network in networks
+        ]
 
 
 def main():
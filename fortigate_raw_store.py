@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+FortiGate Raw Payload Store
+Keep raw API payloads out of normalized records and hand them out on demand
+
+Retention policies:
+    'none' - raw payloads are dropped once a record has been normalized
+    'ref'  - the latest payload per record id is kept in this side store and
+             the record only carries its id under metadata['raw_ref']
+    'full' - the payload is embedded in the record (metadata['raw_data']),
+             the original behaviour; every snapshot then holds its own copy
+"""
+
+from typing import Any, Dict, Optional
+
+RAW_POLICIES = ('none', 'ref', 'full')
+
+
+def validate_raw_policy(policy: str) -> str:
+    """Return policy unchanged, or raise ValueError for an unknown one"""
+    if policy not in RAW_POLICIES:
+        raise ValueError(f"raw must be one of {', '.join(RAW_POLICIES)}, got {policy!r}")
+    return policy
+
+
+class RawPayloadStore:
+    """Side store for raw API payloads, grouped by kind and keyed by record id"""
+
+    def __init__(self, policy: str = 'ref'):
+        self.policy = validate_raw_policy(policy)
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+
+    def reset(self, kind: str) -> None:
+        """Forget every payload of one kind, before it is collected again"""
+        self._payloads.pop(kind, None)
+
+    def retain(self, kind: str, record_id: str, payload: Any) -> Dict:
+        """
+        Apply the retention policy to one payload
+
+        Returns the metadata to embed in the normalized record: empty for
+        'none', {'raw_ref': record_id} for 'ref', {'raw_data': payload} for 'full'.
+        """
+        if self.policy == 'none':
+            return {}
+        if self.policy == 'full':
+            return {'raw_data': payload}
+        self._payloads.setdefault(kind, {})[record_id] = payload
+        return {'raw_ref': record_id}
+
+    def get(self, record_id: str, kind: Optional[str] = None) -> Optional[Any]:
+        """Return the stored payload for record_id (optionally within one kind)"""
+        if kind is not None:
+            return self._payloads.get(kind, {}).get(record_id)
+        for payloads in self._payloads.values():
+            if record_id in payloads:
+                return payloads[record_id]
+        return None
+
+    def clear(self) -> None:
+        self._payloads.clear()
+
+    def __len__(self) -> int:
+        return sum(len(payloads) for payloads in self._payloads.values())
+
+    def __contains__(self, record_id: str) -> bool:
+        return any(record_id in payloads for payloads in self._payloads.values())
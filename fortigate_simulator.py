@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+FortiGate REST Simulator
+Local aiohttp stand-in for a FortiGate, serving a synthetic fleet for offline load tests
+
+Serves the monitor and CMDB routes the dashboard clients use (system status,
+interfaces, managed switches, FortiAPs, user devices, DHCP leases and
+servers, firewall addresses, switch MAC tables, ARP, ...) with
+FortiOS start/count paging, format= projection on CMDB tables, tunable
+latency and injected errors. Records are derived from their index and a seed,
+so fleets of any size (500 switches, 2,000 APs, 200k endpoints) cost no memory
+up front and the same seed always serves the same data. advance() moves the
+fleet to its next generation, flipping the status of a few devices, for
+change-feed and diff benchmarks.
+
+Usage:
+    python fortigate_simulator.py --switches 500 --aps 2000 --endpoints 200000 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from aiohttp import web
+
+from babylon_3d.fortigate_common.fields import project_record
+
+DEFAULT_MAX_PAGE_SIZE = 1000
+SERIAL_PREFIX = 'FGT61F'
+FIRMWARE = 'v7.6.4'
+BUILD = 3596
+
+VENDORS = ('Apple', 'Dell', 'HP', 'Lenovo', 'Samsung', 'Cisco', 'Intel', 'Microsoft')
+OS_NAMES = ('macOS', 'Windows', 'iOS', 'Android', 'Linux', 'ChromeOS')
+DEVICE_TYPES = ('Laptop', 'Phone', 'Tablet', 'Printer', 'Server', 'IP Phone', 'Camera')
+SWITCH_MODELS = ('FS-124F-POE', 'FS-148F-FPOE', 'FS-248E-FPOE', 'FS-424E-FPOE')
+AP_MODELS = ('FP231F', 'FP431F', 'FP233G', 'FP441K')
+
+
+def _mix(*values: int) -> int:
+    """Cheap deterministic 64-bit hash of a few integers (splitmix64 finalizer)"""
+    x = 0x9E3779B97F4A7C15
+    for value in values:
+        x = (x ^ (value & 0xFFFFFFFFFFFFFFFF)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+        x = (x ^ (x >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 31
+    return x
+
+
+def _mac(prefix: int, index: int) -> str:
+    """Locally administered MAC address unique per (prefix, index)"""
+    octets = [0x02, prefix & 0xFF, (index >> 24) & 0xFF, (index >> 16) & 0xFF, (index >> 8) & 0xFF, index & 0xFF]
+    return ':'.join(f'{octet:02x}' for octet in octets)
+
+
+def _ip(second: int, index: int) -> str:
+    """Host index within 10.<second>.0.0/16"""
+    return f'10.{second}.{(index >> 8) & 0xFF}.{index & 0xFF}'
+
+
+# FortiLink (switches and APs) lives in 10.254.0.0/16; VLAN n in 10.(100 + n).0.0/16
+FORTILINK_NET = 254
+# wan1 and fortilink have their own MACs; the VLANs on fortilink share its MAC
+FORTILINK_MAC = _mac(0xF0, 1)
+
+
+class SyntheticFleet:
+    """
+    A reproducible fleet of switches, FortiAPs, interfaces and endpoints
+
+    Every record is computed on demand from its index, the seed and the
+    current generation. offline_ratio is the share of devices reported
+    offline in any one generation; churn is the share whose state is redrawn
+    on each advance().
+    """
+
+    def __init__(self, switches: int = 8, aps: int = 40, endpoints: int = 500, interfaces: int = 12,
+                 seed: int = 0, offline_ratio: float = 0.05, wireless_ratio: float = 0.6, churn: float = 0.01):
+        self.switches = switches
+        self.aps = aps
+        self.endpoints = endpoints
+        self.interfaces = interfaces
+        self.seed = seed
+        self.offline_ratio = offline_ratio
+        self.wireless_ratio = wireless_ratio
+        self.churn = churn
+        self.generation = 0
+
+    def advance(self) -> int:
+        """Move to the next generation; returns its number"""
+        self.generation += 1
+        return self.generation
+
+    def _roll(self, kind: int, index: int) -> float:
+        """
+        Uniform [0, 1) draw for a record, redrawn for a churn share of records each generation
+
+        Each record is redrawn every 1/churn generations at its own offset, so
+        the draw for any generation is O(1).
+        """
+        epoch = 0
+        if self.churn > 0:
+            period = max(int(round(1 / self.churn)), 1)
+            epoch = (self.generation + _mix(self.seed, kind, index, 1) % period) // period
+        return _mix(self.seed, kind, index, epoch) % 10000 / 10000
+
+    def _online(self, kind: int, index: int) -> bool:
+        return self._roll(kind, index) >= self.offline_ratio
+
+    @property
+    def _wireless_per_hundred(self) -> int:
+        """Endpoints i with i % 100 below this are wireless"""
+        return min(math.ceil(self.wireless_ratio * 100), 100) if self.aps > 0 else 0
+
+    @property
+    def wired_endpoints(self) -> int:
+        if not self.switches:
+            return 0
+        wireless = self._wireless_per_hundred
+        return self.endpoints // 100 * (100 - wireless) + max(self.endpoints % 100 - wireless, 0)
+
+    def _wired_endpoint(self, j: int) -> int:
+        """Index of the j-th wired endpoint"""
+        wireless = self._wireless_per_hundred
+        return j // (100 - wireless) * 100 + wireless + j % (100 - wireless)
+
+    def _ports(self, i: int) -> int:
+        return 48 if i % 2 else 24
+
+    # Records
+
+    def switch(self, i: int) -> Dict:
+        online = self._online(1, i)
+        name = f'SW{i:04d}'
+        return {
+            'name': name,
+            'switch-id': name,
+            'serial': f'S248EF{i:010d}',
+            'model': SWITCH_MODELS[i % len(SWITCH_MODELS)],
+            'ip': _ip(FORTILINK_NET, i + 2),
+            'connecting_from': _ip(FORTILINK_NET, i + 2),
+            'status': 'online' if online else 'offline',
+            'state': 'Authorized',
+            'num_ports': self._ports(i),
+            'sw_version': f'{SWITCH_MODELS[i % len(SWITCH_MODELS)]}-v7.4.3-build0{800 + i % 50}',
+            'os_version': 'v7.4.3',
+            'fgt_peer_intf_name': 'fortilink',
+            'join_time': 1700000000 + i
+        }
+
+    def ap(self, i: int) -> Dict:
+        online = self._online(2, i)
+        clients = 0 if not online else _mix(self.seed, 2, i, self.generation) % 40
+        name = f'AP{i:05d}'
+        return {
+            'name': name,
+            'wtp_id': name,
+            'serial': f'FP231F{i:010d}',
+            'model': AP_MODELS[i % len(AP_MODELS)],
+            'os_version': f'{AP_MODELS[i % len(AP_MODELS)]}-v7.6.3-build1032',
+            'ip': _ip(FORTILINK_NET, self.switches + i + 2),
+            'connecting_from': _ip(FORTILINK_NET, self.switches + i + 2),
+            'status': 'online' if online else 'offline',
+            'state': 'authorized',
+            'is_local': True,
+            'ap_profile': 'default-profile',
+            'ethernet_mac': _mac(0xA0, i),
+            'board_mac': _mac(0xA0, i),
+            'switch_id': f'SW{i % self.switches:04d}' if self.switches else '',
+            'wifi_clients': clients,
+            'clients': clients,
+            'radio_1': {'radio_id': 1, 'band': '802.11ax-2G', 'channel': 1 + 5 * (i % 3), 'max_bandwidth': 573},
+            'radio_2': {'radio_id': 2, 'band': '802.11ax-5G', 'channel': 36 + 4 * (i % 8), 'max_bandwidth': 2402},
+            'cpu_usage': i % 30,
+            'memory_usage': 20 + i % 50,
+            'temperature': 35 + i % 20,
+            'uptime': 86400 + i * 37,
+            'last_seen': 1700000000 + i
+        }
+
+    def interface(self, i: int) -> Dict:
+        name = 'wan1' if i == 0 else ('fortilink' if i == 1 else f'vlan{i * 10}')
+        ip = '203.0.113.2 255.255.255.0' if i == 0 else (
+            f'10.{FORTILINK_NET}.0.1 255.255.0.0' if i == 1 else f'10.{100 + i}.0.1 255.255.0.0')
+        mac = _mac(0xF0, 0) if i == 0 else FORTILINK_MAC
+        return {
+            'name': name,
+            'vdom': 'root',
+            'type': 'physical' if i < 2 else 'vlan',
+            'ip': ip,
+            'status': 'up',
+            'mtu': 1500,
+            'speed': 1000,
+            'macaddr': mac,
+            'mac': mac,
+            'role': 'wan' if i == 0 else 'lan',
+            'alias': '',
+            'vlanid': 0 if i < 2 else i * 10
+        }
+
+    def endpoint(self, i: int) -> Dict:
+        online = self._online(3, i)
+        wireless = i % 100 < self._wireless_per_hundred
+        # Spread endpoints over the VLAN interfaces, addressed inside their subnets
+        vlans = max(self.interfaces - 2, 1)
+        vlan = 2 + i % vlans
+        ip = _ip(100 + vlan, i // vlans + 10)
+        record = {
+            'mac': _mac(0x10, i),
+            'ipv4_address': ip,
+            'ip': ip,
+            'hostname': f'host-{i:06d}',
+            'hardware_vendor': VENDORS[i % len(VENDORS)],
+            'hardware_type': DEVICE_TYPES[i % len(DEVICE_TYPES)],
+            'devtype': DEVICE_TYPES[i % len(DEVICE_TYPES)],
+            'os_name': OS_NAMES[i % len(OS_NAMES)],
+            'os_type': OS_NAMES[i % len(OS_NAMES)],
+            'user': f'user{i % 5000:04d}' if i % 3 else '',
+            'detected_interface': f'vlan{vlan * 10}',
+            'is_online': online,
+            'online': online,
+            'last_seen': 1700000000 + i % 86400,
+        }
+        if wireless:
+            ap = i % self.aps
+            record.update({'fortiap_id': f'FP231F{ap:010d}', 'fortiap_name': f'AP{ap:05d}', 'fortiap_ssid': 'CORP'})
+        elif self.switches:
+            switch = i % self.switches
+            record.update({'fortiswitch_id': f'S248EF{switch:010d}', 'fortiswitch_port_name': f'port{1 + i % 24}'})
+        return record
+
+    def dhcp_lease(self, i: int) -> Dict:
+        endpoint = self.endpoint(i)
+        return {
+            'ip': endpoint['ipv4_address'],
+            'mac': endpoint['mac'],
+            'hostname': endpoint['hostname'],
+            'interface': endpoint['detected_interface'],
+            'status': 'leased',
+            'expire_time': 1700086400 + i % 86400
+        }
+
+    def dhcp_server(self, i: int) -> Dict:
+        """The DHCP server of VLAN interface i + 2, leasing most of its /16"""
+        net = 102 + i
+        return {
+            'id': i + 1,
+            'status': 'enable',
+            'interface': self.interface(i + 2)['name'],
+            'default-gateway': f'10.{net}.0.1',
+            'netmask': '255.255.0.0',
+            'ip-range': [{'id': 1, 'start-ip': f'10.{net}.0.10', 'end-ip': f'10.{net}.255.254'}]
+        }
+
+    def address(self, i: int) -> Dict:
+        """'all', then a server /24 per VLAN interface, not tied to an interface"""
+        if i == 0:
+            return {'name': 'all', 'type': 'ipmask', 'subnet': '0.0.0.0 0.0.0.0', 'associated-interface': ''}
+        return {
+            'name': f"{self.interface(i + 1)['name']}-servers",
+            'type': 'ipmask',
+            'subnet': f'10.{101 + i}.0.0 255.255.255.0',
+            'associated-interface': ''
+        }
+
+    def mac_table_entry(self, i: int) -> Dict:
+        """
+        One MAC learned on a switch port (switch-controller/detected-device)
+
+        Every switch learns the FortiGate on its uplink, every AP sits on a
+        port of its own, and wired endpoints on the ports they report.
+        Wireless clients are tunnelled to the FortiGate and never appear.
+        """
+        aps = self.aps if self.switches else 0
+        if i < self.switches:
+            switch, port, mac, vlan = i, f'port{self._ports(i) + 1}', FORTILINK_MAC, 4094
+        elif i < self.switches + aps:
+            ap = i - self.switches
+            switch = ap % self.switches
+            port = f'port{self._ports(switch) + 2 + ap // self.switches}'
+            mac, vlan = _mac(0xA0, ap), 4094
+        else:
+            endpoint = self.endpoint(self._wired_endpoint(i - self.switches - aps))
+            switch = int(endpoint['fortiswitch_id'][len('S248EF'):])
+            port, mac = endpoint['fortiswitch_port_name'], endpoint['mac']
+            vlan = int(endpoint['detected_interface'][len('vlan'):])
+        return {
+            'mac': mac,
+            'switch_id': f'S248EF{switch:010d}',
+            'port_name': port,
+            'vlan_id': vlan,
+            'last_seen': 1700000000 + i % 86400
+        }
+
+    def arp_entry(self, i: int) -> Dict:
+        endpoint = self.endpoint(i)
+        return {
+            'ip': endpoint['ipv4_address'],
+            'mac': endpoint['mac'],
+            'interface': endpoint['detected_interface'],
+            'age': i % 1200
+        }
+
+    def collection(self, name: str):
+        """(count, record function) for a named collection"""
+        return {
+            'switches': (self.switches, self.switch),
+            'aps': (self.aps, self.ap),
+            'interfaces': (self.interfaces, self.interface),
+            'endpoints': (self.endpoints, self.endpoint),
+            'dhcp_leases': (self.endpoints, self.dhcp_lease),
+            'dhcp_servers': (max(self.interfaces - 2, 0), self.dhcp_server),
+            'addresses': (1 + max(self.interfaces - 2, 0), self.address),
+            'mac_table': (self.switches + (self.aps if self.switches else 0) + self.wired_endpoints,
+                          self.mac_table_entry),
+            'arp': (self.endpoints, self.arp_entry),
+        }[name]
+
+
+class FortiGateSimulator:
+    """
+    aiohttp application serving a SyntheticFleet like a FortiGate would
+
+    latency (+ up to jitter) seconds are added to every request; error_rate is
+    the probability a request fails with error_status. Pages hold at most
+    max_page_size records. api_token, if set, is required as a Bearer token.
+    """
+
+    def __init__(self, fleet: Optional[SyntheticFleet] = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500, max_page_size: int = DEFAULT_MAX_PAGE_SIZE,
+                 api_token: Optional[str] = None, seed: int = 0, hostname: str = 'FG-SIM'):
+        self.fleet = fleet or SyntheticFleet(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_page_size = max_page_size
+        self.api_token = api_token
+        self.hostname = hostname
+        self._random = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+        self.errors = 0
+        self.started = time.time()
+
+    def routes(self) -> Dict[str, Callable]:
+        collections = {
+            'cmdb/system/interface': 'interfaces',
+            'monitor/system/interface': 'interfaces',
+            'cmdb/switch-controller/managed-switch': 'switches',
+            'monitor/switch-controller/managed-switch/status': 'switches',
+            'monitor/wifi/managed_ap/select': 'aps',
+            'monitor/wifi/managed_ap': 'aps',
+            'monitor/wifi/managed_ap/status': 'aps',
+            'monitor/user/device/query': 'endpoints',
+            'monitor/system/dhcp/lease': 'dhcp_leases',
+            'monitor/dhcp-server/leases': 'dhcp_leases',
+            'cmdb/system/dhcp/server': 'dhcp_servers',
+            'cmdb/firewall/address': 'addresses',
+            'monitor/switch-controller/detected-device': 'mac_table',
+            'monitor/network/arp': 'arp',
+        }
+        routes = {path: self._collection_handler(path, name) for path, name in collections.items()}
+        routes.update({
+            'monitor/system/status': self._system_status,
+            'cmdb/system/global': self._system_global,
+            'cmdb/switch-controller': lambda request: self._envelope(request, {'fortilink': 'fortilink'}),
+            'cmdb/wifi': lambda request: self._envelope(request, {'country': 'US'}),
+        })
+        return routes
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        for path, handler in self.routes().items():
+            app.router.add_get(f'/api/v2/{path}', self._wrap(path, handler))
+        return app
+
+    def _wrap(self, path: str, handler: Callable):
+        async def wrapped(request: web.Request) -> web.Response:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            if self.api_token and request.headers.get('Authorization') != f'Bearer {self.api_token}':
+                return web.json_response({'status': 'error', 'http_status': 401}, status=401)
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return web.json_response({'status': 'error', 'http_status': self.error_status},
+                                         status=self.error_status)
+            return handler(request)
+        return wrapped
+
+    def _envelope(self, request: web.Request, results: Any, **extra) -> web.Response:
+        body = {
+            'http_method': 'GET',
+            'results': results,
+            'vdom': request.query.get('vdom', 'root'),
+            'path': request.path,
+            'status': 'success',
+            'serial': f'{SERIAL_PREFIX}{0:010d}',
+            'version': FIRMWARE,
+            'build': BUILD,
+            **extra
+        }
+        return web.json_response(body)
+
+    def _collection_handler(self, path: str, name: str):
+        projectable = path.startswith('cmdb/')
+
+        def handler(request: web.Request) -> web.Response:
+            total, record = self.fleet.collection(name)
+            start = max(int(request.query.get('start', 0)), 0)
+            count = min(int(request.query.get('count', self.max_page_size)), self.max_page_size)
+            fields = request.query.get('format', '').split('|') if projectable and 'format' in request.query else None
+            results = [project_record(record(i), fields) for i in range(start, min(start + count, total))]
+            return self._envelope(request, results, matched_count=total, next_idx=min(start + count, total))
+
+        return handler
+
+    def _system_status(self, request: web.Request) -> web.Response:
+        return self._envelope(request, {'model_name': 'FortiGate', 'model_number': '61F', 'model': 'FGT61F',
+                                        'hostname': self.hostname, 'log_disk_status': 'available'},
+                              uptime=int(time.time() - self.started))
+
+    def _system_global(self, request: web.Request) -> web.Response:
+        return self._envelope(request, {'hostname': self.hostname, 'platform_str': 'FortiGate-61F',
+                                        'timezone': 'US/Pacific'})
+
+    def stats(self) -> Dict:
+        return {'requests': dict(self.requests), 'errors': self.errors, 'generation': self.fleet.generation}
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description='Serve a synthetic FortiGate REST API for offline load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=10443)
+    parser.add_argument('--switches', type=int, default=8)
+    parser.add_argument('--aps', type=int, default=40)
+    parser.add_argument('--endpoints', type=int, default=500)
+    parser.add_argument('--interfaces', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_MAX_PAGE_SIZE, help='Largest page served')
+    parser.add_argument('--api-token', default=None, help='Require this Bearer token')
+    parser.add_argument('--advance-every', type=float, default=0.0,
+                        help='Seconds between fleet generations (0 keeps the fleet static)')
+    parser.add_argument('--certfile', default=None, help='Serve HTTPS with this certificate')
+    parser.add_argument('--keyfile', default=None)
+    args = parser.parse_args(argv)
+
+    fleet = SyntheticFleet(args.switches, args.aps, args.endpoints, args.interfaces, seed=args.seed)
+    simulator = FortiGateSimulator(fleet, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                   error_status=args.error_status, max_page_size=args.page_size,
+                                   api_token=args.api_token, seed=args.seed)
+    app = simulator.app()
+
+    if args.advance_every > 0:
+        async def advance_fleet(app):
+            async def loop():
+                while True:
+                    await asyncio.sleep(args.advance_every)
+                    fleet.advance()
+            task = asyncio.ensure_future(loop())
+            yield
+            task.cancel()
+        app.cleanup_ctx.append(advance_fleet)
+
+    ssl_context = None
+    if args.certfile:
+        import ssl
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+
+    print(f"Simulating {args.switches} switches, {args.aps} APs and {args.endpoints} endpoints "
+          f"on {'https' if ssl_context else 'http'}://{args.host}:{args.port}")
+    web.run_app(app, host=args.host, port=args.port, ssl_context=ssl_context, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Meraki Client Inventory
+Local, persistent client inventory for incremental Meraki syncs
+
+Each device keeps a watermark: the time its clients were last synced
+successfully. The next sync only asks the Dashboard API for the window since
+that watermark, and the returned clients are upserted into the inventory
+instead of replacing it.
+
+By default the inventory lives in cache/meraki_clients.json next to this
+module, whatever the working directory; pass another path, or None to keep
+it in memory only.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+DEFAULT_INVENTORY_PATH = Path(__file__).resolve().parent / 'cache' / 'meraki_clients.json'
+
+# Dashboard lookback limits for client listings, and the overlap re-read on
+# every sync so clients seen right at the watermark are not missed
+MAX_TIMESPAN = 2592000
+MIN_TIMESPAN = 300
+WATERMARK_OVERLAP = 60
+
+
+class MerakiClientInventory:
+    """Per-device client records and sync watermarks, saved as one JSON file"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = DEFAULT_INVENTORY_PATH):
+        self.path = Path(path) if path is not None else None
+        self.watermarks: Dict[str, float] = {}
+        self.clients: Dict[str, Dict[str, Dict]] = {}
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    @staticmethod
+    def client_key(client: Dict) -> Optional[str]:
+        """Meraki client id, or MAC address for listings without ids"""
+        return client.get('id') or client.get('mac')
+
+    def timespan_for(self, serial: str, now: float) -> int:
+        """Lookback window in seconds for a device's next sync"""
+        watermark = self.watermarks.get(serial)
+        if watermark is None:
+            return MAX_TIMESPAN
+        return int(min(MAX_TIMESPAN, max(MIN_TIMESPAN, now - watermark + WATERMARK_OVERLAP)))
+
+    def upsert(self, serial: str, clients: Iterable[Dict], synced_at: float) -> int:
+        """
+        Merge clients seen on a device and advance its watermark
+
+        Returns the number of clients that were not in the inventory before.
+        """
+        known = self.clients.setdefault(serial, {})
+        added = 0
+        for client in clients:
+            key = self.client_key(client)
+            if key is None:
+                continue
+            existing = known.get(key)
+            if existing is None:
+                known[key] = dict(client)
+                added += 1
+            else:
+                existing.update(client)
+        self.watermarks[serial] = synced_at
+        return added
+
+    def device_clients(self, serial: str) -> List[Dict]:
+        return list(self.clients.get(serial, {}).values())
+
+    def __len__(self) -> int:
+        return sum(len(clients) for clients in self.clients.values())
+
+    def load(self) -> None:
+        with open(self.path) as f:
+            data = json.load(f)
+        self.watermarks = {serial: float(ts) for serial, ts in data.get('watermarks', {}).items()}
+        self.clients = data.get('clients', {})
+
+    def save(self) -> None:
+        """Write the inventory atomically so an interrupted save keeps the previous file"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'watermarks': self.watermarks, 'clients': self.clients}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Meraki Rate Limiting Helpers
+Keep concurrent Dashboard API calls inside the per-organization rate limit
+
+The Dashboard API allows about 10 requests per second per organization and
+answers 429 with a Retry-After header when that budget is exceeded. All
+workers share one TokenBucket; a 429 pauses the whole bucket, not just the
+thread that received it.
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import requests
+
+MERAKI_RATE_LIMIT = 10.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent"""
+
+    def __init__(self, rate: float = MERAKI_RATE_LIMIT, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for seconds (used when the API answers 429)"""
+        with self._lock:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._updated = now
+
+
+def retry_after_seconds(response: requests.Response, attempt: int, max_backoff: float = 60.0) -> float:
+    """
+    Seconds to wait before retrying a throttled request
+
+    Uses the Retry-After header (delta-seconds or an HTTP date) when present,
+    otherwise exponential backoff starting at one second.
+    """
+    header = response.headers.get('Retry-After')
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(max_backoff, 2.0 ** attempt)
+
+
+def next_page_url(response: requests.Response) -> Optional[str]:
+    """URL of the next page from a Link: <...>; rel=next header, if any"""
+    return response.links.get('next', {}).get('url')
@@ -0,0 +1,158 @@
+"""
+Tests for the record/replay transport
+Records from a local HTTP server, then replays with the network out of the picture
+"""
+
+import sys
+import json
+import time
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from api_replay import REDACTED, Cassette, CassetteTransport, scrub_url
+from fortigate_api_integration import FortiGateAPIClient
+from fortigate_network_mapper import MerakiNetworkMapper
+from service_metrics import FortiGateMetrics
+
+
+@pytest.fixture
+def upstream():
+    """Local HTTP server answering every GET with a small JSON body that contains a session key"""
+    class Handler(BaseHTTPRequestHandler):
+        requests = 0
+
+        def do_GET(self):
+            Handler.requests += 1
+            time.sleep(0.02)
+            body = json.dumps({'results': [{'name': 'wan1'}], 'session_key': 'abc123'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Set-Cookie', 'APSCOOKIE=secret')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', Handler
+    server.shutdown()
+
+
+def session_with(transport):
+    session = requests.Session()
+    session.mount('http://', transport)
+    session.mount('https://', transport)
+    return session
+
+
+def interaction(url, body, status=200, elapsed=0.0, headers=None):
+    return {'method': 'GET', 'url': scrub_url(url), 'request_headers': {}, 'status': status, 'reason': None,
+            'headers': headers or {'Content-Type': 'application/json'}, 'body': json.dumps(body),
+            'body_encoding': 'utf-8', 'elapsed': elapsed}
+
+
+@pytest.mark.unit
+class TestRecordReplay:
+    """Test recording, secret scrubbing and offline replay"""
+
+    def test_records_without_secrets_and_replays_offline(self, upstream, tmp_path):
+        base_url, handler = upstream
+        path = tmp_path / 'fortigate.jsonl.gz'
+        url = f'{base_url}/api/v2/cmdb/system/interface?vdom=root&access_token=xyz'
+        recorder = CassetteTransport(path, mode='record', scrub_body=[(r'"session_key": "[^"]*"', '"session_key": ""')])
+
+        recorded = session_with(recorder).get(url, headers={'Authorization': 'Bearer xyz'}).json()
+        recorder.save()
+        replayer = CassetteTransport(path, mode='replay')
+        replayed = session_with(replayer).get(url, stream=True).json()
+
+        stored = json.dumps(Cassette.load(path).interactions)
+        assert 'xyz' not in stored and 'abc123' not in stored and 'APSCOOKIE' not in stored
+        assert stored.count(REDACTED) == 3, "Authorization, Set-Cookie and access_token"
+        assert recorded['session_key'] == 'abc123', "Scrubbing affects the cassette, not the live response"
+        assert replayed == {'results': [{'name': 'wan1'}], 'session_key': ''}
+        assert handler.requests == 1 and replayer.replayed == 1
+
+    def test_unrecorded_request_fails_in_replay_mode(self):
+        session = session_with(CassetteTransport(mode='replay'))
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get('https://fortigate/api/v2/monitor/system/status')
+
+    def test_new_mode_records_only_what_is_missing(self, upstream):
+        base_url, handler = upstream
+        transport = CassetteTransport(mode='new')
+        session = session_with(transport)
+
+        for _ in range(3):
+            session.get(f'{base_url}/api/v2/monitor/system/status')
+
+        assert handler.requests == 1
+        assert (transport.recorded, transport.replayed) == (1, 2)
+
+    def test_latency_scale_reproduces_recorded_timing(self):
+        url = 'https://fortigate/api/v2/monitor/system/status'
+        cassette = Cassette([interaction(url, {}, elapsed=0.05)])
+
+        started = time.perf_counter()
+        session_with(CassetteTransport(cassette=cassette)).get(url)
+        fast = time.perf_counter() - started
+        started = time.perf_counter()
+        session_with(CassetteTransport(cassette=cassette, latency_scale=1)).get(url)
+        timed = time.perf_counter() - started
+
+        assert fast < 0.05 <= timed
+
+    def test_latency_stats(self):
+        url = 'https://fortigate/api/v2/monitor/user/device/query'
+        cassette = Cassette([interaction(f'{url}?start={i}', {}, elapsed=i / 100, status=429 if i == 9 else 200)
+                             for i in range(10)])
+
+        stats = cassette.latency_stats()['/api/v2/monitor/user/device/query']
+
+        assert stats['count'] == 10 and stats['statuses'] == {200: 9, 429: 1}
+        assert (stats['min'], stats['p50'], stats['max']) == (0.0, 0.04, 0.09)
+
+
+@pytest.mark.unit
+class TestClientTransports:
+    """Test the clients' transport argument"""
+
+    def test_meraki_retry_is_replayed_in_recorded_order(self):
+        org_url = 'https://api.meraki.com/api/v1/organizations/1'
+        networks_url = f'{org_url}/networks?perPage=100000'
+        cassette = Cassette([
+            interaction(org_url, {'name': 'Org'}),
+            interaction(networks_url, {'errors': ['Too many requests']}, status=429,
+                        headers={'Content-Type': 'application/json', 'Retry-After': '0'}),
+            interaction(networks_url, [{'id': 'N_1', 'name': 'HQ'}]),
+        ])
+        transport = CassetteTransport(cassette=cassette)
+
+        mapper = MerakiNetworkMapper('key', '1', rate_limit=1000, transport=transport)
+        networks = mapper._get(networks_url).json()
+
+        assert networks == [{'id': 'N_1', 'name': 'HQ'}]
+        assert transport.replayed == 3
+
+    def test_metrics_time_replayed_requests(self):
+        url = 'https://fortigate:443/api/v2/cmdb/system/interface'
+        metrics = FortiGateMetrics()
+        transport = CassetteTransport(cassette=Cassette([interaction(url, {'results': [{'name': 'wan1'}]})]))
+        client = FortiGateAPIClient(host='fortigate', username='', password='', api_token='t',
+                                    metrics=metrics, transport=transport)
+
+        interfaces = client.get_interfaces()
+
+        assert interfaces == [{'name': 'wan1'}]
+        assert metrics.responses.value(endpoint='cmdb/system/interface', status=200) == 1
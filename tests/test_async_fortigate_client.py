@@ -0,0 +1,145 @@
+"""
+Tests for AsyncFortiGateAPIClient and the async topology builder
+Runs against a small in-process aiohttp app standing in for a FortiGate
+"""
+
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from fortigate_api_integration import AsyncFortiGateAPIClient, NetworkTopologyBuilder
+
+
+def make_fortigate_app(delay: float = 0):
+    """Minimal FortiGate REST stand-in that tracks concurrent requests"""
+    state = {'in_flight': 0, 'peak': 0, 'requests': 0}
+    routes = {
+        '/api/v2/monitor/system/status': {'status': 'success', 'serial': 'FG61F0000000001',
+                                          'version': 'v7.6.4', 'results': {'hostname': 'FG-LAB', 'model': 'FGT61F'}},
+        '/api/v2/cmdb/system/global': {'results': {'platform_str': 'FortiGate-61F'}},
+        '/api/v2/cmdb/system/interface': {'results': [{'name': 'wan1', 'status': 'up', 'ip': '10.0.0.1'},
+                                                      {'name': 'dmz', 'status': 'down'}]},
+        '/api/v2/cmdb/switch-controller/managed-switch': {'results': [{'name': 'SW1', 'serial': 'S1'}]},
+        '/api/v2/monitor/wifi/managed_ap/select': {'results': [{'name': 'AP1', 'serial': 'A1'}]},
+        '/api/v2/monitor/user/device/query': {'results': [{'mac': '00:11:22:33:44:55', 'hostname': 'laptop'}]},
+    }
+
+    async def handler(request):
+        state['requests'] += 1
+        state['in_flight'] += 1
+        state['peak'] = max(state['peak'], state['in_flight'])
+        try:
+            await asyncio.sleep(delay)
+            if request.path not in routes:
+                return web.json_response({'status': 'error'}, status=404)
+            return web.json_response(routes[request.path])
+        finally:
+            state['in_flight'] -= 1
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handler)
+    return app, state
+
+
+async def run_with_client(coro_factory, delay=0, **client_kwargs):
+    app, state = make_fortigate_app(delay)
+    server = TestServer(app)
+    await server.start_server()
+    client = AsyncFortiGateAPIClient(host='127.0.0.1', api_token='token', **client_kwargs)
+    client.base_url = str(server.make_url('')).rstrip('/')
+    try:
+        result = await coro_factory(client)
+    finally:
+        await client.close()
+        await server.close()
+    return result, state
+
+
+@pytest.mark.unit
+class TestAsyncFortiGateAPIClient:
+    """Test the aiohttp based FortiGate client"""
+
+    def test_get_methods_return_results(self):
+        """get_* coroutines unwrap the results list like the sync client"""
+        async def fetch(client):
+            return await client.get_system_status(), await client.get_user_devices(), await client.get_vips()
+
+        (status, devices, vips), _ = asyncio.run(run_with_client(fetch))
+
+        assert status['hostname'] == 'FG-LAB'
+        assert status['serial'] == 'FG61F0000000001'
+        assert devices[0]['hostname'] == 'laptop'
+        assert vips == [], "HTTP errors should degrade to an empty list"
+
+    def test_in_flight_requests_are_capped_per_host(self):
+        """limit_per_host bounds concurrent requests against one FortiGate"""
+        async def burst(client):
+            return await asyncio.gather(*(client.get_wifi_ap_list() for _ in range(12)))
+
+        results, state = asyncio.run(run_with_client(burst, delay=0.05, max_in_flight=3))
+
+        assert len(results) == 12
+        assert state['peak'] <= 3, f"Peak concurrency {state['peak']} exceeded the cap"
+
+    def test_build_topology_async(self):
+        """NetworkTopologyBuilder can await the async client directly"""
+        async def build(client):
+            return await NetworkTopologyBuilder(client).build_topology_async()
+
+        topology, _ = asyncio.run(run_with_client(build))
+
+        counts = topology['metadata']['device_counts']
+        assert counts == {'firewall': 1, 'switch': 1, 'access_point': 1, 'endpoint': 1, 'interface': 1}
+        assert topology['devices'][0]['name'] == 'FG-LAB'
+        assert len(topology['connections']) == 4
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Concurrent identical requests share one round trip"""
+
+    def test_identical_gets_are_coalesced(self):
+        async def burst(client):
+            aps = await asyncio.gather(*(client.get_wifi_ap_list() for _ in range(20)))
+            devices = await client.get_user_devices()
+            return aps, devices
+
+        (aps, devices), state = asyncio.run(run_with_client(burst, delay=0.05))
+
+        assert all(result == [{'name': 'AP1', 'serial': 'A1'}] for result in aps)
+        assert devices[0]['hostname'] == 'laptop'
+        assert state['requests'] == 2, "20 identical AP list requests should reach the FortiGate once"
+
+    def test_only_identical_requests_are_coalesced(self):
+        """Monitor projections are applied per caller, but another vdom is another request"""
+        async def burst(client):
+            return await asyncio.gather(
+                client.get_wifi_ap_list(fields=('name',)),
+                client.get_wifi_ap_list(fields=('serial',)),
+                client._get_json('/api/v2/monitor/wifi/managed_ap/select', {'vdom': 'guest'}),
+            )
+
+        (by_name, by_serial, _), state = asyncio.run(run_with_client(burst, delay=0.05))
+
+        assert by_name == [{'name': 'AP1'}] and by_serial == [{'serial': 'A1'}]
+        assert state['requests'] == 2
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        async def scenario(client):
+            first = asyncio.ensure_future(client.get_wifi_ap_list())
+            second = asyncio.ensure_future(client.get_wifi_ap_list())
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        result, state = asyncio.run(run_with_client(scenario, delay=0.05))
+
+        assert result == [{'name': 'AP1', 'serial': 'A1'}]
+        assert state['requests'] == 1
@@ -0,0 +1,91 @@
+"""
+Tests for the columnar endpoint table
+"""
+
+import sys
+import time
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from endpoint_table import EndpointTable
+from fortigate_api_integration import NetworkTopologyBuilder
+from tests.test_paging import FakePagedClient
+
+VENDORS = ('Apple', 'Dell', 'HP', None)
+OSES = ('macOS', 'Windows', 'Linux')
+INTERFACES = ('port1', 'port2', 'wifi')
+
+
+def make_devices(count):
+    """user/device/query style records with a deterministic mix of values"""
+    return [
+        {
+            'mac': f'00:00:00:{i // 65536 % 256:02X}:{i // 256 % 256:02X}:{i % 256:02X}',
+            'hostname': f'host-{i}',
+            'hardware_vendor': VENDORS[i % 4],
+            'os_name': OSES[i % 3],
+            'detected_interface': INTERFACES[i % 3],
+            'is_online': i % 2 == 0,
+            'last_seen': 1_700_000_000 + i,
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.unit
+class TestEndpointTable:
+    """Test vectorized filters and group-bys"""
+
+    def test_counts_match_python_loops(self):
+        devices = make_devices(120)
+        table = EndpointTable.from_records(devices)
+
+        assert len(table) == 120
+        assert table.count_by('os') == {'macOS': 40, 'Windows': 40, 'Linux': 40}
+        assert table.count_by('vendor')['Unknown'] == 30
+        assert table.count_by('status') == {'offline': 60, 'online': 60}
+        assert table.online_ratio() == 0.5
+
+    def test_filters_and_crosstab(self):
+        table = EndpointTable.from_records(make_devices(12))
+
+        wifi = table.where(interface='wifi')
+        assert int(wifi.sum()) == 4
+        assert table.count_by('os', wifi) == {'Linux': 4}
+        assert table.where(os='BeOS').sum() == 0
+        assert table.crosstab('interface', 'status') == {
+            'port1': {'online': 2, 'offline': 2},
+            'port2': {'offline': 2, 'online': 2},
+            'wifi': {'online': 2, 'offline': 2},
+        }
+        assert int(table.seen_since(1_700_000_010).sum()) == 2
+
+    def test_mac_index(self):
+        table = EndpointTable.from_records(make_devices(300))
+
+        row = table.lookup('00:00:00:00:01:2B')
+        assert row == 299
+        assert table.row(row)['hostname'] == 'host-299'
+        assert table.lookup('ff:ff:ff:ff:ff:ff') is None
+
+    def test_summary_is_fast_on_large_inventories(self):
+        table = EndpointTable.from_records(make_devices(100_000))
+
+        started = time.perf_counter()
+        summary = table.summary(table.where(interface='port1'))
+        elapsed = time.perf_counter() - started
+
+        assert summary['total'] == 33_334
+        assert elapsed < 0.1, f"Summary took {elapsed * 1000:.1f}ms"
+
+    def test_builder_fills_table_from_stream(self):
+        builder = NetworkTopologyBuilder(FakePagedClient(endpoint_count=500))
+
+        topology = builder.build_topology()
+
+        assert len(builder.endpoint_table) == 500
+        assert topology['metadata']['endpoint_summary']['total'] == 500
@@ -0,0 +1,50 @@
+"""
+Tests for FortiGate field projection
+Verifies format= is only sent where FortiOS honours it and that results are trimmed client-side
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from fortigate_common.fields import projection_params, project_results
+import enhanced_fortigate_client
+import fortigate_api_integration
+
+
+@pytest.mark.unit
+class TestFieldProjection:
+    """Test projection helpers shared by the FortiGate clients"""
+
+    def test_format_param_only_for_cmdb_paths(self):
+        """CMDB tables get format=, monitor endpoints do not"""
+        assert projection_params('cmdb/system/interface', ('name', 'ip')) == {'format': 'name|ip'}
+        assert projection_params('/api/v2/cmdb/firewall/address', ('name',), {'vdom': 'root'}) == {
+            'vdom': 'root', 'format': 'name'
+        }
+        assert projection_params('monitor/user/device/query', ('mac',), {'vdom': 'root'}) == {'vdom': 'root'}
+        assert projection_params('cmdb/system/interface', None) == {}
+
+    def test_client_side_trim(self):
+        """Results are reduced to the declared fields, missing fields are skipped"""
+        results = [
+            {'mac': 'aa', 'hostname': 'one', 'huge_blob': 'x' * 1000},
+            {'mac': 'bb', 'other': 1},
+            'not-a-dict',
+        ]
+
+        trimmed = project_results(results, ('mac', 'hostname'))
+
+        assert trimmed == [{'mac': 'aa', 'hostname': 'one'}, {'mac': 'bb'}, 'not-a-dict']
+        assert project_results(results, None) is results
+
+    def test_both_trees_use_the_shared_helpers(self):
+        """The babylon_3d and root clients apply the same projection rules, from one module"""
+        assert fortigate_api_integration.projection_params is projection_params
+        assert fortigate_api_integration.project_results is project_results
+        shared = Path(project_results.__code__.co_filename)
+        assert Path(enhanced_fortigate_client.project_results.__code__.co_filename) == shared
@@ -0,0 +1,120 @@
+"""
+Tests for the local FortiGate REST simulator
+Runs the real async client and topology builder against a synthetic fleet
+"""
+
+import sys
+import time
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from aiohttp.test_utils import TestServer
+
+from fortigate_api_integration import AsyncFortiGateAPIClient, NetworkTopologyBuilder
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+
+
+async def run_against(simulator, coro_factory, **client_kwargs):
+    server = TestServer(simulator.app())
+    await server.start_server()
+    client_kwargs.setdefault('api_token', 'token')
+    client = AsyncFortiGateAPIClient(host='127.0.0.1', **client_kwargs)
+    client.base_url = str(server.make_url('')).rstrip('/')
+    try:
+        return await coro_factory(client)
+    finally:
+        await client.close()
+        await server.close()
+
+
+@pytest.mark.unit
+class TestSyntheticFleet:
+    """Test reproducibility and churn"""
+
+    def test_same_seed_same_fleet(self):
+        assert SyntheticFleet(seed=3).endpoint(42) == SyntheticFleet(seed=3).endpoint(42)
+        assert SyntheticFleet(seed=3).ap(7) != SyntheticFleet(seed=4).ap(7)
+
+    def test_advance_changes_a_few_devices(self):
+        fleet = SyntheticFleet(endpoints=5000, churn=0.1, offline_ratio=0.5)
+        before = [fleet.endpoint(i)['is_online'] for i in range(5000)]
+        fleet.advance()
+        after = [fleet.endpoint(i)['is_online'] for i in range(5000)]
+
+        flipped = sum(a != b for a, b in zip(before, after))
+        assert 100 < flipped < 500, "About churn * P(flip) = 5% of endpoints should change"
+
+    def test_endpoints_are_addressed_inside_their_vlan(self):
+        fleet = SyntheticFleet(interfaces=4)
+        interfaces = {fleet.interface(i)['name']: fleet.interface(i)['ip'] for i in range(4)}
+
+        for i in range(10):
+            endpoint = fleet.endpoint(i)
+            network = interfaces[endpoint['detected_interface']].split('.')[:2]
+            assert endpoint['ip'].split('.')[:2] == network
+
+
+@pytest.mark.unit
+class TestSimulator:
+    """Test routes, paging, projection and fault injection"""
+
+    def test_topology_builder_against_large_fleet(self):
+        fleet = SyntheticFleet(switches=30, aps=60, endpoints=2500)
+        simulator = FortiGateSimulator(fleet)
+
+        topology = asyncio.run(run_against(simulator, lambda client: NetworkTopologyBuilder(client).build_topology_async()))
+
+        counts = topology['metadata']['device_counts']
+        assert (counts['switch'], counts['access_point'], counts['endpoint']) == (30, 60, 2500)
+        assert topology['devices'][0]['name'] == 'FG-SIM'
+        assert simulator.requests['monitor/user/device/query'] == 3, "2,500 endpoints in pages of 1,000"
+
+    def test_cmdb_projection_and_paging(self):
+        simulator = FortiGateSimulator(SyntheticFleet(switches=7))
+
+        async def calls(client):
+            first = await client._get_json('/api/v2/cmdb/switch-controller/managed-switch',
+                                           {'format': 'name|serial', 'start': 5, 'count': 10})
+            aps = await client._get_json('/api/v2/monitor/wifi/managed_ap/select', {'format': 'name'})
+            return first, aps
+
+        switches, aps = asyncio.run(run_against(simulator, calls))
+
+        assert switches['results'] == [{'name': 'SW0005', 'serial': 'S248EF0000000005'},
+                                       {'name': 'SW0006', 'serial': 'S248EF0000000006'}]
+        assert switches['matched_count'] == 7
+        assert 'serial' in aps['results'][0], "Monitor endpoints ignore format= like FortiOS does"
+
+    def test_pages_are_capped(self):
+        simulator = FortiGateSimulator(SyntheticFleet(endpoints=50), max_page_size=20)
+
+        page = asyncio.run(run_against(simulator, lambda client: client._get_json(
+            '/api/v2/monitor/user/device/query', {'start': 0, 'count': 1000})))
+
+        assert len(page['results']) == 20 and page['matched_count'] == 50
+
+    def test_latency_and_errors(self):
+        slow = FortiGateSimulator(latency=0.05)
+        failing = FortiGateSimulator(error_rate=1.0, error_status=503)
+
+        started = time.perf_counter()
+        aps = asyncio.run(run_against(slow, lambda client: client.get_wifi_ap_list()))
+        elapsed = time.perf_counter() - started
+        failed = asyncio.run(run_against(failing, lambda client: client.get_wifi_ap_list()))
+
+        assert len(aps) == 40 and elapsed >= 0.05
+        assert failed == [] and failing.errors == 1
+
+    def test_api_token_is_enforced(self):
+        simulator = FortiGateSimulator(api_token='secret')
+
+        denied = asyncio.run(run_against(simulator, lambda client: client.get_system_status()))
+        allowed = asyncio.run(run_against(simulator, lambda client: client.get_system_status(), api_token='secret'))
+
+        assert denied == {}
+        assert allowed['hostname'] == 'FG-SIM'
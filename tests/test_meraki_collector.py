@@ -0,0 +1,222 @@
+"""
+Tests for rate-limited, concurrent Meraki collection
+Uses a fake session so no Dashboard API access is required
+"""
+
+import sys
+import json
+import threading
+import pytest
+import requests
+from pathlib import Path
+from urllib.parse import urlencode
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fortigate_network_mapper import MerakiNetworkMapper
+from meraki_inventory import DEFAULT_INVENTORY_PATH, MAX_TIMESPAN, WATERMARK_OVERLAP, MerakiClientInventory
+from meraki_rate_limit import TokenBucket, retry_after_seconds
+
+BASE = "https://api.meraki.com/api/v1"
+
+
+def make_response(status=200, body=None, headers=None, url=''):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body if body is not None else []).encode()
+    response.headers.update(headers or {})
+    response.url = url
+    return response
+
+
+class FakeMerakiSession:
+    """Routes GETs to canned Dashboard responses and records every call"""
+
+    def __init__(self, routes, throttle_first=()):
+        self.routes = routes
+        self.throttle_first = set(throttle_first)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        path = url.split('?')[0][len(BASE) + 1:]
+        with self.lock:
+            self.calls.append(path)
+            if path in self.throttle_first:
+                self.throttle_first.discard(path)
+                return make_response(429, {'errors': ['Too many requests']}, {'Retry-After': '0'})
+        handler = self.routes.get(path)
+        if handler is None:
+            return make_response(404, {'errors': ['Not found']})
+        return handler(url, params or {})
+
+
+def paged(items, page_size):
+    """Route handler serving items with Link rel=next pagination"""
+    def handler(url, params):
+        start = int(url.split('startingAfter=')[1]) if 'startingAfter=' in url else 0
+        page = items[start:start + page_size]
+        headers = {}
+        if start + page_size < len(items):
+            next_url = url.split('?')[0] + '?' + urlencode({'startingAfter': start + page_size})
+            headers['Link'] = f'<{next_url}>; rel=next'
+        return make_response(200, page, headers)
+    return handler
+
+
+def make_mapper(routes, throttle_first=()):
+    mapper = MerakiNetworkMapper.__new__(MerakiNetworkMapper)
+    mapper.org_id = 'org1'
+    mapper.base_url = BASE
+    mapper.headers = {}
+    mapper.session = FakeMerakiSession(routes, throttle_first)
+    mapper.rate_limiter = TokenBucket(rate=1000)
+    mapper.max_retries = 3
+    mapper.metrics = None
+    return mapper
+
+
+def org_routes(network_count=3, devices_per_network=4, clients_per_device=2, bulk_clients=True):
+    networks = [{'id': f'N{n}', 'name': f'Net {n}'} for n in range(network_count)]
+    devices = [
+        {'serial': f'Q{n}-{d}', 'name': f'AP {n}-{d}', 'productType': 'wireless', 'networkId': f'N{n}'}
+        for n in range(network_count) for d in range(devices_per_network)
+    ]
+    routes = {
+        'organizations/org1/networks': paged(networks, 2),
+        'organizations/org1/devices': paged(devices, 5),
+    }
+    for device in devices:
+        clients = [{'mac': f"{device['serial']}-c{c}", 'recentDeviceSerial': device['serial']}
+                   for c in range(clients_per_device)]
+        routes[f"devices/{device['serial']}/clients"] = lambda url, params, clients=clients: make_response(200, clients)
+    if bulk_clients:
+        for network in networks:
+            clients = [{'mac': f"{d['serial']}-c{c}", 'recentDeviceSerial': d['serial']}
+                       for d in devices if d['networkId'] == network['id'] for c in range(clients_per_device)]
+            routes[f"networks/{network['id']}/clients"] = paged(clients, 3)
+    return routes
+
+
+def client_macs(data):
+    return {
+        device['serial']: sorted(c['mac'] for c in device['clients'])
+        for network in data['networks'] for device in network['devices']
+    }
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Test the shared rate limiter"""
+
+    def test_acquire_waits_for_refill(self):
+        now = [0.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=10, capacity=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            bucket.acquire()
+
+        assert now[0] == pytest.approx(0.2)
+
+    def test_pause_holds_callers(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=10, clock=lambda: now[0], sleep=lambda s: now.__setitem__(0, now[0] + s))
+        bucket.pause(5)
+        bucket.acquire()
+
+        assert now[0] >= 5
+
+    def test_retry_after_header_and_backoff(self):
+        assert retry_after_seconds(make_response(429, headers={'Retry-After': '3'}), attempt=0) == 3
+        assert retry_after_seconds(make_response(429), attempt=2) == 4
+
+
+@pytest.mark.unit
+class TestMerakiCollection:
+    """Test bulk, paginated and throttled collection"""
+
+    def test_concurrent_matches_sequential_with_fewer_calls(self):
+        sequential = make_mapper(org_routes())
+        sequential.get_network_devices = lambda network_id: [
+            d for d in sequential.get_organization_devices() if d['networkId'] == network_id
+        ]
+        concurrent = make_mapper(org_routes())
+
+        expected = sequential.collect_all_meraki_data()
+        data = concurrent.collect_all_meraki_data(concurrent=True, max_workers=4)
+
+        assert client_macs(data) == client_macs(expected)
+        assert data['collection_stats']['mode'] == 'concurrent'
+        assert not any(call.startswith('devices/') for call in concurrent.session.calls)
+        assert len(concurrent.session.calls) < len(sequential.session.calls)
+
+    def test_link_pagination_reads_every_page(self):
+        mapper = make_mapper(org_routes(network_count=5))
+
+        assert [n['id'] for n in mapper.get_networks()] == ['N0', 'N1', 'N2', 'N3', 'N4']
+        assert mapper.session.calls.count('organizations/org1/networks') == 3
+
+    def test_429_is_retried(self):
+        mapper = make_mapper(org_routes(), throttle_first=['organizations/org1/devices'])
+
+        devices = mapper.get_organization_devices()
+
+        assert len(devices) == 12
+        assert mapper.session.calls[:2] == ['organizations/org1/devices'] * 2
+
+    def test_falls_back_to_per_device_calls(self):
+        mapper = make_mapper(org_routes(bulk_clients=False))
+
+        data = mapper.collect_all_meraki_data(concurrent=True)
+
+        assert client_macs(data)['Q1-2'] == ['Q1-2-c0', 'Q1-2-c1']
+        assert sum(call.startswith('devices/') for call in mapper.session.calls) == 12
+
+
+@pytest.mark.unit
+class TestMerakiIncrementalSync:
+    """Test watermark based client sync"""
+
+    def make_sync_mapper(self, timespans, failing=()):
+        routes = org_routes(network_count=1, devices_per_network=2)
+        for serial in ('Q0-0', 'Q0-1'):
+            def handler(url, params, serial=serial):
+                timespans.append((serial, params['timespan']))
+                if serial in failing:
+                    return make_response(500, {'errors': ['boom']})
+                return make_response(200, [{'id': f'{serial}-k', 'mac': f'{serial}-m', 'usage': params['timespan']}])
+            routes[f'devices/{serial}/clients'] = handler
+        return make_mapper(routes)
+
+    def test_second_sync_requests_only_the_delta(self, tmp_path):
+        timespans = []
+        inventory = MerakiClientInventory(tmp_path / 'clients.json')
+        self.make_sync_mapper(timespans).sync_clients(inventory, now=1_000_000)
+        stats = self.make_sync_mapper(timespans).sync_clients(
+            MerakiClientInventory(tmp_path / 'clients.json'), now=1_000_600
+        )
+
+        assert sorted(t for _, t in timespans[:2]) == [MAX_TIMESPAN] * 2
+        assert sorted(t for _, t in timespans[2:]) == [600 + WATERMARK_OVERLAP] * 2
+        assert stats['clients_added'] == 0, "Known clients are upserted, not duplicated"
+        assert stats['inventory_size'] == 2
+
+        reloaded = MerakiClientInventory(tmp_path / 'clients.json')
+        assert reloaded.device_clients('Q0-0')[0]['usage'] == 600 + WATERMARK_OVERLAP
+
+    def test_default_path_does_not_depend_on_the_working_directory(self):
+        assert DEFAULT_INVENTORY_PATH.is_absolute()
+        assert DEFAULT_INVENTORY_PATH.parent == Path(__file__).resolve().parent.parent / 'cache'
+
+    def test_failed_device_keeps_its_watermark(self):
+        inventory = MerakiClientInventory(path=None)
+        stats = self.make_sync_mapper([], failing=('Q0-1',)).sync_clients(inventory, now=5000)
+
+        assert stats['devices_failed'] == ['Q0-1']
+        assert inventory.watermarks == {'Q0-0': 5000}
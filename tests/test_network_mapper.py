@@ -0,0 +1,90 @@
+"""
+Tests for FortiGateNetworkMapper topology collection
+Uses stubbed section getters so no FortiGate is required
+"""
+
+import sys
+import time
+import pytest
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fortigate_network_mapper import FortiGateNetworkMapper
+
+
+def make_mapper(delays=None, failures=()):
+    """Build a mapper without the connectivity check and with fake section getters"""
+    delays = delays or {}
+    mapper = FortiGateNetworkMapper.__new__(FortiGateNetworkMapper)
+    mapper.host = '192.0.2.1'
+
+    payloads = {
+        'get_connected_devices': {'total_devices': 1, 'devices': [{'mac': '00:11:22:33:44:55'}]},
+        'get_fortiswitch_clients': {'total_switches': 1, 'switches': [{'name': 'SW1'}]},
+        'get_fortiap_clients': {'total_aps': 1, 'access_points': [{'name': 'AP1'}]},
+        'get_endpoint_clients': {'endpoints': {'total': 0}},
+        'get_interface_status': {'total_interfaces': 1, 'interfaces': [{'name': 'wan1'}]},
+        'get_dhcp_leases': {'total_leases': 1, 'leases': [{'ip': '10.0.0.10'}]},
+    }
+
+    def make_getter(name):
+        def getter(timeout=30, raw='none'):
+            time.sleep(delays.get(name, 0))
+            if name in failures:
+                raise RuntimeError(f"{name} failed")
+            return payloads[name]
+        return getter
+
+    for name in payloads:
+        setattr(mapper, name, make_getter(name))
+    return mapper
+
+
+@pytest.mark.unit
+class TestCollectAllTopologyData:
+    """Test sequential and concurrent topology collection"""
+
+    def test_sequential_collection_keeps_section_layout(self):
+        """Sequential mode returns every section plus latency stats"""
+        data = make_mapper().collect_all_topology_data()
+
+        for section, _, _ in FortiGateNetworkMapper.COLLECTION_SECTIONS:
+            assert section in data, f"Missing section: {section}"
+        assert data['collection_stats']['mode'] == 'sequential'
+        assert data['collection_stats']['failed_sections'] == []
+        assert set(data['collection_stats']['latency_ms']) == {
+            section for section, _, _ in FortiGateNetworkMapper.COLLECTION_SECTIONS
+        }
+
+    def test_concurrent_collection_overlaps_requests(self):
+        """Concurrent mode takes roughly the slowest endpoint, not the sum"""
+        delays = {name: 0.2 for _, name, _ in FortiGateNetworkMapper.COLLECTION_SECTIONS}
+        mapper = make_mapper(delays=delays)
+
+        started = time.monotonic()
+        data = mapper.collect_all_topology_data(concurrent=True, max_workers=6, endpoint_timeout=5)
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 0.2 * 3, f"Collection was not concurrent ({elapsed:.2f}s)"
+        assert data['collection_stats']['mode'] == 'concurrent'
+        assert data['devices']['total_devices'] == 1
+        assert all(ms >= 150 for ms in data['collection_stats']['latency_ms'].values())
+
+    def test_concurrent_collection_returns_partial_results(self):
+        """A slow or failing endpoint only marks its own section"""
+        mapper = make_mapper(
+            delays={'get_dhcp_leases': 1.0},
+            failures=('get_fortiap_clients',)
+        )
+
+        data = mapper.collect_all_topology_data(concurrent=True, endpoint_timeout=0.3)
+
+        assert data['dhcp_leases']['timed_out'] is True
+        assert data['dhcp_leases']['leases'] == []
+        assert 'failed' in data['fortiap']['error']
+        assert data['fortiap']['access_points'] == []
+        assert data['devices']['devices'], "Healthy sections should still be returned"
+        assert sorted(data['collection_stats']['failed_sections']) == ['dhcp_leases', 'fortiap']
+        assert data['collection_stats']['latency_ms']['dhcp_leases'] is None
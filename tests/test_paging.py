@@ -0,0 +1,130 @@
+"""
+Tests for start/count paging of large FortiGate collections
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from fortigate_common.paging import iter_paged
+from enhanced_fortigate_client import EnhancedFortiGateClient
+from fortigate_api_integration import NetworkTopologyBuilder
+
+
+def make_table(size):
+    return [{'mac': f'00:00:00:00:{i // 256:02x}:{i % 256:02x}', 'hostname': f'host-{i}'} for i in range(size)]
+
+
+def paged_fetcher(table, honour_paging=True):
+    """fetch_page stand-in that records each request"""
+    calls = []
+
+    def fetch_page(start, count):
+        calls.append((start, count))
+        if not honour_paging:
+            return list(table)
+        return table[start:start + count]
+
+    return fetch_page, calls
+
+
+@pytest.mark.unit
+class TestIterPaged:
+    """Test the start/count walk"""
+
+    def test_walks_all_pages(self):
+        """Every record is yielded once, stopping after the short page"""
+        table = make_table(250)
+        fetch_page, calls = paged_fetcher(table)
+
+        records = list(iter_paged(fetch_page, page_size=100))
+
+        assert records == table
+        assert calls == [(0, 100), (100, 100), (200, 100)]
+
+    def test_endpoint_ignoring_paging_is_read_once(self):
+        """A server that returns the full table for every page does not loop forever"""
+        for size in (100, 250):
+            table = make_table(size)
+            fetch_page, calls = paged_fetcher(table, honour_paging=False)
+
+            records = list(iter_paged(fetch_page, page_size=100))
+
+            assert records == table
+            assert len(calls) <= 2
+
+    def test_failed_page_stops_iteration(self):
+        """A failed request ends the stream with what was already yielded"""
+        table = make_table(300)
+
+        def fetch_page(start, count):
+            return None if start >= 100 else table[start:start + count]
+
+        assert list(iter_paged(fetch_page, page_size=100)) == table[:100]
+
+    def test_enhanced_client_streams_normalized_devices(self):
+        """iter_connected_devices pages through _stream_results and normalizes each record"""
+        table = make_table(5)
+        client = EnhancedFortiGateClient('192.0.2.1', 'token')
+        requests_seen = []
+
+        def fake_stream(endpoint, params=None, timeout=10, fields=None):
+            requests_seen.append(params)
+            return iter(table[params['start']:params['start'] + params['count']])
+
+        client._stream_results = fake_stream
+
+        devices = list(client.iter_connected_devices(page_size=2))
+
+        assert [d['name'] for d in devices] == [r['hostname'] for r in table]
+        assert all(d['type'] == 'endpoint' for d in devices)
+        assert [p['start'] for p in requests_seen] == [0, 2, 4]
+
+
+class FakePagedClient:
+    """Sync client stand-in exposing a lazy user device iterator"""
+
+    host = '192.0.2.1'
+
+    def __init__(self, endpoint_count):
+        self.endpoint_count = endpoint_count
+        self.consumed = 0
+
+    def get_system_status(self):
+        return {'hostname': 'FG-LAB'}
+
+    def get_system_info(self):
+        return {'results': {}}
+
+    def get_interfaces(self, fields=None):
+        return []
+
+    def get_managed_switches(self, fields=None):
+        return []
+
+    def get_wifi_ap_list(self, fields=None):
+        return []
+
+    def iter_user_devices(self, page_size=1000, fields=None):
+        for record in make_table(self.endpoint_count):
+            self.consumed += 1
+            yield record
+
+
+@pytest.mark.unit
+class TestBuilderConsumesIterator:
+    """The topology builder counts streamed endpoints without holding them"""
+
+    def test_endpoint_count_covers_every_page(self):
+        client = FakePagedClient(endpoint_count=1200)
+
+        topology = NetworkTopologyBuilder(client).build_topology()
+
+        groups = [d for d in topology['devices'] if d['type'] == 'endpoint_group']
+        assert client.consumed == 1200
+        assert topology['metadata']['device_counts']['endpoint'] == 1200
+        assert sum(group['metadata']['count'] for group in groups) == 1200, "Every endpoint is in a group"
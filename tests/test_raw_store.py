@@ -0,0 +1,155 @@
+"""
+Tests for raw API payload retention in the FortiGate clients
+"""
+
+import io
+import sys
+import json
+import pytest
+import requests
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fortigate_raw_store import RawPayloadStore
+from enhanced_fortigate_client import EnhancedFortiGateClient
+from fortigate_network_mapper import FortiGateNetworkMapper
+
+AP = {'serial': 'FP231FTF20000001', 'name': 'AP-Lobby', 'state': 'online'}
+DEVICE = {'mac': '00:11:22:33:44:55', 'hostname': 'laptop'}
+# As the FortiGate sends them, with fields outside the getters' projections
+RAW_AP = {**AP, 'os_version': 'FP231F-v7.4-build0633', 'mgmt_vlanid': 0}
+RAW_DEVICE = {**DEVICE, 'os_name': 'Windows', 'hardware_vendor': 'Dell'}
+
+
+def serve(client):
+    """Answer the client's GETs with the raw payloads above"""
+    def get(url, timeout=None, stream=False):
+        results = [RAW_DEVICE] if 'user/device/query' in url else [RAW_AP]
+        if 'start=' in url and 'start=0' not in url:
+            results = []
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.raw = io.BytesIO(json.dumps({'status': 'success', 'results': results}).encode())
+        return response
+    client.session.get = get
+    return client
+
+
+def make_client(raw):
+    client = EnhancedFortiGateClient('192.0.2.1', 'token', raw=raw)
+    client._make_request = lambda endpoint, params=None, timeout=10, fields=None: {
+        'status': 'success', 'results': [dict(AP)]
+    }
+    client._stream_results = lambda endpoint, params=None, timeout=10, fields=None: iter(
+        [dict(DEVICE)] if params['start'] == 0 else []
+    )
+    return client
+
+
+@pytest.mark.unit
+class TestRawPayloadStore:
+    """Test the retention policies"""
+
+    def test_policies(self):
+        assert RawPayloadStore('none').retain('fortiap', 'a', AP) == {}
+        assert RawPayloadStore('full').retain('fortiap', 'a', AP) == {'raw_data': AP}
+
+        store = RawPayloadStore('ref')
+        assert store.retain('fortiap', 'a', AP) == {'raw_ref': 'a'}
+        assert store.get('a') is AP and store.get('a', 'device') is None
+        assert 'a' in store and len(store) == 1
+
+        store.reset('fortiap')
+        assert len(store) == 0
+
+    def test_unknown_policy_rejected(self):
+        with pytest.raises(ValueError):
+            RawPayloadStore('copy')
+
+
+@pytest.mark.unit
+class TestEnhancedClientRetention:
+    """Normalized records only embed raw payloads with raw='full'"""
+
+    def test_ref_keeps_one_payload_per_record(self):
+        client = make_client('ref')
+
+        for _ in range(3):
+            aps = client.get_fortiaps()
+            devices = client.get_connected_devices()
+
+        assert aps[0]['metadata'] == {'raw_ref': AP['serial']}
+        assert devices[0]['metadata'] == {'raw_ref': DEVICE['mac']}
+        assert client.get_raw_payload(AP['serial']) == AP
+        assert client.get_raw_payload(DEVICE['mac'], 'device') == DEVICE
+        assert len(client.raw_store) == 2
+
+    def test_default_keeps_no_payloads(self):
+        client = serve(EnhancedFortiGateClient('192.0.2.1', 'token'))
+
+        assert client.get_fortiaps()[0]['metadata'] == {}
+        assert client.get_connected_devices()[0]['metadata'] == {}
+        assert len(client.raw_store) == 0
+
+    def test_none_and_full(self):
+        assert make_client('none').get_fortiaps()[0]['metadata'] == {}
+        assert make_client('full').get_fortiaps()[0]['metadata'] == {'raw_data': AP}
+
+    def test_retained_payloads_are_not_projected(self):
+        client = serve(EnhancedFortiGateClient('192.0.2.1', 'token', raw='ref'))
+
+        client.get_fortiaps()
+        client.get_connected_devices()
+
+        assert client.get_raw_payload(AP['serial'], 'fortiap')['os_version'] == RAW_AP['os_version']
+        assert client.get_raw_payload(DEVICE['mac'], 'device') == RAW_DEVICE
+        full = serve(EnhancedFortiGateClient('192.0.2.1', 'token', raw='full'))
+        assert full.get_fortiaps()[0]['metadata'] == {'raw_data': RAW_AP}
+
+    @pytest.mark.parametrize('raw', ['none', 'ref', 'full'])
+    def test_records_are_projected_under_every_policy(self, raw):
+        client = serve(EnhancedFortiGateClient('192.0.2.1', 'token', raw=raw))
+        client.FORTIAP_FIELDS = ('serial', 'name')
+        client.DEVICE_FIELDS = ('mac',)
+
+        ap = client.get_fortiaps()[0]
+        device = client.get_connected_devices()[0]
+
+        assert (ap['name'], ap['status']) == (AP['name'], 'unknown'), "state is projected away"
+        assert device['name'] == 'Unknown', "hostname is projected away"
+        if raw == 'ref':
+            assert client.get_raw_payload(AP['serial'], 'fortiap') == RAW_AP
+
+    def test_projection_applies_without_retention(self):
+        client = serve(EnhancedFortiGateClient('192.0.2.1', 'token', raw='none'))
+
+        assert client._make_request('wifi/managed_ap/select', fields=client.FORTIAP_FIELDS)['results'] == [AP]
+        assert list(client._iter_results('user/device/query', fields=client.DEVICE_FIELDS)) == [DEVICE]
+
+
+@pytest.mark.unit
+class TestMapperRetention:
+    """The mapper files full responses under their API path"""
+
+    def test_retain_raw(self):
+        mapper = FortiGateNetworkMapper.__new__(FortiGateNetworkMapper)
+        mapper.raw_store = RawPayloadStore('ref')
+        response = {'results': [DEVICE]}
+
+        for raw, expected in (('none', {}), ('full', {'raw_response': response})):
+            result = {}
+            mapper._retain_raw(result, 'monitor/user/device/query', response, raw)
+            assert result == expected
+
+        result = {}
+        mapper._retain_raw(result, 'monitor/user/device/query', response, 'ref')
+        assert result == {'raw_ref': 'monitor/user/device/query'}
+        assert mapper.get_raw_payload('monitor/user/device/query') is response
+
+    def test_collect_rejects_unknown_policy(self):
+        mapper = FortiGateNetworkMapper.__new__(FortiGateNetworkMapper)
+        with pytest.raises(ValueError):
+            mapper.collect_all_topology_data(raw='yes')
@@ -0,0 +1,150 @@
+"""
+Tests for the Enhanced client's TTL response cache and memoized discovery summary
+"""
+
+import io
+import sys
+import json
+import pytest
+import requests
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fortigate_cache import TTLCache, cache_key
+from enhanced_fortigate_client import EnhancedFortiGateClient
+
+ROUTES = {
+    'system/status': {'status': 'success', 'hostname': 'FG-LAB'},
+    'wifi/managed_ap/select': {'status': 'success', 'results': [{'serial': 'FP1', 'name': 'AP1'}]},
+    'user/device/query': {'status': 'success', 'results': [{'mac': '00:11:22:33:44:55'}, {'mac': '00:11:22:33:44:66'}]},
+    'system/interface': {'status': 'success', 'results': [{'name': 'wan1'}]},
+}
+
+
+class CountingSession:
+    """requests.Session stand-in serving ROUTES and counting GETs per endpoint"""
+
+    def __init__(self):
+        self.calls = []
+        # Endpoints whose body breaks off half way
+        self.truncated = set()
+
+    def get(self, url, timeout=None, stream=False):
+        endpoint = url.split('/api/v2/monitor/')[1].split('?')[0]
+        self.calls.append(endpoint)
+        body = dict(ROUTES[endpoint])
+        if endpoint == 'user/device/query' and 'start=0' not in url:
+            body['results'] = []
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        payload = json.dumps(body).encode()
+        if endpoint in self.truncated:
+            payload = payload[:len(payload) // 2]
+        response.raw = io.BytesIO(payload)
+        return response
+
+
+def make_client(cache_ttl=30):
+    client = EnhancedFortiGateClient('192.0.2.1', 'token', cache_ttl=cache_ttl)
+    client.session = CountingSession()
+    return client
+
+
+@pytest.mark.unit
+class TestTTLCache:
+    """Test expiry, invalidation and counters"""
+
+    def test_entries_expire(self):
+        now = [0.0]
+        cache = TTLCache(ttl=10, clock=lambda: now[0])
+        key = cache_key('system/status', {'vdom': 'root'})
+
+        cache.set(key, {'ok': True})
+        assert cache.get(cache_key('system/status', {'vdom': 'root'})) == {'ok': True}
+        now[0] = 11
+        assert cache.get(key) is None
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    def test_invalidate_one_endpoint(self):
+        cache = TTLCache(ttl=10)
+        cache.set(cache_key('a', {'x': 1}), 1)
+        cache.set(cache_key('a', {'x': 2}), 2)
+        cache.set(cache_key('b'), 3)
+
+        assert cache.invalidate('a') == 2
+        assert cache.get(cache_key('b')) == 3
+
+    def test_zero_ttl_disables(self):
+        cache = TTLCache(ttl=0)
+        cache.set(cache_key('a'), 1)
+        assert cache.get(cache_key('a')) is None
+
+
+@pytest.mark.unit
+class TestEnhancedClientCaching:
+    """Summaries reuse the topology fetched in the same refresh cycle"""
+
+    def test_summary_after_topology_makes_no_requests(self):
+        client = make_client()
+        topology = client.get_complete_topology()
+        calls_after_topology = len(client.session.calls)
+
+        summary = client.get_discovery_summary()
+
+        assert len(client.session.calls) == calls_after_topology
+        assert summary['discovered_capabilities'] == {
+            'fortiaps_count': 1, 'devices_count': 2, 'interfaces_count': 1
+        }
+        assert topology['metadata']['endpoints_count'] == 2
+
+    def test_summary_without_snapshot_uses_cache(self):
+        client = make_client()
+        client.get_fortiaps()
+        client.get_connected_devices()
+
+        client.get_discovery_summary()
+
+        assert client.session.calls.count('wifi/managed_ap/select') == 1
+        assert client.session.calls.count('user/device/query') == 1
+        assert client.cache_stats()['hits'] >= 2
+
+    def test_truncated_pages_are_not_cached(self):
+        client = make_client()
+        client.session.truncated.add('user/device/query')
+        client.get_connected_devices()
+
+        client.session.truncated.clear()
+        devices = client.get_connected_devices()
+
+        assert client.session.calls.count('user/device/query') == 2, "The partial page was fetched again"
+        assert len(devices) == 2
+
+    def test_cached_results_are_copies(self):
+        client = make_client()
+        client._make_request('wifi/managed_ap/select')['results'][0]['name'] = 'edited'
+        first_page = list(client._stream_results('user/device/query', {'start': 0, 'count': 1000}))
+        first_page[0]['mac'] = 'edited'
+
+        assert client._make_request('wifi/managed_ap/select')['results'][0]['name'] == 'AP1'
+        assert client._make_request('wifi/managed_ap/select')['results'][0]['name'] == 'AP1'
+        replayed = list(client._stream_results('user/device/query', {'start': 0, 'count': 1000}))
+        assert replayed[0]['mac'] == '00:11:22:33:44:55'
+        assert client.session.calls.count('user/device/query') == 1
+
+    def test_invalidate_forces_refetch(self):
+        client = make_client()
+        client.get_fortiaps()
+        client.invalidate_cache('wifi/managed_ap/select')
+        client.get_fortiaps()
+
+        assert client.session.calls.count('wifi/managed_ap/select') == 2
+
+    def test_cache_can_be_disabled(self):
+        client = make_client(cache_ttl=0)
+        client.get_complete_topology()
+        client.get_discovery_summary(max_age=0)
+
+        assert client.session.calls.count('system/interface') == 2
@@ -0,0 +1,229 @@
+"""
+Tests for the Prometheus metrics registry, the client instrumentation hooks and /metrics
+"""
+
+import sys
+import json
+import asyncio
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from fortigate_api_integration import FortiGateAPIClient
+import python_api_service
+from python_api_service import PythonAPIService
+from service_metrics import FortiGateMetrics, MetricsRegistry, endpoint_label, metrics_middleware
+from tests.test_async_fortigate_client import run_with_client
+from tests.test_meraki_collector import make_mapper, org_routes
+from tests.test_response_cache import make_client
+
+
+@pytest.fixture
+def fortigate_http():
+    """Plain HTTP stand-in for a FortiGate, for the requests based client"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            served = ('/api/v2/cmdb/system/interface', '/api/v2/monitor/user/device/query')
+            status = 200 if self.path.startswith(served) else 404
+            body = json.dumps({'results': [{'name': 'wan1'}]}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.unit
+class TestRegistry:
+    """Test the text exposition format"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1))
+        histogram.observe(0.05, endpoint='a')
+        histogram.observe(0.1, endpoint='a')
+        histogram.observe(5, endpoint='a')
+
+        lines = registry.render().splitlines()
+
+        assert lines[:2] == ['# HELP latency_seconds Latency', '# TYPE latency_seconds histogram']
+        assert 'latency_seconds_bucket{endpoint="a",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{endpoint="a",le="1.0"} 2' in lines
+        assert 'latency_seconds_bucket{endpoint="a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{endpoint="a"} 3' in lines
+
+    def test_counter_labels_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter('errors_total', 'Errors', ('kind',)).inc(kind='say "hi"\n')
+
+        assert 'errors_total{kind="say \\"hi\\"\\n"} 1' in registry.render()
+
+    def test_duplicate_names_are_rejected(self):
+        registry = MetricsRegistry()
+        registry.counter('a_total', 'A')
+
+        with pytest.raises(ValueError):
+            registry.counter('a_total', 'A')
+
+    def test_endpoint_label(self):
+        assert endpoint_label('https://fg:443/api/v2/monitor/user/device/query?start=0') == 'monitor/user/device/query'
+        assert endpoint_label('/api/v2/cmdb/system/interface') == 'cmdb/system/interface'
+
+
+@pytest.mark.unit
+class TestClientHooks:
+    """Every client reports through its shared request path"""
+
+    def test_sync_client_session_is_instrumented(self, fortigate_http):
+        metrics = FortiGateMetrics()
+        client = FortiGateAPIClient('127.0.0.1', 'admin', '', metrics=metrics)
+        client.base_url = fortigate_http
+
+        assert client.get_interfaces() == [{'name': 'wan1'}]
+        assert list(client.iter_user_devices()) == [{'name': 'wan1'}]
+        client.get_system_info()
+
+        assert metrics.request_seconds.count(endpoint='cmdb/system/interface') == 1
+        assert metrics.parse_seconds.count(endpoint='cmdb/system/interface') == 1
+        assert metrics.parse_seconds.count(endpoint='monitor/user/device/query') == 1
+        assert metrics.responses.value(endpoint='cmdb/system/global', status='404') == 1
+        assert metrics.errors.value(endpoint='cmdb/system/global', kind='http_404') == 1
+
+    def test_enhanced_client_reports_cache_and_parse(self):
+        client = make_client()
+        client.metrics = FortiGateMetrics()
+
+        client.get_fortiaps()
+        client.get_fortiaps()
+        list(client._iter_results('user/device/query'))
+
+        assert client.metrics.request_seconds.count(endpoint='wifi/managed_ap/select') == 1
+        assert client.metrics.parse_seconds.count(endpoint='user/device/query') == 1
+        assert client.metrics.cache_hits.value(cache='response') == 1
+
+    def test_disabled_cache_reports_no_lookups(self):
+        client = make_client()
+        client.cache.ttl = 0
+        client.metrics = FortiGateMetrics()
+
+        client.get_fortiaps()
+        client.get_fortiaps()
+
+        assert client.metrics.request_seconds.count(endpoint='wifi/managed_ap/select') == 2
+        assert 'cache_misses_total{' not in client.metrics.render()
+
+    def test_async_client_reports_requests_and_parse(self):
+        metrics = FortiGateMetrics()
+
+        async def calls(client):
+            await client.get_wifi_ap_list()
+            return [device async for device in client.iter_user_devices()]
+
+        devices, _ = asyncio.run(run_with_client(calls, metrics=metrics))
+
+        assert len(devices) == 1
+        assert metrics.request_seconds.count(endpoint='monitor/wifi/managed_ap/select') == 1
+        assert metrics.parse_seconds.count(endpoint='monitor/user/device/query') == 1
+
+    def test_meraki_retries_are_counted(self):
+        mapper = make_mapper(org_routes(), throttle_first=['organizations/org1/devices'])
+        mapper.metrics = FortiGateMetrics()
+
+        mapper.get_organization_devices()
+
+        assert mapper.metrics.retries.value(endpoint='organizations/org1/devices') == 1
+
+
+@pytest.mark.unit
+class TestMetricsEndpoint:
+    """/metrics exposes handler latency for every route"""
+
+    def test_handler_latency_is_exposed(self):
+        service = PythonAPIService()
+
+        async def scenario():
+            app = web.Application(middlewares=[metrics_middleware(service.metrics)])
+            app.router.add_get('/topology', service.get_topology)
+            app.router.add_get('/metrics', service.get_metrics)
+            client = TestClient(TestServer(app))
+            await client.start_server()
+            try:
+                await client.get('/topology')
+                await client.get('/missing')
+                response = await client.get('/metrics')
+                return response.headers['Content-Type'], await response.text()
+            finally:
+                await client.close()
+
+        content_type, text = asyncio.run(scenario())
+
+        assert content_type.startswith('text/plain; version=0.0.4')
+        assert 'http_handler_duration_seconds_count{route="/topology",method="GET",status="200"} 1' in text
+        assert 'status="404"' in text
+        assert '# TYPE fortigate_request_duration_seconds histogram' in text
+
+    def test_mock_data_without_the_optional_modules(self, monkeypatch):
+        """With the live topology stack and metrics unavailable the service still serves mock data"""
+        for name in ('FortiGateMetrics', 'AsyncFortiGateAPIClient', 'PositionCache'):
+            monkeypatch.setattr(python_api_service, name, None)
+        service = PythonAPIService()
+
+        async def scenario():
+            await service.start()
+            app = web.Application()
+            app.router.add_get('/topology', service.get_topology)
+            app.router.add_get('/metrics', service.get_metrics)
+            client = TestClient(TestServer(app))
+            await client.start_server()
+            try:
+                topology = await client.get('/topology')
+                metrics = await client.get('/metrics')
+                return topology.status, (await topology.json())['switches'], metrics.status
+            finally:
+                await client.close()
+
+        assert asyncio.run(scenario()) == (200, [], 503)
+        assert service.poller is None and service.position_cache is None
+
+    def test_streams_are_kept_out_of_handler_latency(self):
+        metrics = FortiGateMetrics()
+
+        async def stream(request):
+            response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+            await response.prepare(request)
+            await response.write(b'data: {}\n\n')
+            return response
+
+        async def scenario():
+            app = web.Application(middlewares=[metrics_middleware(metrics)])
+            app.router.add_get('/topology/stream', stream)
+            client = TestClient(TestServer(app))
+            await client.start_server()
+            try:
+                response = await client.get('/topology/stream')
+                await response.read()
+            finally:
+                await client.close()
+
+        asyncio.run(scenario())
+
+        assert metrics.stream_seconds.count(route='/topology/stream', method='GET') == 1
+        assert 'route="/topology/stream"' not in ''.join(metrics.handler_seconds.render())
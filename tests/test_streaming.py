@@ -0,0 +1,151 @@
+"""
+Tests for incremental parsing of FortiGate 'results' arrays
+"""
+
+import io
+import sys
+import json
+import asyncio
+import pytest
+import requests
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+import fortigate_common.streaming as fortigate_streaming
+from fortigate_api_integration import FortiGateAPIClient, NetworkTopologyBuilder
+from fortigate_common.paging import aiter_paged
+from fortigate_common.streaming import IncompleteResults, iter_json_results
+from fortigate_network_mapper import FortiGateNetworkMapper
+
+
+def make_response(body: bytes) -> requests.Response:
+    """Unread streaming response backed by an in-memory body"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = 'https://192.0.2.1/api/v2/monitor/user/device/query'
+    response.raw = io.BytesIO(body)
+    return response
+
+
+RESULTS = [
+    {'mac': '00:11:22:33:44:55', 'hostname': 'laptop', 'os_name': 'Windows', 'detected_interface': 'port1'},
+    {'mac': '00:11:22:33:44:66', 'hostname': 'phone', 'last_seen': 1.5},
+]
+BODY = json.dumps({'http_method': 'GET', 'results': RESULTS, 'vdom': 'root', 'status': 'success'}).encode()
+
+
+@pytest.mark.unit
+class TestIterJsonResults:
+    """Test the streaming results reader and its fallback"""
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_yields_projected_records(self, monkeypatch, streaming):
+        """Records come out projected whether or not ijson is used"""
+        if streaming and not fortigate_streaming.STREAMING_AVAILABLE:
+            pytest.skip("compiled ijson backend not installed")
+        monkeypatch.setattr(fortigate_streaming, 'STREAMING_AVAILABLE', streaming)
+
+        records = list(iter_json_results(make_response(BODY), ('mac', 'hostname')))
+
+        assert records == [{'mac': r['mac'], 'hostname': r['hostname']} for r in RESULTS]
+
+    def test_truncated_body_keeps_complete_records(self):
+        """A body cut off mid-array ends the stream after the last complete element"""
+        if not fortigate_streaming.STREAMING_AVAILABLE:
+            pytest.skip("compiled ijson backend not installed")
+        truncated = BODY[:BODY.index(b'phone')]
+
+        records = list(iter_json_results(make_response(truncated), ('mac',)))
+
+        assert records == [{'mac': RESULTS[0]['mac']}]
+
+    def test_return_value_tells_complete_from_partial(self):
+        def drain(body):
+            return (yield from iter_json_results(make_response(body)))
+
+        assert list(drain(BODY)) == RESULTS
+        for body in (BODY[:BODY.index(b'phone')], b'not json'):
+            stream = drain(body)
+            with pytest.raises(StopIteration) as stop:
+                while True:
+                    next(stream)
+            assert stop.value.value is False
+
+
+@pytest.mark.unit
+class TestAsyncPaging:
+    """Test the async start/count walk over streamed pages"""
+
+    def test_walks_async_pages(self):
+        table = [{'mac': f'00:00:00:00:00:{i:02x}'} for i in range(5)]
+        calls = []
+
+        async def fetch_page(start, count):
+            calls.append(start)
+            for record in table[start:start + count]:
+                yield record
+
+        async def collect():
+            return [r async for r in aiter_paged(fetch_page, page_size=2)]
+
+        assert asyncio.run(collect()) == table
+        assert calls == [0, 2, 4]
+
+
+NEXT_PAGE = json.dumps({'results': [{'mac': '00:11:22:33:44:77'}, {'mac': '00:11:22:33:44:88', 'hostname': 'tablet'}]})
+TRUNCATED = NEXT_PAGE[:NEXT_PAGE.index('tablet')].encode()
+
+
+class TruncatingSession:
+    """Session stand-in serving a full first page, then a page cut off mid-array"""
+
+    def __init__(self):
+        self.starts = []
+
+    def get(self, url, params=None, **kwargs):
+        start = (params or {}).get('start', 0)
+        self.starts.append(start)
+        return make_response(BODY if start == 0 and params else TRUNCATED)
+
+
+@pytest.mark.unit
+class TestIncompleteResults:
+    """A body that breaks off mid-array is reported, not taken for a short collection"""
+
+    def test_mapper_marks_truncated_section_failed(self):
+        mapper = FortiGateNetworkMapper.__new__(FortiGateNetworkMapper)
+        mapper.base_url, mapper.headers, mapper.session = 'https://192.0.2.1', {}, TruncatingSession()
+
+        result = mapper.get_connected_devices(raw='none')
+
+        assert 'error' in result and result['devices'] == []
+
+    def test_babylon_paging_raises_after_the_rows_read(self):
+        client = FortiGateAPIClient.__new__(FortiGateAPIClient)
+        client.base_url, client.session, client.metrics = 'https://192.0.2.1', TruncatingSession(), None
+        devices = []
+
+        with pytest.raises(IncompleteResults):
+            for device in client.iter_user_devices(page_size=2):
+                devices.append(device)
+
+        assert client.session.starts == [0, 2]
+        assert devices[:2] == RESULTS
+
+    def test_builder_flags_incomplete_user_devices(self):
+        class Client:
+            host = '192.0.2.1'
+            get_system_status = get_system_info = lambda self: {}
+            get_interfaces = get_managed_switches = get_wifi_ap_list = lambda self, fields=None: []
+
+            def iter_user_devices(self, page_size=1000, fields=None):
+                yield {'mac': '00:11:22:33:44:55'}
+                raise IncompleteResults("Results from monitor/user/device/query broke off")
+
+        topology = NetworkTopologyBuilder(Client()).build_topology()
+
+        assert topology['metadata']['incomplete_sections'] == ['user_devices']
+        assert topology['metadata']['device_counts']['endpoint'] == 1
@@ -0,0 +1,121 @@
+"""
+Tests for longest-prefix-match subnet attribution
+Interface, DHCP scope and address object prefixes, single and batch lookups
+"""
+
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from endpoint_table import EndpointTableBuilder
+from fortigate_api_integration import NetworkTopologyBuilder
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+from subnet_index import Subnet, SubnetIndex
+from tests.test_fortigate_simulator import run_against
+
+INTERFACES = [
+    {'name': 'wan1', 'ip': '0.0.0.0 0.0.0.0'},
+    {'name': 'vlan10', 'ip': '10.1.0.1 255.255.0.0', 'ipv6': {'ip6-address': '2001:db8:10::1/64'},
+     'secondaryip': [{'id': 1, 'ip': '172.16.10.1 255.255.255.0'}]},
+    {'name': 'vlan20', 'ip': '10.2.0.1 255.255.0.0'},
+]
+DHCP_SERVERS = [
+    {'id': 1, 'interface': 'vlan10', 'default-gateway': '10.1.0.1', 'netmask': '255.255.0.0',
+     'ip-range': [{'id': 1, 'start-ip': '10.1.1.10', 'end-ip': '10.1.1.20'}]},
+]
+ADDRESSES = [
+    {'name': 'all', 'type': 'ipmask', 'subnet': '0.0.0.0 0.0.0.0'},
+    {'name': 'printers', 'type': 'ipmask', 'subnet': '10.2.5.0 255.255.255.0', 'associated-interface': ''},
+    {'name': 'lab', 'type': 'iprange', 'start-ip': '192.168.9.1', 'end-ip': '192.168.9.6'},
+    {'name': 'vlan20-net', 'type': 'ipmask', 'subnet': '10.2.0.0/16', 'associated-interface': 'vlan20'},
+]
+
+
+def fortigate_index():
+    return SubnetIndex.from_fortigate(INTERFACES, DHCP_SERVERS, ADDRESSES)
+
+
+@pytest.mark.unit
+class TestSubnetIndex:
+    """Test the IPv4/IPv6 tries"""
+
+    def test_longest_prefix_wins(self):
+        index = fortigate_index()
+
+        assert index.lookup('10.1.1.12') == Subnet('10.1.1.12/30', 'vlan10', 'dhcp', 'dhcp-1')
+        assert index.lookup('10.1.200.7') == Subnet('10.1.0.0/16', 'vlan10', 'interface', 'vlan10')
+        assert index.lookup('172.16.10.40').interface == 'vlan10', "Secondary IPs are indexed"
+        assert index.lookup('2001:db8:10::42') == Subnet('2001:db8:10::/64', 'vlan10', 'interface', 'vlan10')
+        assert index.lookup('192.168.9.7') is None
+        assert index.lookup('8.8.8.8') is None, "'all' and unset interface addresses are not indexed"
+        assert index.lookup('not an ip') is None
+
+    def test_address_objects_inherit_the_enclosing_interface(self):
+        index = fortigate_index()
+
+        assert index.lookup('10.2.5.9') == Subnet('10.2.5.0/24', 'vlan20', 'address', 'printers')
+        assert index.lookup('192.168.9.3') == Subnet('192.168.9.2/31', None, 'address', 'lab')
+
+    def test_interface_subnets_win_over_the_same_prefix(self):
+        index = fortigate_index()
+
+        assert index.lookup('10.2.0.9').source == 'interface'
+        assert index.summary() == {'prefixes': 13, 'ipv4_depth': 32, 'ipv6_depth': 64,
+                                   'interface_prefixes': 4, 'dhcp_prefixes': 4, 'address_prefixes': 5}
+
+    def test_batch_lookup_matches_single_lookups(self):
+        index = fortigate_index()
+        ips = ['10.1.1.12', '10.2.5.9', '2001:db8:10::42', '8.8.8.8', '', None, 'bogus', '2001:db8:99::1',
+               '192.168.9.6'] + [f'10.{1 + i % 3}.{i % 256}.{i % 250 + 1}' for i in range(500)]
+
+        numbers = index.lookup_many(ips)
+
+        assert [index.subnets[n] if n >= 0 else None for n in numbers] == [index.lookup(ip) for ip in ips]
+        assert list(index.interfaces_for(ips[:4])) == ['vlan10', 'vlan20', 'vlan10', None]
+
+    def test_later_prefixes_recompile(self):
+        index = SubnetIndex()
+        assert index.lookup('10.0.0.1') is None
+
+        index.add('10.0.0.0/8', 'internal', 'interface')
+
+        assert list(index.lookup_many(['10.0.0.1'])) == [0]
+
+
+@pytest.mark.unit
+class TestInterfaceAttribution:
+    """Test filling in endpoint interfaces from the index"""
+
+    def test_only_unknown_interfaces_are_filled(self):
+        builder = EndpointTableBuilder().extend([
+            {'mac': '00:00:00:00:00:01', 'ip': '10.1.4.4'},
+            {'mac': '00:00:00:00:00:02', 'ip': '10.2.4.4', 'detected_interface': 'vlan10'},
+            {'mac': '00:00:00:00:00:03', 'ip': '8.8.8.8'},
+            {'mac': '00:00:00:00:00:04'},
+        ])
+
+        assert builder.attribute_interfaces(fortigate_index().interfaces_for) == 1
+        assert builder.build().count_by('interface') == {'vlan10': 2, 'Unknown': 2}
+
+    def test_builder_attributes_endpoints_by_subnet(self):
+        fleet = SyntheticFleet(switches=2, aps=4, endpoints=120)
+        fleet.endpoint = lambda i, endpoint=fleet.endpoint: {
+            key: value for key, value in endpoint(i).items() if key != 'detected_interface'}
+
+        builder = NetworkTopologyBuilder(None)
+
+        async def build(client):
+            builder.api_client = client
+            return await builder.build_topology_async()
+
+        topology = asyncio.run(run_against(FortiGateSimulator(fleet), build))
+
+        assert topology['metadata']['subnets']['attributed_endpoints'] == 120
+        assert topology['metadata']['subnets']['address_prefixes'] == 10
+        assert builder.endpoint_table.count_by('interface')['vlan20'] == 12
+        assert builder.subnets.lookup('10.103.0.5').name == 'vlan30-servers'
@@ -0,0 +1,182 @@
+"""
+Tests for physical link correlation
+Switch MAC tables joined with ARP and DHCP into endpoint -> switch port -> uplink -> FortiGate edges
+"""
+
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from endpoint_table import EndpointTableBuilder
+from enhanced_fortigate_client import EnhancedFortiGateClient
+from fortigate_api_integration import NetworkTopologyBuilder
+from fortigate_common.correlation import PhysicalIndex, PortLocation, Uplink, normalize_mac
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+from tests.test_fortigate_simulator import run_against
+
+GATEWAY_MAC = '02:f0:00:00:00:01'
+
+
+def learned(mac, switch, port, vlan=10):
+    return {'mac': mac, 'switch_id': switch, 'port_name': port, 'vlan_id': vlan}
+
+
+def tiered_mac_table():
+    """SW2 hangs off SW1 port10; a and b sit on SW2, c on SW1"""
+    return [
+        learned(GATEWAY_MAC, 'SW1', 'port49', 4094),
+        learned(GATEWAY_MAC, 'SW2', 'port25', 4094),
+        learned('00:00:00:00:00:0a', 'SW1', 'port10'),
+        learned('00:00:00:00:00:0b', 'SW1', 'port10'),
+        learned('00:00:00:00:00:0a', 'SW2', 'port3'),
+        learned('00:00:00:00:00:0b', 'SW2', 'port4'),
+        learned('00:00:00:00:00:0c', 'SW1', 'port1'),
+        # c also crosses SW2's uplink, which never places anything
+        learned('00:00:00:00:00:0c', 'SW2', 'port25'),
+    ]
+
+
+@pytest.mark.unit
+class TestPhysicalIndex:
+    """Test the MAC/IP hash joins"""
+
+    def test_macs_are_placed_on_their_access_ports(self):
+        index = PhysicalIndex(tiered_mac_table(), gateway_macs={GATEWAY_MAC: 'interface_fortilink'})
+
+        assert index.locate('00:00:00:00:00:0a') == PortLocation('SW2', 'port3', 10)
+        assert index.locate('00-00-00-00-00-0B') == PortLocation('SW2', 'port4', 10)
+        assert index.locate('0000.0000.000c') == PortLocation('SW1', 'port1', 10)
+        assert index.locate('00:00:00:00:00:0d') is None
+
+    def test_tiered_switches_hang_off_their_parent(self):
+        index = PhysicalIndex(tiered_mac_table(), gateway_macs={GATEWAY_MAC: 'interface_fortilink'})
+
+        assert index.uplink('SW2') == Uplink(port='port25', parent='SW1', parent_port='port10')
+        assert index.uplink('SW1') == Uplink(port='port49', gateway='interface_fortilink')
+        assert index.uplink('SW9') is None
+        assert index.summary() == {'mac_entries': 8, 'switches': 2, 'located_macs': 3, 'hosts': 0,
+                                   'tiered_switches': 1}
+
+    def test_arp_and_leases_join_on_mac_and_ip(self):
+        index = PhysicalIndex(
+            tiered_mac_table(),
+            arp=[{'ip': '10.0.0.11', 'mac': '00:00:00:00:00:0A', 'interface': 'vlan10'}],
+            leases=[{'ip': '10.0.0.99', 'mac': '00:00:00:00:00:0a', 'hostname': 'printer'},
+                    {'ip': '10.0.0.12', 'mac': '00:00:00:00:00:0b'}]
+        )
+
+        assert index.host('00:00:00:00:00:0a') == {'ip': '10.0.0.11', 'hostname': 'printer', 'interface': 'vlan10'}
+        assert index.locate(ip='10.0.0.12') == PortLocation('SW2', 'port4', 10), "Devices without a MAC join on IP"
+        assert index.locate(ip='10.0.0.13') is None
+
+    def test_invalid_entries_are_skipped(self):
+        index = PhysicalIndex([{'mac': 'not-a-mac', 'switch_id': 'SW1', 'port_name': 'port1'},
+                               {'mac': '00:00:00:00:00:01', 'port_name': 'port1'}], arp=[{'ip': '10.0.0.1'}])
+
+        assert (index.entries, index.locations, index.hosts) == (0, {}, {})
+        assert normalize_mac(None) == ''
+
+    def test_endpoint_table_takes_ports_from_the_index(self):
+        builder = EndpointTableBuilder().extend([
+            {'mac': '00:00:00:00:00:0a', 'fortiswitch_id': 'SW1', 'fortiswitch_port_name': 'port10'},
+            {'mac': '00:00:00:00:00:0d', 'ip': '10.0.0.13'},
+        ])
+        index = PhysicalIndex(tiered_mac_table(), gateway_macs={GATEWAY_MAC: 'interface_fortilink'})
+
+        assert builder.locate_ports(index.locate) == 1
+        table = builder.build()
+        assert (table.row(0)['switch'], table.row(0)['switch_port']) == ('SW2', 'port3')
+        assert (table.row(1)['switch'], table.row(1)['switch_port']) == ('Unknown', 'Unknown')
+
+
+@pytest.mark.unit
+class TestBuilderPhysicalLinks:
+    """Test the edges NetworkTopologyBuilder emits from the simulator's MAC tables"""
+
+    def build(self, fleet):
+        return asyncio.run(run_against(FortiGateSimulator(fleet),
+                                       lambda client: NetworkTopologyBuilder(client).build_topology_async()))
+
+    def test_endpoints_reach_the_fortigate_through_ports_and_uplinks(self):
+        topology = self.build(SyntheticFleet(switches=2, aps=2, endpoints=30, wireless_ratio=0))
+
+        parent = {link['target']: link for link in topology['connections']}
+        endpoints = [device['id'] for device in topology['devices'] if device['type'] == 'endpoint']
+        assert len(endpoints) == 30
+        for endpoint in endpoints:
+            port, uplink = parent[endpoint], parent[parent[endpoint]['source']]
+            assert (port['type'], port['port']) == ('switch_port', f"port{1 + int(endpoint[-2:], 16) % 24}")
+            assert (uplink['type'], uplink['source']) == ('fortilink', 'interface_fortilink')
+            assert parent['interface_fortilink']['source'] == 'fortigate_main'
+        assert {parent[f'ap_AP0000{i}']['source'] for i in range(2)} == {'switch_SW0000', 'switch_SW0001'}
+        assert topology['metadata']['physical_links']['located_macs'] == 32
+
+    def test_wireless_endpoints_link_to_their_ap(self):
+        topology = self.build(SyntheticFleet(switches=1, aps=2, endpoints=10))
+
+        sources = {link['target']: link['source'] for link in topology['connections'] if link['type'] == 'wifi'}
+        assert sources['device_02_10_00_00_00_03'] == 'ap_AP00001'
+
+    def test_without_mac_tables_links_stay_on_the_fortigate(self):
+        fleet = SyntheticFleet(switches=1, aps=0, endpoints=3, wireless_ratio=0)
+        simulator = FortiGateSimulator(fleet)
+        simulator.routes = lambda original=simulator.routes: {
+            path: handler for path, handler in original().items() if 'detected-device' not in path}
+
+        topology = asyncio.run(run_against(simulator, lambda client: NetworkTopologyBuilder(client).build_topology_async()))
+
+        assert {link['source'] for link in topology['connections']} == {'fortigate_main'}
+
+
+@pytest.mark.unit
+class TestEnhancedClientPhysicalLinks:
+    """Test get_complete_topology's switches and edges"""
+
+    def make_client(self):
+        client = EnhancedFortiGateClient('192.0.2.1', 'token', raw='none')
+        responses = {
+            'system/status': {'status': 'success', 'hostname': 'FG-LAB'},
+            'wifi/managed_ap/select': {'status': 'success', 'results': [
+                {'serial': 'FP1', 'name': 'AP1', 'ethernet_mac': '00:00:00:00:00:0c'}]},
+            'system/interface': {'status': 'success', 'results': [
+                {'name': 'fortilink', 'status': 'up', 'mac': GATEWAY_MAC}]},
+        }
+        tables = {
+            'user/device/query': [{'mac': '00:00:00:00:00:0a', 'hostname': 'laptop'},
+                                  {'mac': '00:00:00:00:00:0e', 'hostname': 'phone'}],
+            'switch-controller/detected-device': tiered_mac_table(),
+            'network/arp': [{'ip': '10.0.0.11', 'mac': '00:00:00:00:00:0a', 'interface': 'vlan10'}],
+            'system/dhcp/lease': [],
+        }
+        client._make_request = lambda endpoint, params=None, timeout=10, fields=None: responses[endpoint]
+        client._stream_results = lambda endpoint, params=None, timeout=10, fields=None: iter(
+            tables[endpoint] if params['start'] == 0 else [])
+        return client
+
+    def test_switches_and_edges_follow_the_mac_tables(self):
+        topology = self.make_client().get_complete_topology()
+
+        links = {link['target']: link for link in topology['connections']}
+        assert [switch['connected_to'] for switch in topology['switches']] == ['interface_fortilink', 'switch_SW1']
+        assert links['switch_SW2'] == {'source': 'switch_SW1', 'target': 'switch_SW2', 'type': 'uplink',
+                                       'bandwidth': 1000, 'port': 'port10'}
+        assert links['00:00:00:00:00:0a']['source'] == 'switch_SW2'
+        assert links['00:00:00:00:00:0e']['source'] == 'fortigate_main'
+        assert links['FP1'] == {'source': 'switch_SW1', 'target': 'FP1', 'type': 'switch_port', 'bandwidth': 0,
+                                'port': 'port1'}
+        assert topology['devices'][0]['ip'] == '10.0.0.11', "Filled in from ARP"
+        assert topology['metadata']['switches_count'] == 2
+
+    def test_switches_without_an_uplink_have_no_uplink_port(self):
+        index = PhysicalIndex(tiered_mac_table() + [learned('00:00:00:00:00:0f', 'SW3', 'port1')],
+                              gateway_macs={GATEWAY_MAC: 'interface_fortilink'})
+
+        switches = {switch.name: switch for switch in EnhancedFortiGateClient._physical_switches(index)}
+
+        assert (switches['SW1'].uplink_port, switches['SW2'].uplink_port) == ('port49', 'port25')
+        assert (switches['SW3'].uplink_port, switches['SW3'].connected_to) == ('', 'fortigate_main')
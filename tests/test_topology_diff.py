@@ -0,0 +1,140 @@
+"""
+Tests for the identity-keyed topology diff engine
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+import topology_diff
+from fortigate_common.records import FortiAPDetail, Link
+from topology_diff import TopologyIndex, apply_delta, diff_indexes, diff_topologies, is_empty, summarize
+
+
+def builder_topology(aps, endpoints=()):
+    """Topology in NetworkTopologyBuilder's shape; aps are (name, serial, status)"""
+    devices = [{'id': 'fortigate_main', 'type': 'firewall', 'serial': 'FG1'}]
+    devices += [{'id': f'ap_{name}', 'type': 'fortiap', 'name': name, 'serial': serial, 'status': status}
+                for name, serial, status in aps]
+    devices += [{'id': f"device_{mac.replace(':', '_')}", 'type': 'endpoint', 'mac': mac, 'name': name}
+                for mac, name in endpoints]
+    connections = [{'source': 'fortigate_main', 'target': device['id'], 'type': 'link', 'bandwidth': 0}
+                   for device in devices[1:]]
+    return {'devices': devices, 'connections': connections, 'metadata': {'last_updated': 'now'}}
+
+
+def normalized(topology):
+    """Comparable form: record order and volatile metadata ignored"""
+    result = {
+        name: sorted(map(repr, value)) if isinstance(value, list) else value
+        for name, value in topology.items()
+    }
+    result['metadata'] = {k: v for k, v in result.get('metadata', {}).items() if k != 'last_updated'}
+    return result
+
+
+@pytest.mark.unit
+class TestStableIdentity:
+    """Devices are matched by serial, MAC or interface name rather than display id"""
+
+    def test_renamed_ap_is_a_change_not_a_replacement(self):
+        old = builder_topology([('AP1', 'FP001', 'online')])
+        new = builder_topology([('Lobby', 'FP001', 'online')])
+
+        delta = diff_topologies(old, new)
+
+        assert delta['devices']['added'] == [] and delta['devices']['removed'] == []
+        assert delta['devices']['changed'] == [
+            {'id': 'ap_AP1', 'fields': {'id': 'ap_Lobby', 'name': 'Lobby'}}
+        ]
+        assert delta['connections']['changed'] == [
+            {'id': ['fortigate_main', 'ap_AP1', 'link'], 'fields': {'target': 'ap_Lobby'}}
+        ]
+        assert normalized(apply_delta(old, delta)) == normalized(new)
+
+    def test_layout_stats_alone_are_not_a_change(self):
+        old = builder_topology([('AP1', 'FP001', 'online')])
+        new = builder_topology([('AP1', 'FP001', 'online')])
+        old['metadata']['layout'] = {'mode': 'full', 'moved': 2, 'iterations': 100}
+        new['metadata'].update(last_updated='later', layout={'mode': 'incremental', 'moved': 0, 'iterations': 30})
+
+        assert is_empty(diff_topologies(old, new))
+
+    def test_endpoints_are_keyed_by_mac(self):
+        old = builder_topology([], [('00:11:22:33:44:55', 'laptop')])
+        new = builder_topology([], [('00:11:22:33:44:55', 'laptop-renamed'), ('00:11:22:33:44:66', 'phone')])
+
+        counts = summarize(diff_topologies(old, new))
+
+        assert counts['devices'] == {'added': 1, 'removed': 0, 'changed': 1}
+        assert counts['connections'] == {'added': 1, 'removed': 0, 'changed': 0}
+
+    def test_interfaces_sharing_a_mac_are_keyed_by_name(self):
+        interfaces = [{'id': f'interface_{name}', 'name': name, 'mac': '00:09:0f:00:00:01', 'status': 'up'}
+                      for name in ('internal', 'vlan10', 'vlan20')]
+        old = {'interfaces': interfaces}
+        new = {'interfaces': interfaces[:2] + [dict(interfaces[2], status='down')]}
+
+        delta = diff_topologies(old, new)
+
+        assert delta['interfaces']['changed'] == [{'id': 'interface_vlan20', 'fields': {'status': 'down'}}]
+
+    def test_unknown_serials_fall_back_to_id(self):
+        old = builder_topology([('AP1', 'Unknown', 'online'), ('AP2', 'Unknown', 'online')])
+        new = builder_topology([('AP2', 'Unknown', 'online')])
+
+        assert diff_topologies(old, new)['devices']['removed'] == ['ap_AP1']
+
+
+@pytest.mark.unit
+class TestEnhancedTopology:
+    """The Enhanced client's sections, records and top-level entries are all diffed"""
+
+    def enhanced(self, ap_status, cpu, records=False):
+        aps = [FortiAPDetail(id='fortiap_FP001', name='AP1', serial='FP001', status=ap_status)]
+        links = [Link('fortigate_main', 'fortiap_FP001', 'wifi', 0)]
+        return {
+            'fortigate': {'id': 'fortigate_main', 'serial': 'FG1', 'cpu_usage': cpu},
+            'fortiaps': aps if records else [ap.to_dict() for ap in aps],
+            'devices': [],
+            'interfaces': [],
+            'connections': links if records else [link.to_dict() for link in links],
+            'metadata': {'last_updated': str(cpu), 'fortiaps_count': 1}
+        }
+
+    def test_records_and_top_level_values(self):
+        old = self.enhanced('online', 10, records=True)
+        new = self.enhanced('offline', 20)
+
+        delta = diff_topologies(old, new)
+
+        assert delta['fortiaps']['changed'] == [{'id': 'fortiap_FP001', 'fields': {'status': 'offline'}}]
+        assert delta['replace'] == {'fortigate': new['fortigate']}, "last_updated alone is not a change"
+        assert normalized(apply_delta(self.enhanced('online', 10), delta)) == normalized(new)
+
+    def test_identical_topologies(self):
+        assert is_empty(diff_topologies(self.enhanced('online', 10, records=True), self.enhanced('online', 10)))
+
+
+@pytest.mark.unit
+class TestIndexReuse:
+    """Hashing happens once per topology; unchanged records are skipped by hash"""
+
+    def test_reused_index_hashes_each_record_once(self, monkeypatch):
+        topologies = [
+            builder_topology([(f'AP{n}', f'FP{n:04d}', 'offline' if n == version else 'online') for n in range(200)])
+            for version in range(3)
+        ]
+        hashed = []
+        real_hash = topology_diff.content_hash
+        monkeypatch.setattr(topology_diff, 'content_hash', lambda record: hashed.append(1) or real_hash(record))
+
+        indexes = [TopologyIndex(topology) for topology in topologies]
+        deltas = [diff_indexes(old, new) for old, new in zip(indexes, indexes[1:])]
+
+        assert len(hashed) == 3 * (201 + 200 + 1)
+        assert [summarize(delta)['devices']['changed'] for delta in deltas] == [2, 2]
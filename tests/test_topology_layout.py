@@ -0,0 +1,240 @@
+"""
+Tests for the server-side force-directed layout
+Barnes-Hut repulsion against the exact sum, layout convergence, warm starts and builder positions
+"""
+
+import sys
+import asyncio
+import numpy as np
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from fortigate_api_integration import NetworkTopologyBuilder
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+from topology_layout import Octree, PositionCache, apply_layout, force_layout
+from fortigate_common.records import Firewall, Interface, Link
+from tests.test_fortigate_simulator import run_against
+
+
+def exact_repulsion(points, strength):
+    delta = points[:, None, :] - points[None, :, :]
+    distance2 = (delta * delta).sum(axis=2)
+    np.fill_diagonal(distance2, np.inf)
+    return (delta * (strength / distance2)[:, :, None]).sum(axis=1)
+
+
+def records(count):
+    """The FortiGate and count interfaces chained off it, as device and link records"""
+    devices = [Firewall('FG-LAB', 'FortiGate-60F', 'FGT60F0000000001', 'v7.4.3', '192.0.2.1')]
+    devices += [Interface(f'interface_port{i}', f'port{i}') for i in range(count)]
+    links = [Link(devices[i].id, devices[i + 1].id, 'physical') for i in range(count)]
+    return devices, links
+
+
+def positions_of(devices):
+    return {device.id: device.position for device in devices}
+
+
+def star_of_stars(hubs=6, leaves=8):
+    """Root 0, hubs 1..hubs, leaves hanging off each hub"""
+    edges = [(0, hub) for hub in range(1, hubs + 1)]
+    edges += [(1 + i % hubs, 1 + hubs + i) for i in range(hubs * leaves)]
+    return 1 + hubs + hubs * leaves, np.array(edges)
+
+
+@pytest.mark.unit
+class TestOctree:
+    """Test Barnes-Hut repulsion"""
+
+    def test_theta_zero_is_exact(self):
+        points = np.random.default_rng(1).normal(size=(300, 3)) * 5
+
+        force = Octree(points).repulsion(9.0, theta=0)
+
+        np.testing.assert_allclose(force, exact_repulsion(points, 9.0), rtol=1e-9, atol=1e-9)
+
+    def test_queries_feel_every_body(self):
+        points, queries = np.random.default_rng(3).normal(size=(2, 200, 3)) * 5
+
+        force = Octree(points).repulsion(9.0, theta=0, queries=queries)
+
+        exact = exact_repulsion(np.vstack([queries, points]), 9.0)[:200] - exact_repulsion(queries, 9.0)
+        np.testing.assert_allclose(force, exact, rtol=1e-9, atol=1e-9)
+
+    def test_approximation_stays_close(self):
+        points = np.random.default_rng(2).normal(size=(2000, 3)) * 5
+
+        force = Octree(points).repulsion(9.0)
+        exact = exact_repulsion(points, 9.0)
+
+        error = np.linalg.norm(force - exact, axis=1) / np.linalg.norm(exact, axis=1)
+        assert np.median(error) < 0.05
+
+    def test_coincident_points_stay_finite(self):
+        points = np.array([[0.0, 0, 0], [1, 1, 1], [1, 1, 1], [2, 0, 1]])
+
+        assert np.isfinite(Octree(points).repulsion(9.0)).all()
+
+
+@pytest.mark.unit
+class TestForceLayout:
+    """Test the layout simulation"""
+
+    def test_linked_nodes_end_up_closer(self):
+        count, edges = star_of_stars()
+
+        positions = force_layout(count, edges, pinned=[0])
+
+        linked = np.linalg.norm(positions[edges[:, 0]] - positions[edges[:, 1]], axis=1).mean()
+        distances = np.linalg.norm(positions[:, None] - positions[None], axis=2)
+        assert linked < distances[np.triu_indices(count, 1)].mean()
+        assert distances[np.triu_indices(count, 1)].min() > 0.5, "Repulsion keeps nodes apart"
+        assert positions[0].tolist() == [0, 0, 0], "Pinned nodes stay put"
+
+    def test_same_graph_and_seed_give_the_same_layout(self):
+        count, edges = star_of_stars()
+
+        assert np.array_equal(force_layout(count, edges, [0], seed=3), force_layout(count, edges, [0], seed=3))
+        assert not np.array_equal(force_layout(count, edges, [0], seed=3), force_layout(count, edges, [0], seed=4))
+
+    def test_only_movable_nodes_move(self):
+        count, edges = star_of_stars()
+        initial = force_layout(count, edges, [0])
+        movable = np.zeros(count, dtype=bool)
+        movable[[7, 8]] = True
+
+        positions = force_layout(count, edges, [0], initial, iterations=20, movable=movable)
+
+        assert np.array_equal(positions[~movable], initial[~movable])
+        assert not np.array_equal(positions[movable], initial[movable])
+
+    def test_tiny_graphs(self):
+        assert force_layout(0, np.zeros((0, 2))).shape == (0, 3)
+        assert force_layout(1, np.zeros((0, 2))).tolist() == [[0, 0, 0]]
+
+
+@pytest.mark.unit
+class TestBuilderLayout:
+    """Test the positions the builder emits"""
+
+    def build(self, iterations=NetworkTopologyBuilder.LAYOUT_ITERATIONS):
+        builder = NetworkTopologyBuilder(None)
+        builder.LAYOUT_ITERATIONS = iterations
+
+        async def build(client):
+            builder.api_client = client
+            return await builder.build_topology_async()
+
+        topology = asyncio.run(run_against(FortiGateSimulator(SyntheticFleet(switches=3, aps=6, endpoints=30)), build))
+        return builder, topology
+
+    def test_devices_are_laid_out_around_the_fortigate(self):
+        builder, topology = self.build()
+
+        positions = {device['id']: device['position'] for device in topology['devices']}
+        assert positions['fortigate_main'] == {'x': 0.0, 'y': 0.0, 'z': 0.0}
+        assert len({tuple(position.values()) for position in positions.values()}) == len(positions)
+        assert topology['metadata']['layout'] == {'engine': 'barnes_hut', 'mode': 'full', 'nodes': len(positions),
+                                                  'links': len(topology['connections']), 'moved': len(positions),
+                                                  'iterations': builder.LAYOUT_ITERATIONS}
+        models = builder.export_to_babylon_format()['models']
+        assert {model['name']: model['position'] for model in models} == positions
+
+    def test_zero_iterations_keep_fixed_offsets(self):
+        _, topology = self.build(iterations=0)
+
+        switch = next(device for device in topology['devices'] if device['type'] == 'switch')
+        assert switch['position'] == {'x': -3, 'y': 0, 'z': 0}
+        assert 'layout' not in topology['metadata']
+
+    def test_rebuilds_keep_cached_positions(self):
+        cache = PositionCache()
+        builder = NetworkTopologyBuilder(None, position_cache=cache)
+
+        async def build(client):
+            builder.api_client = client
+            return await builder.build_topology_async()
+
+        simulator = FortiGateSimulator(SyntheticFleet(switches=3, aps=6, endpoints=30))
+        first = asyncio.run(run_against(simulator, build))
+        second = asyncio.run(run_against(simulator, build))
+
+        assert second['devices'] == first['devices']
+        assert second['metadata']['layout']['mode'] == 'unchanged'
+        assert len(cache) == len(first['devices'])
+
+
+@pytest.mark.unit
+class TestWarmStart:
+    """Test incremental layouts from a position cache"""
+
+    def test_unchanged_topology_is_not_laid_out(self):
+        cache = PositionCache()
+        devices, links = records(20)
+        apply_layout(devices, links, cache=cache)
+        before = positions_of(devices)
+
+        devices, links = records(20)
+        summary = apply_layout(devices, links, cache=cache)
+
+        assert positions_of(devices) == before
+        assert (summary['mode'], summary['moved'], summary['iterations']) == ('unchanged', 0, 0)
+
+    def test_new_device_moves_only_it_and_its_neighbour(self):
+        cache = PositionCache()
+        devices, links = records(20)
+        apply_layout(devices, links, cache=cache)
+        before = positions_of(devices)
+
+        devices, links = records(21)
+        summary = apply_layout(devices, links, cache=cache, relax_iterations=10)
+
+        after = positions_of(devices)
+        assert {device_id for device_id in after if after[device_id] != before.get(device_id)} == \
+            {'interface_port19', 'interface_port20'}
+        assert (summary['mode'], summary['moved'], summary['iterations']) == ('incremental', 2, 10)
+
+    def test_removed_device_relaxes_its_former_neighbours(self):
+        cache = PositionCache()
+        devices, links = records(20)
+        apply_layout(devices, links, cache=cache)
+        before = positions_of(devices)
+
+        # Drop port10 and close the chain around it
+        devices, links = records(20)
+        del devices[11]
+        links = links[:10] + [Link('interface_port9', 'interface_port11', 'physical')] + links[12:]
+        summary = apply_layout(devices, links, cache=cache)
+
+        after = positions_of(devices)
+        assert {device_id for device_id in after if after[device_id] != before[device_id]} <= \
+            {'interface_port9', 'interface_port11'}
+        assert summary['moved'] == 2
+        assert 'interface_port10' not in cache.positions
+
+    def test_cache_persists_across_restarts(self, tmp_path):
+        path = tmp_path / 'layout' / 'positions.json'
+        devices, links = records(10)
+        apply_layout(devices, links, cache=PositionCache(str(path)))
+
+        cache = PositionCache(str(path))
+        restored, links = records(10)
+        summary = apply_layout(restored, links, cache=cache)
+
+        assert positions_of(restored) == positions_of(devices)
+        assert summary['mode'] == 'unchanged'
+
+    def test_unreadable_cache_file_is_ignored(self, tmp_path):
+        path = tmp_path / 'positions.json'
+        path.write_text('{"positions": [1, 2')
+
+        cache = PositionCache(str(path))
+        devices, links = records(5)
+        summary = apply_layout(devices, links, cache=cache)
+
+        assert summary['mode'] == 'full'
+        assert PositionCache(str(path)).positions == cache.positions
@@ -0,0 +1,159 @@
+"""
+Tests for level-of-detail endpoint grouping
+Grouping by attachment point, the builder's grouped topology and on-demand expansion
+"""
+
+import sys
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from endpoint_table import EndpointTable
+from fortigate_api_integration import AsyncFortiGateAPIClient, NetworkTopologyBuilder
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+from python_api_service import PythonAPIService
+from topology_lod import group_endpoints
+from tests.test_fortigate_simulator import run_against
+
+
+def endpoint(i, online=True, **attachment):
+    return {'mac': f'00:00:00:00:00:{i:02x}', 'hostname': f'host-{i}', 'ip': f'10.0.0.{i}',
+            'hardware_type': 'Phone' if i % 2 else 'Laptop', 'is_online': online, 'last_seen': 1000 + i,
+            **attachment}
+
+
+@pytest.mark.unit
+class TestGroupEndpoints:
+    """Test grouping an endpoint table by attachment point"""
+
+    def test_groups_by_most_specific_attachment(self):
+        table = EndpointTable.from_records([
+            endpoint(1, fortiap_name='AP1', fortiswitch_id='SW1', detected_interface='vlan10'),
+            endpoint(2, fortiap_name='AP1', online=False),
+            endpoint(3, fortiswitch_id='SW1', fortiswitch_port_name='port3', detected_interface='vlan10'),
+            endpoint(4, detected_interface='vlan10'),
+            endpoint(5, detected_interface='wan1'),
+            endpoint(6),
+        ])
+
+        groups = group_endpoints(table, access_points={'AP1': 'ap_AP1'}, switches={'SW1': 'switch_SW1'},
+                                 interfaces={'vlan10': 'interface_vlan10'}, vlans={'vlan10'})
+        by_id = {group.id: group for group in groups.groups}
+
+        assert {group_id: (group.kind, group.count, group.connected_to) for group_id, group in by_id.items()} == {
+            'group_ap_AP1': ('access_point', 2, 'ap_AP1'),
+            'group_port_SW1_port3': ('switch_port', 1, 'switch_SW1'),
+            'group_if_vlan10': ('vlan', 1, 'interface_vlan10'),
+            'group_if_wan1': ('interface', 1, 'fortigate_main'),
+            'group_unassigned': ('unassigned', 1, 'fortigate_main'),
+        }
+        ap = by_id['group_ap_AP1'].to_dict()['metadata']
+        assert (ap['online'], ap['offline'], ap['health'], ap['last_seen']) == (1, 1, 'degraded', 1002.0)
+        assert ap['device_types'] == {'Phone': 1, 'Laptop': 1}
+
+    def test_expand_pages_members_under_the_parent(self):
+        table = EndpointTable.from_records([endpoint(i, fortiap_name='AP1') for i in range(10)])
+        groups = group_endpoints(table, access_points={'AP1': 'ap_AP1'})
+
+        page = groups.expand('group_ap_AP1', offset=4, limit=3)
+
+        assert page['total'] == 10 and page['offset'] == 4
+        assert [device['name'] for device in page['devices']] == ['host-4', 'host-5', 'host-6']
+        assert page['devices'][0]['ip'] == '10.0.0.4'
+        assert {link['source'] for link in page['connections']} == {'ap_AP1'}
+        assert groups.expand('group_ap_missing') is None
+
+    def test_expanded_members_surround_the_group_node(self):
+        table = EndpointTable.from_records([endpoint(i, fortiap_name='AP1') for i in range(10)])
+        groups = group_endpoints(table, access_points={'AP1': 'ap_AP1'})
+        groups.get('group_ap_AP1').position = {'x': 40.0, 'y': -12.0, 'z': 7.0}
+
+        devices = groups.expand('group_ap_AP1')['devices']
+        paged = groups.expand('group_ap_AP1', offset=4, limit=3)['devices']
+
+        positions = [(d['position']['x'], d['position']['y'], d['position']['z']) for d in devices]
+        assert len(set(positions)) == 10
+        for x, y, z in positions:
+            assert ((x - 40) ** 2 + (y + 12) ** 2 + (z - 7) ** 2) ** 0.5 == pytest.approx(0.5 * 10 ** 0.5, abs=0.01)
+        assert [d['position'] for d in paged] == [d['position'] for d in devices[4:7]]
+
+
+@pytest.mark.unit
+class TestBuilderLevelOfDetail:
+    """Test that large sites are represented completely"""
+
+    def test_large_site_is_complete_and_grouped(self):
+        fleet = SyntheticFleet(switches=30, aps=60, endpoints=2500)
+        builder = None
+
+        async def build(client):
+            nonlocal builder
+            builder = NetworkTopologyBuilder(client)
+            return await builder.build_topology_async()
+
+        topology = asyncio.run(run_against(FortiGateSimulator(fleet), build))
+
+        by_type = {}
+        for device in topology['devices']:
+            by_type.setdefault(device['type'], []).append(device)
+        ids = {device['id'] for device in topology['devices']}
+        groups = by_type['endpoint_group']
+        assert (len(by_type['switch']), len(by_type['access_point'])) == (30, 60), "No caps on infrastructure"
+        assert 'endpoint' not in by_type
+        assert sum(group['metadata']['count'] for group in groups) == 2500
+        assert all(group['connected_to'] in ids for group in groups)
+        assert {group['kind'] for group in groups} == {'access_point', 'switch_port'}
+        assert topology['metadata']['level_of_detail'] == {'endpoints': 'grouped', 'endpoint_groups': len(groups)}
+        assert builder.endpoint_groups.expand(groups[0]['id'])['total'] == groups[0]['metadata']['count']
+
+    def test_small_site_keeps_individual_endpoints(self):
+        topology = asyncio.run(run_against(FortiGateSimulator(SyntheticFleet(endpoints=20)),
+                                           lambda client: NetworkTopologyBuilder(client).build_topology_async()))
+
+        endpoints = [device for device in topology['devices'] if device['type'] == 'endpoint']
+        assert len(endpoints) == 20
+        assert topology['metadata']['level_of_detail']['endpoints'] == 'individual'
+
+
+@pytest.mark.unit
+class TestGroupEndpoint:
+    """Test /topology/groups/{group_id}"""
+
+    def test_expands_groups_of_the_current_snapshot(self):
+        async def scenario():
+            fortigate = TestServer(FortiGateSimulator(SyntheticFleet(aps=4, endpoints=400)).app())
+            await fortigate.start_server()
+            service = PythonAPIService()
+            service.forti_client = AsyncFortiGateAPIClient(host='127.0.0.1', api_token='token')
+            service.forti_client.base_url = str(fortigate.make_url('')).rstrip('/')
+            await service.start()
+
+            app = web.Application()
+            app.router.add_get('/topology', service.get_topology)
+            app.router.add_get('/topology/groups/{group_id}', service.get_endpoint_group)
+            client = TestClient(TestServer(app))
+            await client.start_server()
+            try:
+                topology = await (await client.get('/topology')).json()
+                group = next(device for device in topology['devices'] if device['type'] == 'endpoint_group')
+                page = await client.get(f"/topology/groups/{group['id']}", params={'limit': 5})
+                missing = await client.get('/topology/groups/group_nope')
+                bad = await client.get(f"/topology/groups/{group['id']}", params={'offset': 'x'})
+                return group, page.status, await page.json(), page.headers, missing.status, bad.status
+            finally:
+                await client.close()
+                await service.stop()
+                await fortigate.close()
+
+        group, status, page, headers, missing, bad = asyncio.run(scenario())
+
+        assert status == 200 and headers['X-Topology-Version'] == '1'
+        assert page['total'] == group['metadata']['count'] and len(page['devices']) == 5
+        assert (missing, bad) == (404, 400)
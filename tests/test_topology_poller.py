@@ -0,0 +1,238 @@
+"""
+Tests for the background topology poller, pre-encoded snapshot responses and the API handlers
+"""
+
+import sys
+import gzip
+import json
+import asyncio
+import pytest
+from pathlib import Path
+
+# Add babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from fortigate_api_integration import AsyncFortiGateAPIClient
+from fortigate_simulator import FortiGateSimulator, SyntheticFleet
+from python_api_service import PythonAPIService
+from response_encoding import EncodedBody
+from topology_poller import TopologyPoller, TopologySnapshot
+from tests.test_async_fortigate_client import make_fortigate_app
+from tests.test_fortigate_simulator import run_against
+
+
+def counting_collect(fail_on=()):
+    calls = []
+
+    async def collect():
+        calls.append(len(calls) + 1)
+        if len(calls) in fail_on:
+            raise RuntimeError('FortiGate unreachable')
+        return {'topology': {'poll': len(calls)}}
+    return collect, calls
+
+
+@pytest.mark.unit
+class TestTopologyPoller:
+    """Test snapshot versioning and failure handling"""
+
+    def test_refresh_publishes_new_versions(self):
+        collect, _ = counting_collect()
+        poller = TopologyPoller(collect)
+
+        async def scenario():
+            first = await poller.refresh()
+            second = await poller.refresh()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+
+        assert (first.version, second.version) == (1, 2)
+        assert first['topology'] == {'poll': 1}, "Published snapshots are never updated in place"
+        assert poller.snapshot is second
+
+    def test_failed_refresh_keeps_previous_snapshot(self):
+        collect, _ = counting_collect(fail_on=(2,))
+        poller = TopologyPoller(collect)
+
+        async def scenario():
+            await poller.refresh()
+            return await poller.refresh()
+
+        assert asyncio.run(scenario()) is None
+        assert poller.snapshot.version == 1
+        assert poller.stats()['failures'] == 1
+        assert poller.last_error == 'FortiGate unreachable'
+
+    def test_snapshot_is_immutable(self):
+        snapshot = TopologySnapshot(1, {'topology': {}}, taken_at=0)
+
+        with pytest.raises(AttributeError):
+            snapshot.version = 2
+
+    def test_background_task_polls_on_schedule(self):
+        collect, calls = counting_collect()
+        poller = TopologyPoller(collect, interval=0.01)
+
+        async def scenario():
+            poller.start()
+            snapshot = await poller.wait_ready(timeout=1)
+            await asyncio.sleep(0.05)
+            await poller.stop()
+            return snapshot
+
+        assert asyncio.run(scenario()).version == 1
+        assert len(calls) >= 3
+        assert not poller.running
+
+
+@pytest.mark.unit
+class TestSnapshotService:
+    """Handlers serve the poller's snapshot without touching the FortiGate"""
+
+    async def run_service(self, scenario):
+        fortigate_app, state = make_fortigate_app()
+        fortigate = TestServer(fortigate_app)
+        await fortigate.start_server()
+
+        service = PythonAPIService()
+        service.config['fortigate']['poll_interval'] = 60
+        service.forti_client = AsyncFortiGateAPIClient(host='127.0.0.1', api_token='token')
+        service.forti_client.base_url = str(fortigate.make_url('')).rstrip('/')
+        await service.start()
+
+        app = web.Application()
+        app.router.add_get('/topology', service.get_topology)
+        app.router.add_get('/fortiaps', service.get_fortiaps)
+        app.router.add_get('/fortiswitches', service.get_fortiswitches)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            return await scenario(client, service, state)
+        finally:
+            await client.close()
+            await service.stop()
+            await fortigate.close()
+
+    def test_many_requests_cost_one_poll(self):
+        async def scenario(client, service, state):
+            responses = await asyncio.gather(*(client.get('/topology') for _ in range(10)))
+            requests_after_first_poll = state['requests']
+            aps = await client.get('/fortiaps')
+            switches = await client.get('/fortiswitches')
+            bodies = [await response.json() for response in responses]
+            return (responses, bodies, await aps.json(), await switches.json(),
+                    requests_after_first_poll, state['requests'])
+
+        responses, bodies, aps, switches, polled, total = asyncio.run(self.run_service(scenario))
+
+        assert all(response.status == 200 for response in responses)
+        assert {response.headers['X-Topology-Version'] for response in responses} == {'1'}
+        assert bodies[0]['devices'][0]['name'] == 'FG-LAB'
+        assert aps == [{'name': 'AP1', 'serial': 'A1'}]
+        assert switches == [{'name': 'SW1', 'serial': 'S1'}]
+        assert total == polled, "Handlers should be served from the snapshot"
+
+    def test_poll_fetches_each_collection_once(self):
+        simulator = FortiGateSimulator(SyntheticFleet(switches=2, aps=3, endpoints=20))
+        service = PythonAPIService()
+
+        async def collect(client):
+            service.forti_client = client
+            return await service._collect_snapshot()
+
+        snapshot = asyncio.run(run_against(simulator, collect))
+
+        assert len(snapshot['fortiswitches']) == 2 and len(snapshot['fortiaps']) == 3
+        assert simulator.requests['cmdb/switch-controller/managed-switch'] == 1
+        assert simulator.requests['monitor/wifi/managed_ap/select'] == 1
+
+    def test_unavailable_until_first_snapshot(self):
+        collect, _ = counting_collect(fail_on=(1,))
+        service = PythonAPIService()
+        service.config['fortigate']['first_snapshot_timeout'] = 0.01
+        service.poller = TopologyPoller(collect, interval=60)
+
+        async def scenario():
+            await service.poller.refresh()
+            return await service.get_topology(None)
+
+        response = asyncio.run(scenario())
+
+        assert response.status == 503
+        assert response.headers['Retry-After'] == '60'
+
+    def test_conditional_requests_and_compression(self):
+        async def scenario(client, service, state):
+            first = await client.get('/topology', headers={'Accept-Encoding': 'gzip'})
+            body = await first.read()
+            etag = first.headers['ETag']
+            again = await client.get('/topology', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            plain = await client.get('/topology', headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+            return first, body, again, plain
+
+        first, body, again, plain = asyncio.run(self.run_service(scenario))
+
+        assert first.status == 200
+        assert json.loads(body)['devices'][0]['name'] == 'FG-LAB'
+        assert again.status == 304
+        assert plain.status == 304, "Any representation of unchanged content is not modified"
+
+    def test_unchanged_fleet_keeps_its_etag_across_polls(self):
+        async def scenario(client, service, state):
+            first = await client.get('/topology')
+            await first.read()
+            await service.poller.refresh()
+            again = await client.get('/topology', headers={'If-None-Match': first.headers['ETag']})
+            return first, again
+
+        first, again = asyncio.run(self.run_service(scenario))
+
+        assert first.headers['X-Topology-Version'] == '1'
+        assert again.status == 304, "A new poll of the same fleet is not a modification"
+        assert again.headers['X-Topology-Version'] == '2'
+
+
+@pytest.mark.unit
+class TestEncodedBody:
+    """Test variant selection and ETag matching"""
+
+    payload = {'devices': [{'name': f'AP{n}', 'status': 'online'} for n in range(100)]}
+
+    def test_variants_decode_to_the_same_payload(self):
+        encoded = EncodedBody(self.payload)
+
+        assert json.loads(encoded.identity) == self.payload
+        assert json.loads(gzip.decompress(encoded.variants['gzip'])) == self.payload
+        assert len(encoded.variants['gzip']) < len(encoded.identity)
+
+    def test_small_bodies_are_not_compressed(self):
+        encoded = EncodedBody([])
+
+        assert encoded.variants == {}
+        assert encoded.choose_encoding('gzip, br') is None
+
+    def test_choose_encoding_respects_q_zero(self):
+        encoded = EncodedBody(self.payload)
+
+        assert encoded.choose_encoding('gzip;q=0, deflate') is None
+        assert encoded.choose_encoding('deflate, gzip') == 'gzip'
+
+    def test_etag_matching(self):
+        encoded = EncodedBody(self.payload)
+
+        assert encoded.not_modified(f'"other", {encoded.etag("gzip")}')
+        assert encoded.not_modified(f'W/{encoded.etag()}')
+        assert not encoded.not_modified('"other"')
+        assert encoded.etag() == EncodedBody(dict(self.payload)).etag(), "ETags depend only on content"
+
+    def test_tag_payload_gives_a_weak_etag(self):
+        first = EncodedBody({**self.payload, 'built': 1}, tag_payload=self.payload)
+        second = EncodedBody({**self.payload, 'built': 2}, tag_payload=self.payload)
+
+        assert first.identity != second.identity
+        assert first.etag() == second.etag() and first.etag().startswith('W/')
+        assert second.not_modified(first.etag('gzip'))
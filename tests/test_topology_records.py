@@ -0,0 +1,127 @@
+"""
+Tests for the slotted topology record types
+Records must serialize to the exact dict shape the builders emitted before
+"""
+
+import sys
+import json
+import tracemalloc
+import pytest
+from pathlib import Path
+
+# Add project root and babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+import fortigate_common.records as records
+# The root-level clients import the same module as babylon_3d.fortigate_common.records
+import babylon_3d.fortigate_common.records as client_records
+from enhanced_fortigate_client import EnhancedFortiGateClient
+from fortigate_api_integration import NetworkTopologyBuilder
+from tests.test_paging import FakePagedClient
+
+
+def endpoint_dict(i):
+    """Builder endpoint in the original dict shape"""
+    return {
+        "id": f"device_00_00_00_00_00_{i:02x}",
+        "name": f"host-{i}",
+        "type": "endpoint",
+        "ip": f"10.0.0.{i % 250}",
+        "mac": f"00:00:00:00:00:{i:02x}",
+        "position": {"x": 5, "y": 0, "z": i * 0.5},
+        "connected_to": "fortigate_main",
+        "metadata": {"os": "Windows", "user": "Unknown", "last_seen": "", "device_type": "Laptop"}
+    }
+
+
+def endpoint_record(i):
+    return records.Endpoint(
+        id=f"device_00_00_00_00_00_{i:02x}", name=f"host-{i}", ip=f"10.0.0.{i % 250}",
+        mac=f"00:00:00:00:00:{i:02x}", z=i * 0.5, os="Windows", device_type="Laptop"
+    )
+
+
+def allocated(factory, count):
+    tracemalloc.start()
+    try:
+        items = [factory(i) for i in range(count)]
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del items
+    return size
+
+
+@pytest.mark.unit
+class TestTopologyRecords:
+    """Test record serialization and footprint"""
+
+    def test_endpoint_matches_dict_shape(self):
+        assert endpoint_record(7).to_dict() == endpoint_dict(7)
+        assert json.loads(endpoint_record(7).to_json()) == endpoint_dict(7)
+        assert list(endpoint_record(7).to_dict()) == list(endpoint_dict(7)), "Key order is part of the shape"
+
+    def test_records_have_no_instance_dict(self):
+        for record in (endpoint_record(1), records.Link('a', 'b', 'wifi'),
+                       records.EndpointDetail(id='00:11:22:33:44:55')):
+            assert not hasattr(record, '__dict__')
+
+    def test_switch_uplink_only_when_known(self):
+        assert 'uplink_port' not in records.ManagedSwitch('switch_SW1', 'SW1').to_dict()['metadata']
+        switch = records.ManagedSwitch('switch_SW1', 'SW1', uplink_port='port49', mac_count=12)
+        assert switch.to_dict()['metadata'] == {
+            'status': 'unknown', 'ports': 0, 'firmware': 'Unknown', 'uplink_port': 'port49', 'mac_count': 12
+        }
+
+    def test_records_use_less_memory_than_dicts(self):
+        assert allocated(endpoint_record, 2000) < allocated(endpoint_dict, 2000) / 2
+
+    def test_builder_returns_dicts_or_records(self):
+        builder = NetworkTopologyBuilder(FakePagedClient(endpoint_count=3))
+        topology = builder.build_topology(as_records=True)
+
+        assert all(isinstance(d, records.TopologyRecord) for d in topology['devices'])
+        assert builder.to_dict()['devices'] == [d.to_dict() for d in topology['devices']]
+        assert json.loads(builder.to_json())['connections'][0] == {
+            'source': 'fortigate_main', 'target': 'device_00_00_00_00_00_00', 'type': 'endpoint', 'bandwidth': 100
+        }
+        assert builder.export_to_babylon_format()['models'][0]['category'] == 'firewall'
+
+
+@pytest.mark.unit
+class TestEnhancedClientRecords:
+    """The Enhanced client keeps its dict output and can hand out records"""
+
+    def make_client(self):
+        client = EnhancedFortiGateClient('192.0.2.1', 'token', raw='none')
+        responses = {
+            'system/status': {'status': 'success', 'hostname': 'FG-LAB'},
+            'wifi/managed_ap/select': {'status': 'success', 'results': [{'serial': 'FP1', 'name': 'AP1', 'state': 'online'}]},
+            'system/interface': {'status': 'success', 'results': [{'name': 'wan1', 'status': 'up', 'speed': 1000}]},
+        }
+        client._make_request = lambda endpoint, params=None, timeout=10, fields=None: responses[endpoint]
+        client._stream_results = lambda endpoint, params=None, timeout=10, fields=None: iter(
+            [{'mac': '00:11:22:33:44:55', 'hostname': 'laptop'}] if params['start'] == 0 else []
+        )
+        return client
+
+    def test_complete_topology_shape(self):
+        topology = self.make_client().get_complete_topology()
+
+        assert topology['fortiaps'][0]['status'] == 'online'
+        assert topology['devices'][0] == {
+            'id': '00:11:22:33:44:55', 'name': 'laptop', 'mac': '00:11:22:33:44:55', 'ip': '', 'type': 'endpoint',
+            'user': 'Unknown', 'device_type': 'Unknown', 'os': 'Unknown', 'vdom': 'root', 'last_seen': 0,
+            'online': False, 'auth_user': '', 'auth_group': '', 'interface': '', 'traffic_stats': {}, 'metadata': {}
+        }
+        assert topology['connections'][-1] == {
+            'source': 'fortigate_main', 'target': 'interface_wan1', 'type': 'network', 'bandwidth': 1000
+        }
+
+    def test_complete_topology_records(self):
+        topology = self.make_client().get_complete_topology(records=True)
+
+        assert isinstance(topology['fortiaps'][0], client_records.FortiAPDetail)
+        assert isinstance(topology['connections'][0], client_records.Link)
+        assert topology['interfaces'][0].status is sys.intern('up')
@@ -0,0 +1,215 @@
+"""
+Tests for topology deltas and the snapshot/delta stream
+"""
+
+import sys
+import json
+import asyncio
+import threading
+import pytest
+from pathlib import Path
+
+# Add babylon_3d to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'babylon_3d'))
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from topology_diff import apply_delta, diff_topologies, is_empty
+from topology_poller import TopologyPoller
+from topology_stream import TopologyStreamer
+
+
+def topology(*aps, metadata=None):
+    devices = [{'id': 'fortigate_main', 'type': 'firewall', 'status': 'online'}]
+    devices += [{'id': f'ap_{name}', 'type': 'fortiap', 'status': status} for name, status in aps]
+    connections = [{'source': 'fortigate_main', 'target': f'ap_{name}', 'type': 'wifi', 'bandwidth': 0} for name, _ in aps]
+    return {'devices': devices, 'connections': connections,
+            'metadata': dict(metadata or {}, last_updated=str(len(aps)))}
+
+
+def by_key(topology_dict):
+    return ({d['id']: d for d in topology_dict['devices']},
+            {(c['source'], c['target'], c['type']): c for c in topology_dict['connections']})
+
+
+def scripted_poller(*topologies):
+    """Poller whose successive refreshes publish the given topologies"""
+    remaining = list(topologies)
+
+    async def collect():
+        return {'topology': remaining.pop(0)}
+    return TopologyPoller(collect, interval=60)
+
+
+@pytest.mark.unit
+class TestTopologyDiff:
+    """Test delta computation and application"""
+
+    def test_reports_added_removed_and_changed(self):
+        old = topology(('AP1', 'online'), ('AP2', 'online'))
+        new = topology(('AP1', 'offline'), ('AP3', 'online'))
+
+        delta = diff_topologies(old, new)
+
+        assert [d['id'] for d in delta['devices']['added']] == ['ap_AP3']
+        assert delta['devices']['removed'] == ['ap_AP2']
+        assert delta['devices']['changed'] == [{'id': 'ap_AP1', 'fields': {'status': 'offline'}}]
+        assert delta['connections']['removed'] == [['fortigate_main', 'ap_AP2', 'wifi']]
+        assert by_key(apply_delta(old, delta)) == by_key(new)
+
+    def test_unset_fields_round_trip(self):
+        old = topology(('AP1', 'online'))
+        new = topology(('AP1', 'online'))
+        del new['devices'][1]['status']
+
+        delta = diff_topologies(old, new)
+
+        assert delta['devices']['changed'] == [{'id': 'ap_AP1', 'fields': {}, 'unset': ['status']}]
+        assert by_key(apply_delta(old, delta)) == by_key(new)
+
+    def test_volatile_metadata_is_not_a_change(self):
+        old = topology(('AP1', 'online'))
+        new = topology(('AP1', 'online'))
+        new['metadata']['last_updated'] = 'later'
+
+        assert is_empty(diff_topologies(old, new))
+        assert not is_empty(diff_topologies(old, topology(('AP1', 'online'), metadata={'site': 'HQ'})))
+
+
+@pytest.mark.unit
+class TestTopologyStreamer:
+    """Test snapshot/delta messages, coalescing and transports"""
+
+    def test_slow_consumer_gets_one_coalesced_delta(self):
+        poller = scripted_poller(
+            topology(('AP1', 'online')),
+            topology(('AP1', 'offline')),
+            topology(('AP1', 'offline'), ('AP2', 'online')),
+            topology(('AP2', 'online')),
+        )
+        streamer = TopologyStreamer(poller)
+
+        async def scenario():
+            await poller.refresh()
+            messages = streamer.messages()
+            first = await messages.__anext__()
+            for _ in range(3):
+                await poller.refresh()
+            second = await messages.__anext__()
+            await messages.aclose()
+            return first, second
+
+        (event, version, body), (delta_event, delta_version, delta_body) = asyncio.run(scenario())
+        delta = json.loads(delta_body)
+
+        assert (event, version) == ('snapshot', 1)
+        assert (delta_event, delta_version) == ('delta', 4)
+        assert (delta['from'], delta['version']) == (1, 4)
+        assert delta['devices']['removed'] == ['ap_AP1']
+        assert [d['id'] for d in delta['devices']['added']] == ['ap_AP2']
+
+    def test_unchanged_versions_send_nothing(self):
+        poller = scripted_poller(topology(('AP1', 'online')), topology(('AP1', 'online')))
+        streamer = TopologyStreamer(poller, heartbeat=0.05)
+
+        async def scenario():
+            await poller.refresh()
+            messages = streamer.messages()
+            await messages.__anext__()
+            await poller.refresh()
+            following = await messages.__anext__()
+            await messages.aclose()
+            return following
+
+        assert asyncio.run(scenario())[0] == 'heartbeat'
+
+    def test_messages_are_built_off_the_event_loop(self):
+        poller = scripted_poller(topology(('AP1', 'online')), topology(('AP1', 'offline')))
+        streamer = TopologyStreamer(poller)
+        threads = []
+        for name in ('snapshot_message', 'delta_message'):
+            def build(*args, build=getattr(streamer, name)):
+                threads.append(threading.current_thread())
+                return build(*args)
+            setattr(streamer, name, build)
+
+        async def scenario():
+            await poller.refresh()
+            consumers = [streamer.messages() for _ in range(3)]
+            for messages in consumers:
+                await messages.__anext__()
+            await poller.refresh()
+            deltas = [await messages.__anext__() for messages in consumers]
+            for messages in consumers:
+                await messages.aclose()
+            return deltas
+
+        deltas = asyncio.run(scenario())
+
+        assert threads and threading.main_thread() not in threads
+        assert len({id(body) for _, _, body in deltas}) == 1, "Consumers share one encoded delta"
+        assert len(streamer._deltas) == 1
+
+    async def serve(self, streamer, scenario):
+        app = web.Application()
+        app.router.add_get('/topology/stream', streamer.handle)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+
+    def test_server_sent_events(self):
+        poller = scripted_poller(topology(('AP1', 'online')), topology(('AP1', 'offline')))
+        streamer = TopologyStreamer(poller)
+
+        async def scenario(client):
+            await poller.refresh()
+            response = await client.get('/topology/stream')
+            snapshot = await read_event(response)
+            await poller.refresh()
+            delta = await read_event(response)
+            response.close()
+            return response.headers['Content-Type'], snapshot, delta
+
+        content_type, snapshot, delta = asyncio.run(self.serve(streamer, scenario))
+
+        assert content_type == 'text/event-stream'
+        assert snapshot['event'] == 'snapshot' and snapshot['id'] == '1'
+        assert json.loads(snapshot['data'])['topology']['devices'][1]['id'] == 'ap_AP1'
+        assert json.loads(delta['data'])['devices']['changed'] == [{'id': 'ap_AP1', 'fields': {'status': 'offline'}}]
+
+    def test_websocket(self):
+        poller = scripted_poller(topology(('AP1', 'online')), topology())
+        streamer = TopologyStreamer(poller)
+
+        async def scenario(client):
+            await poller.refresh()
+            ws = await client.ws_connect('/topology/stream')
+            snapshot = await ws.receive_json(timeout=1)
+            await poller.refresh()
+            delta = await ws.receive_json(timeout=1)
+            await ws.close()
+            return snapshot, delta
+
+        snapshot, delta = asyncio.run(self.serve(streamer, scenario))
+
+        assert snapshot['type'] == 'snapshot'
+        assert delta['type'] == 'delta' and delta['devices']['removed'] == ['ap_AP1']
+
+
+async def read_event(response):
+    """Read one Server-Sent Event into a dict of its fields"""
+    event = {}
+    while True:
+        line = (await asyncio.wait_for(response.content.readline(), 1)).decode().rstrip('\n')
+        if not line:
+            if event:
+                return event
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(': ')
+        event[field] = value